@@ -616,6 +616,11 @@ namespace Cdn.RawC
 			get { return d_randStates.Count; }
 		}
 
+		public int CountDelayedStates
+		{
+			get { return d_delayedStates.Count; }
+		}
+
 		public IEnumerable<State> States
 		{
 			get { return d_states; }
@@ -403,6 +403,8 @@ cdn_rawc_binding_{0}_write (CdnRawcNetwork *input,
 				{"libs", d_options.Libs},
 				{"enable_blas", d_options.NoBlas ? "0" : "1"},
 				{"enable_lapack", d_options.NoLapack ? "0" : "1"},
+				{"enable_simd", d_options.Simd ? "1" : "0"},
+				{"enable_profile", d_options.ProfileRuntime ? "1" : "0"},
 			};
 
 			var ors = String.Join("|", (new List<string>(srep.Keys)).ToArray());
@@ -719,15 +721,45 @@ cdn_rawc_binding_{0}_write (CdnRawcNetwork *input,
 			writer.WriteLine("\t{0} event_states[{1}];", EventStateType, Knowledge.Instance.EventContainersCount);
 			writer.WriteLine("\t{0} events_active[{1}];", EventType, Knowledge.Instance.EventsCount);
 			writer.WriteLine("\tuint32_t events_active_size;");
+			writer.WriteLine("\tuint32_t events_refinements[{0}];", Knowledge.Instance.EventsCount);
 			writer.WriteLine("\tuint8_t terminated;");
+			writer.WriteLine("#ifdef ENABLE_PROFILE");
+			writer.WriteLine("\tCdnRawcProfile profile;");
+			writer.WriteLine("#endif");
+
+			if (NeedsRandState)
+			{
+				writer.WriteLine("\tCdnRawcRand rand;");
+			}
+
 			writer.WriteLine("}} CdnRawcNetwork{0};", CPrefix);
 			writer.WriteLine();
 
 			writer.WriteLine("#define CDN_RAWC_NETWORK_{0}_SIZE sizeof(CdnRawcNetwork{1})", CPrefixUp, CPrefix);
+
+			// The part of the network cleared on prepare, which excludes the
+			// key of the random number generator so that seeds survive resets
+			if (NeedsRandState)
+			{
+				writer.WriteLine("#define CDN_RAWC_NETWORK_{0}_CLEAR_SIZE offsetof(CdnRawcNetwork{1}, rand.key)", CPrefixUp, CPrefix);
+			}
+			else
+			{
+				writer.WriteLine("#define CDN_RAWC_NETWORK_{0}_CLEAR_SIZE CDN_RAWC_NETWORK_{0}_SIZE", CPrefixUp);
+			}
+
 			writer.WriteLine("#define CDN_RAWC_NETWORK_{0}_SPACE_FOR_EVENTS {1}",
 			                 CPrefixUp,
 			                 NeedsSpaceForEvents() ? 1 : 0);
 
+			// Number of integrated states, which sizes the private storage
+			// of integrators in a statically allocated instance
+			var srange = d_program.StateRange(Knowledge.Instance.Integrated, new int[] {0, 0});
+
+			writer.WriteLine("#define CDN_RAWC_NETWORK_{0}_STATES_SIZE {1}",
+			                 CPrefixUp,
+			                 srange[1] - srange[0]);
+
 			writer.WriteLine();
 
 			// Write interface
@@ -751,6 +783,11 @@ cdn_rawc_binding_{0}_write (CdnRawcNetwork *input,
 			get { return d_options.ValueType == "double"; }
 		}
 
+		private bool NeedsRandState
+		{
+			get { return !Cdn.RawC.Options.Instance.Validate && Knowledge.Instance.CountRandStates > 0; }
+		}
+
 		private string GenerateArgsList(Programmer.Function function)
 		{
 			List<string> ret = new List<string>(function.NumArguments + 2);
@@ -876,6 +913,32 @@ cdn_rawc_binding_{0}_write (CdnRawcNetwork *input,
 			}
 		}
 
+		private void WriteFastMath(TextWriter writer)
+		{
+			if (String.IsNullOrEmpty(d_options.FastMath))
+			{
+				return;
+			}
+
+			// Select the fast approximations of cdn-rawc-math-fast.h, either
+			// for all functions or for a comma separated list of functions
+			if (d_options.FastMath == "all")
+			{
+				writer.WriteLine("#define CDN_MATH_FAST");
+				return;
+			}
+
+			foreach (var f in d_options.FastMath.Split(','))
+			{
+				var name = f.Trim();
+
+				if (name.Length != 0)
+				{
+					writer.WriteLine("#define CDN_MATH_{0}_FAST", name.ToUpper());
+				}
+			}
+		}
+
 		private void WriteFunctionDefines(TextWriter writer)
 		{
 			foreach (Programmer.Function function in d_program.Functions)
@@ -2004,12 +2067,19 @@ cdn_rawc_binding_{0}_write (CdnRawcNetwork *input,
 			public uint Next;
 		}
 
+		private class NameMeta
+		{
+			public string Name;
+			public uint Child;
+		}
+
 		private class Meta
 		{
 			public List<NodeMeta> Nodes;
 			public List<StateMeta> States;
 			public List<ChildMeta> Children;
 			public List<TemplateMeta> Templates;
+			public List<NameMeta> Names;
 		}
 
 		private ChildMeta AddChild(Meta meta, NodeMeta parent, ChildMeta child, ChildMeta prev)
@@ -2055,7 +2125,21 @@ cdn_rawc_binding_{0}_write (CdnRawcNetwork *input,
 			}
 		}
 
-		private uint ExtractMeta(Meta meta, Cdn.Object obj, uint parent)
+		private string MetaFullName(string prefix, string name)
+		{
+			return String.IsNullOrEmpty(prefix) ? name : prefix + "." + name;
+		}
+
+		private void AddName(Meta meta, string prefix, string name)
+		{
+			// The child is about to be added by AddChild
+			meta.Names.Add(new NameMeta {
+				Name = MetaFullName(prefix, name),
+				Child = (uint)meta.Children.Count
+			});
+		}
+
+		private uint ExtractMeta(Meta meta, Cdn.Object obj, uint parent, string prefix)
 		{
 			NodeMeta nm = new NodeMeta {
 				Object = obj,
@@ -2107,6 +2191,8 @@ cdn_rawc_binding_{0}_write (CdnRawcNetwork *input,
 					};
 
 					meta.States.Add(sm);
+
+					AddName(meta, prefix, v.Name);
 					prev = AddChild(meta, nm, cm, prev);
 				}
 			}
@@ -2117,7 +2203,7 @@ cdn_rawc_binding_{0}_write (CdnRawcNetwork *input,
 			{
 				foreach (var child in node.Children)
 				{
-					uint cid = ExtractMeta(meta, child, parent);
+					uint cid = ExtractMeta(meta, child, parent, MetaFullName(prefix, child.Id));
 
 					ChildMeta cm = new ChildMeta {
 						Object = child,
@@ -2127,6 +2213,7 @@ cdn_rawc_binding_{0}_write (CdnRawcNetwork *input,
 						Next = 0
 					};
 
+					AddName(meta, prefix, child.Id);
 					prev = AddChild(meta, nm, cm, prev);
 				}
 			}
@@ -2140,7 +2227,8 @@ cdn_rawc_binding_{0}_write (CdnRawcNetwork *input,
 				Nodes = new List<NodeMeta>(),
 				States = new List<StateMeta>(d_program.StateTable.Count + 1),
 				Children = new List<ChildMeta>(),
-				Templates = new List<TemplateMeta>()
+				Templates = new List<TemplateMeta>(),
+				Names = new List<NameMeta>()
 			};
 
 			// Empty root nodes
@@ -2169,12 +2257,16 @@ cdn_rawc_binding_{0}_write (CdnRawcNetwork *input,
 				return meta;
 			}
 
-			ExtractMeta(meta, Knowledge.Instance.Network, 0);
+			ExtractMeta(meta, Knowledge.Instance.Network, 0, null);
+
+			// Sort names in the same order as strcmp so that they can be
+			// looked up with a binary search
+			meta.Names.Sort((a, b) => String.CompareOrdinal(a.Name, b.Name));
 
 			return meta;
 		}
 
-		private void WriteNetworkMeta(TextWriter writer)
+		private Meta WriteNetworkMeta(TextWriter writer)
 		{
 			var meta = ExtractMeta();
 			var vb = Cdn.RawC.Options.Instance.Verbose;
@@ -2291,10 +2383,31 @@ cdn_rawc_binding_{0}_write (CdnRawcNetwork *input,
 
 			writer.WriteLine("\t};");
 			writer.WriteLine();
+
+			if (meta.Names.Count == 0)
+			{
+				return meta;
+			}
+
+			writer.WriteLine("\tstatic CdnRawcNameMeta meta_names[] = {");
+
+			foreach (var name in meta.Names)
+			{
+				writer.WriteLine("\t\t{{ \"{0}\", {1} }},",
+				                 name.Name.Replace("\"", "\\\""),
+				                 name.Child);
+			}
+
+			writer.WriteLine("\t};");
+			writer.WriteLine();
+
+			return meta;
 		}
 
-		private void WriteNetworkDimensions(TextWriter writer)
+		private int WriteNetworkDimensions(TextWriter writer)
 		{
+			var indices = new List<int>();
+
 			writer.WriteLine("\tstatic CdnRawcDimension dimensions[] = {");
 
 			foreach (var item in d_program.StateTable)
@@ -2304,11 +2417,91 @@ cdn_rawc_binding_{0}_write (CdnRawcNetwork *input,
 				if (!dim.IsOne)
 				{
 					writer.WriteLine("\t\t{{ {0}, {1} }},", dim.Rows, dim.Columns);
+					indices.Add(item.DataIndex);
+				}
+			}
+
+			writer.WriteLine("\t};");
+			writer.WriteLine();
+
+			if (indices.Count == 0)
+			{
+				return 0;
+			}
+
+			// Data index of each entry in dimensions, so that the complete
+			// dimension table can be read without calling get_dimension
+			writer.WriteLine("\tstatic uint32_t dimension_indices[] = {");
+
+			foreach (var index in indices)
+			{
+				writer.WriteLine("\t\t{0},", index);
+			}
+
+			writer.WriteLine("\t};");
+			writer.WriteLine();
+
+			return indices.Count;
+		}
+
+		private int WriteNetworkJacobian(TextWriter writer)
+		{
+			var sparsity = d_program.JacobianSparsity();
+			int nnz = 0;
+
+			foreach (var col in sparsity)
+			{
+				nnz += col.Count;
+			}
+
+			if (nnz == 0)
+			{
+				return -1;
+			}
+
+			int numcolors;
+			var colors = d_program.JacobianColoring(sparsity, out numcolors);
+
+			// Jacobian sparsity in compressed sparse column format
+			writer.WriteLine("\tstatic uint32_t jacobian_columns[] = {");
+
+			int offset = 0;
+
+			writer.WriteLine("\t\t{0},", offset);
+
+			foreach (var col in sparsity)
+			{
+				offset += col.Count;
+				writer.WriteLine("\t\t{0},", offset);
+			}
+
+			writer.WriteLine("\t};");
+			writer.WriteLine();
+
+			writer.WriteLine("\tstatic uint32_t jacobian_rows[] = {");
+
+			foreach (var col in sparsity)
+			{
+				foreach (var row in col)
+				{
+					writer.WriteLine("\t\t{0},", row);
 				}
 			}
 
 			writer.WriteLine("\t};");
 			writer.WriteLine();
+
+			writer.WriteLine("\tstatic uint32_t jacobian_colors[] = {");
+
+			foreach (var color in colors)
+			{
+				writer.WriteLine("\t\t{0},", color);
+			}
+
+			writer.WriteLine("\t};");
+			writer.WriteLine();
+
+			return numcolors;
 		}
 
 		private void WriteNetwork(TextWriter writer)
@@ -2319,8 +2512,9 @@ cdn_rawc_binding_{0}_write (CdnRawcNetwork *input,
 			writer.WriteLine("cdn_rawc_{0}_network ()", pref);
 			writer.WriteLine("{");
 
-			WriteNetworkMeta(writer);
-			WriteNetworkDimensions(writer);
+			var meta = WriteNetworkMeta(writer);
+			var numdims = WriteNetworkDimensions(writer);
+			var numcolors = WriteNetworkJacobian(writer);
 
 			writer.WriteLine("\tstatic CdnRawcNetwork network = {");
 
@@ -2344,6 +2538,7 @@ cdn_rawc_binding_{0}_write (CdnRawcNetwork *input,
 				"get_events_active_size",
 				"get_events_value",
 				"get_terminated",
+				"get_events_refinements",
 				"get_dimension",
 			};
 
@@ -2352,6 +2547,21 @@ cdn_rawc_binding_{0}_write (CdnRawcNetwork *input,
 				writer.WriteLine("\t\t.{0} = {1}_{0},", name, pref);
 			}
 
+			if (NeedsRandState)
+			{
+				writer.WriteLine("\t\t.seed = {0}_seed,", pref);
+			}
+			else
+			{
+				writer.WriteLine("\t\t.seed = NULL,");
+			}
+
+			writer.WriteLine("#ifdef ENABLE_PROFILE");
+			writer.WriteLine("\t\t.get_profile = {0}_get_profile,", pref);
+			writer.WriteLine("#else");
+			writer.WriteLine("\t\t.get_profile = NULL,");
+			writer.WriteLine("#endif");
+
 			writer.WriteLine();
 
 			var range = d_program.StateRange(Knowledge.Instance.Integrated, new int[] {0, 0});
@@ -2372,14 +2582,50 @@ cdn_rawc_binding_{0}_write (CdnRawcNetwork *input,
 			                 range[0],
 			                 range[0] + (range[1] - range[0]) * 3);
 
+			writer.WriteLine("\t\t.events_size = {0},", Knowledge.Instance.EventsCount);
+
 			writer.WriteLine();
 			writer.WriteLine("\t\t.dimensions = dimensions,");
+
+			if (numdims > 0)
+			{
+				writer.WriteLine("\t\t.dimension_indices = dimension_indices,");
+			}
+			else
+			{
+				writer.WriteLine("\t\t.dimension_indices = NULL,");
+			}
+
+			writer.WriteLine("\t\t.dimensions_size = {0},", numdims);
+			writer.WriteLine();
+
+			if (numcolors >= 0)
+			{
+				writer.WriteLine("\t\t.jacobian_columns = jacobian_columns,");
+				writer.WriteLine("\t\t.jacobian_rows = jacobian_rows,");
+				writer.WriteLine("\t\t.jacobian_colors = jacobian_colors,");
+				writer.WriteLine("\t\t.jacobian_num_colors = {0},", numcolors);
+			}
+			else
+			{
+				writer.WriteLine("\t\t.jacobian_columns = NULL,");
+				writer.WriteLine("\t\t.jacobian_rows = NULL,");
+				writer.WriteLine("\t\t.jacobian_colors = NULL,");
+				writer.WriteLine("\t\t.jacobian_num_colors = 0,");
+			}
 			writer.WriteLine();
 			writer.WriteLine("\t\t.size = CDN_RAWC_NETWORK_{0}_SIZE,", CPrefixUp);
 			writer.WriteLine("\t\t.data_size = sizeof (ValueType) * {0},", d_program.StateTable.Size);
 			writer.WriteLine("\t\t.data_count = {0},", d_program.StateTable.Size);
 			writer.WriteLine("\t\t.event_refinement = {0},", NeedsSpaceForEvents() ? 1 : 0);
 			writer.WriteLine("\t\t.type_size = sizeof (ValueType),");
+
+			// Illinois localization only restores the integrated states
+			// between trials, which is not enough for data written in post
+			// (e.g. the history of delayed states). It is opt-in for networks
+			// known not to do that, see CdnRawcEventLocalization
+			writer.WriteLine("\t\t.event_localization = CDN_RAWC_EVENT_LOCALIZATION_STEP,");
+
 			writer.WriteLine("\t\t.minimum_timestep = {0},", Knowledge.Instance.Network.Integrator.MinimumTimestep);
 			writer.WriteLine("\t\t.default_timestep = {0},", Knowledge.Instance.Network.Integrator.DefaultTimestep);
 
@@ -2414,6 +2660,19 @@ cdn_rawc_binding_{0}_write (CdnRawcNetwork *input,
 			writer.WriteLine();
 			writer.WriteLine("\t\t\t.templates = meta_templates,");
 			writer.WriteLine("\t\t\t.templates_size = sizeof (meta_templates) / sizeof (CdnRawcTemplateMeta),");
+			writer.WriteLine();
+
+			if (meta.Names.Count > 0)
+			{
+				writer.WriteLine("\t\t\t.names = meta_names,");
+				writer.WriteLine("\t\t\t.names_size = sizeof (meta_names) / sizeof (CdnRawcNameMeta),");
+			}
+			else
+			{
+				writer.WriteLine("\t\t\t.names = NULL,");
+				writer.WriteLine("\t\t\t.names_size = 0,");
+			}
+
 			writer.WriteLine("\t\t},");
 
 			writer.WriteLine("\t};");
@@ -2850,6 +3109,24 @@ cdn_rawc_binding_{0}_write (CdnRawcNetwork *input,
 			writer.WriteLine("}");
 			writer.WriteLine();
 
+			writer.WriteLine("static uint32_t *");
+			writer.WriteLine("{0}_get_events_refinements (void *data)", CPrefixDown);
+			writer.WriteLine("{");
+			WriteNetworkVariable(writer, null, false);
+			writer.WriteLine("\treturn network->events_refinements;");
+			writer.WriteLine("}");
+			writer.WriteLine();
+
+			writer.WriteLine("#ifdef ENABLE_PROFILE");
+			writer.WriteLine("static CdnRawcProfile *");
+			writer.WriteLine("{0}_get_profile (void *data)", CPrefixDown);
+			writer.WriteLine("{");
+			WriteNetworkVariable(writer, null, false);
+			writer.WriteLine("\treturn &network->profile;");
+			writer.WriteLine("}");
+			writer.WriteLine("#endif");
+			writer.WriteLine();
+
 			writer.WriteLine("static CdnRawcDimension const *");
 			writer.WriteLine("{0}_get_dimension (CdnRawcDimension const *dimensions, uint32_t i)", CPrefixDown);
 			writer.WriteLine("{");
@@ -2880,6 +3157,17 @@ cdn_rawc_binding_{0}_write (CdnRawcNetwork *input,
 
 			writer.WriteLine("}");
 			writer.WriteLine();
+
+			if (NeedsRandState)
+			{
+				writer.WriteLine("static void");
+				writer.WriteLine("{0}_seed (void *data, uint32_t seed, uint32_t stream)", CPrefixDown);
+				writer.WriteLine("{");
+				WriteNetworkVariable(writer, null, false);
+				writer.WriteLine("\tcdn_rawc_rand_seed (&network->rand, seed, stream);");
+				writer.WriteLine("}");
+				writer.WriteLine();
+			}
 		}
 
 		private string EventStateType
@@ -2913,6 +3201,7 @@ cdn_rawc_binding_{0}_write (CdnRawcNetwork *input,
 
 			writer.WriteLine();
 			WriteCustomMathRequired(writer);
+			WriteFastMath(writer);
 
 			StringWriter source = new StringWriter();
 
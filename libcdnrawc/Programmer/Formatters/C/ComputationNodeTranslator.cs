@@ -15,6 +15,23 @@ namespace Cdn.RawC.Programmer.Formatters.C
 
 			StringBuilder ret = new StringBuilder();
 
+			if (!Cdn.RawC.Options.Instance.Validate)
+			{
+				// Fill from the counter based generator of the instance, the
+				// validation build keeps random () to reproduce the streams
+				// of codyn
+				foreach (Computation.Rand.IndexRange range in node.Ranges(context.Program.StateTable))
+				{
+					ret.AppendFormat("cdn_rawc_rand_fill (&network->rand, {0} + {1}, {2});",
+					                 context.Program.StateTable.Name,
+					                 range.Start,
+					                 range.End - range.Start + 1);
+					ret.AppendLine();
+				}
+
+				return ret.ToString().TrimEnd();
+			}
+
 			ret.AppendLine("{");
 			ret.AppendLine("\tint i;");
 			ret.AppendLine();
@@ -57,7 +74,7 @@ namespace Cdn.RawC.Programmer.Formatters.C
 			// Override default copy loop for more efficient memset
 			if (node.Name == null)
 			{
-				return String.Format("memset (network, 0, CDN_RAWC_NETWORK_{0}_SIZE);", context.Options.CPrefixUp);
+				return String.Format("memset (network, 0, CDN_RAWC_NETWORK_{0}_CLEAR_SIZE);", context.Options.CPrefixUp);
 			}
 			else
 			{
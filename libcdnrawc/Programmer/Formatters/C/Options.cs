@@ -27,6 +27,12 @@ namespace Cdn.RawC.Programmer.Formatters.C
 		public bool NoBlas;
 		[CommandLine.Option("no-lapack", Description="Disable use of lapack")]
 		public bool NoLapack;
+		[CommandLine.Option("simd", Description="Use vectorizable element wise math kernels (restrict, omp simd)")]
+		public bool Simd;
+		[CommandLine.Option("fast-math", ArgumentName="FUNCTIONS", OptionalArgument=true, DefaultArgument="all", Description="Use fast approximations of math functions (all, or a comma separated list, e.g. sin,cos,exp)")]
+		public string FastMath;
+		[CommandLine.Option("profile-runtime", Description="Keep per phase call counts and timings of each step (ENABLE_PROFILE)")]
+		public bool ProfileRuntime;
 		[CommandLine.Option("no-run", Description="Disable generation of run sources")]
 		public bool NoRun;
 
@@ -3,14 +3,72 @@
 
 #include "${basename}.h"
 
+#include <cdn-rawc/integrators/cdn-rawc-integrator-${integrator_include}.h>
+
 CDN_RAWC_BEGIN_DECLS
 
+// Storage of a single instance of the network. Instances may be allocated
+// by the caller (statically, on the stack or in its own pool) and set up with
+// cdn_rawc_${name}_new_with_storage, or be allocated by cdn_rawc_${name}_new.
+// Independent instances can be stepped concurrently from different threads.
+typedef struct
+{
+	CdnRawcNetwork${Name} data[CDN_RAWC_INTEGRATOR_${INTEGRATOR}_ORDER + CDN_RAWC_NETWORK_${NAME}_SPACE_FOR_EVENTS];
+
+	// Private storage of the integrator (see cdn_rawc_integrator_get_work),
+	// with room to align it
+	uint8_t work[CDN_RAWC_INTEGRATOR_${INTEGRATOR}_WORK_SIZE (CDN_RAWC_NETWORK_${NAME}_STATES_SIZE) + CDN_RAWC_INTEGRATOR_WORK_ALIGN];
+
+	uint8_t storage;
+} CdnRawc${Name}Instance;
+
+#define CDN_RAWC_${NAME}_INSTANCE_SIZE sizeof(CdnRawc${Name}Instance)
+
+// Number of instances in the static pool used by cdn_rawc_${name}_new, which
+// falls back to malloc when the pool is exhausted and ENABLE_MALLOC is defined.
+// The pool is taken from concurrently with atomic builtins, which are only
+// available with GCC (or a compatible compiler)
+#ifndef CDN_RAWC_${NAME}_POOL_SIZE
+#define CDN_RAWC_${NAME}_POOL_SIZE 0
+#endif
+
+CdnRawc${Name}Instance *cdn_rawc_${name}_new              (void);
+CdnRawc${Name}Instance *cdn_rawc_${name}_new_with_storage (void *storage);
+void                    cdn_rawc_${name}_free             (CdnRawc${Name}Instance *instance);
+
+// Instances from cdn_rawc_${name}_new(_with_storage) each get a distinct
+// random stream with seed 0, the static instance uses seed 0 and stream 0.
+// Every (seed, stream) pair is an independent random sequence
+void               cdn_rawc_${name}_instance_seed       (CdnRawc${Name}Instance *instance,
+                                                         uint32_t                seed,
+                                                         uint32_t                stream);
+
+void               cdn_rawc_${name}_instance_init       (CdnRawc${Name}Instance *instance, ValueType t);
+void               cdn_rawc_${name}_instance_prepare    (CdnRawc${Name}Instance *instance, ValueType t);
+void               cdn_rawc_${name}_instance_reset      (CdnRawc${Name}Instance *instance, ValueType t);
+void               cdn_rawc_${name}_instance_update     (CdnRawc${Name}Instance *instance, ValueType t);
+void               cdn_rawc_${name}_instance_step       (CdnRawc${Name}Instance *instance, ValueType t, ValueType dt);
+void               cdn_rawc_${name}_instance_run        (CdnRawc${Name}Instance *instance, ValueType t, ValueType dt, ValueType maxt);
+
+ValueType          cdn_rawc_${name}_instance_get        (CdnRawc${Name}Instance *instance,
+                                                         CdnRawc${Name}State     index);
+void               cdn_rawc_${name}_instance_set        (CdnRawc${Name}Instance *instance,
+                                                         CdnRawc${Name}State     index,
+                                                         ValueType               value);
+
+ValueType         *cdn_rawc_${name}_instance_data       (CdnRawc${Name}Instance *instance);
+
+uint8_t            cdn_rawc_${name}_instance_get_terminated (CdnRawc${Name}Instance *instance);
+uint32_t          *cdn_rawc_${name}_instance_get_events_refinements (CdnRawc${Name}Instance *instance);
+
+// Single static instance
 void               cdn_rawc_${name}_init       (ValueType t);
 void               cdn_rawc_${name}_prepare    (ValueType t);
 void               cdn_rawc_${name}_reset      (ValueType t);
 void               cdn_rawc_${name}_update     (ValueType t);
 void               cdn_rawc_${name}_step       (ValueType t, ValueType dt);
 void               cdn_rawc_${name}_run        (ValueType t, ValueType dt, ValueType maxt);
+void               cdn_rawc_${name}_seed       (uint32_t seed, uint32_t stream);
 
 ValueType          cdn_rawc_${name}_get        (CdnRawc${Name}State index);
 void               cdn_rawc_${name}_set        (CdnRawc${Name}State index,
@@ -21,6 +79,7 @@ CdnRawcIntegrator *cdn_rawc_${name}_integrator (void);
 CdnRawcDimension const *cdn_rawc_${name}_get_dimension (uint32_t i);
 
 uint8_t            cdn_rawc_${name}_get_terminated (void);
+uint32_t          *cdn_rawc_${name}_get_events_refinements (void);
 
 CDN_RAWC_END_DECLS
 
@@ -1,51 +1,195 @@
 #include "${basename}_run.h"
 
-#include <cdn-rawc/integrators/cdn-rawc-integrator-${integrator_include}.h>
+#include <string.h>
 
-static CdnRawcNetwork${Name} data[CDN_RAWC_INTEGRATOR_${INTEGRATOR}_ORDER + CDN_RAWC_NETWORK_${NAME}_SPACE_FOR_EVENTS];
+#ifdef ENABLE_MALLOC
+#include <stdlib.h>
+#endif
+
+#define STORAGE_CALLER 0
+#define STORAGE_POOL   1
+#define STORAGE_HEAP   2
+
+static CdnRawc${Name}Instance static_instance;
+
+#if CDN_RAWC_${NAME}_POOL_SIZE > 0
+#ifndef __GNUC__
+#error "The instance pool needs atomic builtins, define CDN_RAWC_${NAME}_POOL_SIZE to 0 for this compiler"
+#endif
+
+static CdnRawc${Name}Instance pool[CDN_RAWC_${NAME}_POOL_SIZE];
+static uint8_t pool_used[CDN_RAWC_${NAME}_POOL_SIZE];
+
+static CdnRawc${Name}Instance *
+pool_take (void)
+{
+	uint32_t i;
+
+	for (i = 0; i < CDN_RAWC_${NAME}_POOL_SIZE; ++i)
+	{
+		if (__sync_lock_test_and_set (&pool_used[i], 1) == 0)
+		{
+			return pool + i;
+		}
+	}
+
+	return NULL;
+}
+
+static void
+pool_release (CdnRawc${Name}Instance *instance)
+{
+	__sync_lock_release (&pool_used[instance - pool]);
+}
+#endif
+
+// Last random stream handed out to a new instance, the static instance uses
+// stream 0. Only thread safe when compiled with GCC (or a compatible compiler)
+static uint32_t last_stream = 0;
+
+static uint32_t
+next_stream (void)
+{
+#ifdef __GNUC__
+	return __sync_add_and_fetch (&last_stream, 1);
+#else
+	return ++last_stream;
+#endif
+}
+
+CdnRawc${Name}Instance *
+cdn_rawc_${name}_new_with_storage (void *storage)
+{
+	CdnRawc${Name}Instance *ret = storage;
+
+	// Same initial contents as the static instance, but with a random
+	// stream of its own (see cdn_rawc_${name}_instance_seed)
+	memset (ret, 0, sizeof (CdnRawc${Name}Instance));
+	ret->storage = STORAGE_CALLER;
+
+	cdn_rawc_${name}_instance_seed (ret, 0, next_stream ());
+
+	return ret;
+}
+
+CdnRawc${Name}Instance *
+cdn_rawc_${name}_new (void)
+{
+	CdnRawc${Name}Instance *ret = NULL;
+
+#if CDN_RAWC_${NAME}_POOL_SIZE > 0
+	ret = pool_take ();
+
+	if (ret)
+	{
+		cdn_rawc_${name}_new_with_storage (ret);
+		ret->storage = STORAGE_POOL;
+
+		return ret;
+	}
+#endif
+
+#ifdef ENABLE_MALLOC
+	ret = malloc (sizeof (CdnRawc${Name}Instance));
+
+	if (ret)
+	{
+		cdn_rawc_${name}_new_with_storage (ret);
+		ret->storage = STORAGE_HEAP;
+	}
+#endif
+
+	return ret;
+}
 
 void
-cdn_rawc_${name}_reset (ValueType t)
+cdn_rawc_${name}_free (CdnRawc${Name}Instance *instance)
+{
+	if (!instance)
+	{
+		return;
+	}
+
+	switch (instance->storage)
+	{
+#if CDN_RAWC_${NAME}_POOL_SIZE > 0
+		case STORAGE_POOL:
+			pool_release (instance);
+		break;
+#endif
+#ifdef ENABLE_MALLOC
+		case STORAGE_HEAP:
+			free (instance);
+		break;
+#endif
+		default:
+		break;
+	}
+}
+
+void
+cdn_rawc_${name}_instance_seed (CdnRawc${Name}Instance *instance,
+                                uint32_t                seed,
+                                uint32_t                stream)
 {
 	CdnRawcNetwork *network;
 
 	network = cdn_rawc_${name}_network ();
 
-	network->reset (data, t);
+	if (network->seed)
+	{
+		network->seed (instance->data, seed, stream);
+	}
 }
 
 void
-cdn_rawc_${name}_update (ValueType t)
+cdn_rawc_${name}_instance_reset (CdnRawc${Name}Instance *instance,
+                                 ValueType               t)
 {
 	CdnRawcNetwork *network;
 
 	network = cdn_rawc_${name}_network ();
 
-	network->update (data, t);
+	network->reset (instance->data, t);
 }
 
 void
-cdn_rawc_${name}_init (ValueType t)
+cdn_rawc_${name}_instance_update (CdnRawc${Name}Instance *instance,
+                                  ValueType               t)
 {
 	CdnRawcNetwork *network;
 
 	network = cdn_rawc_${name}_network ();
 
-	network->init (data, t);
+	network->update (instance->data, t);
 }
 
 void
-cdn_rawc_${name}_prepare (ValueType t)
+cdn_rawc_${name}_instance_init (CdnRawc${Name}Instance *instance,
+                                ValueType               t)
 {
 	CdnRawcNetwork *network;
 
 	network = cdn_rawc_${name}_network ();
 
-	network->prepare (data, t);
+	network->init (instance->data, t);
 }
 
 void
-cdn_rawc_${name}_step (ValueType t, ValueType dt)
+cdn_rawc_${name}_instance_prepare (CdnRawc${Name}Instance *instance,
+                                   ValueType               t)
+{
+	CdnRawcNetwork *network;
+
+	network = cdn_rawc_${name}_network ();
+
+	network->prepare (instance->data, t);
+}
+
+void
+cdn_rawc_${name}_instance_step (CdnRawc${Name}Instance *instance,
+                                ValueType               t,
+                                ValueType               dt)
 {
 	CdnRawcNetwork *network;
 	CdnRawcIntegrator *integrator;
@@ -55,13 +199,16 @@ cdn_rawc_${name}_step (ValueType t, ValueType dt)
 
 	cdn_rawc_integrator_step (integrator,
 	                          network,
-	                          data,
+	                          instance->data,
 	                          t,
 	                          dt);
 }
 
 void
-cdn_rawc_${name}_run (ValueType t, ValueType dt, ValueType maxt)
+cdn_rawc_${name}_instance_run (CdnRawc${Name}Instance *instance,
+                               ValueType               t,
+                               ValueType               dt,
+                               ValueType               maxt)
 {
 	CdnRawcNetwork *network;
 	CdnRawcIntegrator *integrator;
@@ -71,12 +218,95 @@ cdn_rawc_${name}_run (ValueType t, ValueType dt, ValueType maxt)
 
 	cdn_rawc_integrator_run (integrator,
 	                         network,
-	                         data,
+	                         instance->data,
 	                         t,
 	                         dt,
 	                         maxt);
 }
 
+ValueType
+cdn_rawc_${name}_instance_get (CdnRawc${Name}Instance *instance,
+                               CdnRawc${Name}State     index)
+{
+	return instance->data[0].data[index];
+}
+
+void
+cdn_rawc_${name}_instance_set (CdnRawc${Name}Instance *instance,
+                               CdnRawc${Name}State     index,
+                               ValueType               value)
+{
+	instance->data[0].data[index] = value;
+}
+
+ValueType *
+cdn_rawc_${name}_instance_data (CdnRawc${Name}Instance *instance)
+{
+	return instance->data[0].data;
+}
+
+uint8_t
+cdn_rawc_${name}_instance_get_terminated (CdnRawc${Name}Instance *instance)
+{
+	CdnRawcNetwork *network;
+
+	network = cdn_rawc_${name}_network ();
+
+	return network->get_terminated (instance->data);
+}
+
+uint32_t *
+cdn_rawc_${name}_instance_get_events_refinements (CdnRawc${Name}Instance *instance)
+{
+	CdnRawcNetwork *network;
+
+	network = cdn_rawc_${name}_network ();
+
+	return network->get_events_refinements (instance->data);
+}
+
+void
+cdn_rawc_${name}_reset (ValueType t)
+{
+	cdn_rawc_${name}_instance_reset (&static_instance, t);
+}
+
+void
+cdn_rawc_${name}_update (ValueType t)
+{
+	cdn_rawc_${name}_instance_update (&static_instance, t);
+}
+
+void
+cdn_rawc_${name}_init (ValueType t)
+{
+	cdn_rawc_${name}_instance_init (&static_instance, t);
+}
+
+void
+cdn_rawc_${name}_prepare (ValueType t)
+{
+	cdn_rawc_${name}_instance_prepare (&static_instance, t);
+}
+
+void
+cdn_rawc_${name}_step (ValueType t, ValueType dt)
+{
+	cdn_rawc_${name}_instance_step (&static_instance, t, dt);
+}
+
+void
+cdn_rawc_${name}_seed (uint32_t seed, uint32_t stream)
+{
+	cdn_rawc_${name}_instance_seed (&static_instance, seed, stream);
+}
+
+void
+cdn_rawc_${name}_run (ValueType t, ValueType dt, ValueType maxt)
+{
+	cdn_rawc_${name}_instance_run (&static_instance, t, dt, maxt);
+}
+
 CdnRawcIntegrator *
 cdn_rawc_${name}_integrator (void)
 {
@@ -86,20 +316,20 @@ cdn_rawc_${name}_integrator (void)
 ValueType
 cdn_rawc_${name}_get (CdnRawc${Name}State index)
 {
-	return data[0].data[index];
+	return cdn_rawc_${name}_instance_get (&static_instance, index);
 }
 
 void
 cdn_rawc_${name}_set (CdnRawc${Name}State index,
                       ValueType value)
 {
-	data[0].data[index] = value;
+	cdn_rawc_${name}_instance_set (&static_instance, index, value);
 }
 
 ValueType *
 cdn_rawc_${name}_data (void)
 {
-	return data[0].data;
+	return cdn_rawc_${name}_instance_data (&static_instance);
 }
 
 CdnRawcDimension const *
@@ -115,9 +345,11 @@ cdn_rawc_${name}_get_dimension (uint32_t i)
 uint8_t
 cdn_rawc_${name}_get_terminated (void)
 {
-	CdnRawcNetwork *network;
-	
-	network = cdn_rawc_${name}_network ();
+	return cdn_rawc_${name}_instance_get_terminated (&static_instance);
+}
 
-	return network->get_terminated (data);
-}
\ No newline at end of file
+uint32_t *
+cdn_rawc_${name}_get_events_refinements (void)
+{
+	return cdn_rawc_${name}_instance_get_events_refinements (&static_instance);
+}
@@ -0,0 +1,183 @@
+// Microbenchmark of the cwise/rwise broadcast operators in cdn-rawc-math.h.
+// Broadcasts a column vector (Nx1, cwise) or a row vector (1xN, rwise)
+// against matrices of different shapes and compares the shape specialized
+// builtins against the generic column over row loop.
+
+#define _POSIX_C_SOURCE 199309L
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <stdint.h>
+#include <string.h>
+#include <time.h>
+
+#ifndef ValueType
+#define ValueType double
+#endif
+
+#define CDN_MATH_PLUS_V_CWISE_M_1_REQUIRED
+#define CDN_MATH_PLUS_V_RWISE_M_1_REQUIRED
+
+#include <cdn-rawc/cdn-rawc-math.h>
+
+#define ELEMENTS_PER_RUN 100000000
+
+typedef ValueType *(*Broadcast) (ValueType *ret, ValueType *x0, ValueType *x1, uint32_t rows, uint32_t columns);
+
+static ValueType *generic_cwise (ValueType *ret, ValueType *x0, ValueType *x1, uint32_t rows, uint32_t columns);
+
+static ValueType *
+generic_cwise (ValueType *ret, ValueType *x0, ValueType *x1, uint32_t rows, uint32_t columns)
+{
+	uint32_t c;
+	uint32_t i = 0;
+
+	for (c = 0; c < columns; ++c)
+	{
+		uint32_t r;
+
+		for (r = 0; r < rows; ++r)
+		{
+			ret[i] = x0[i] + x1[r];
+			++i;
+		}
+	}
+
+	return ret;
+}
+
+static ValueType *generic_rwise (ValueType *ret, ValueType *x0, ValueType *x1, uint32_t rows, uint32_t columns);
+
+static ValueType *
+generic_rwise (ValueType *ret, ValueType *x0, ValueType *x1, uint32_t rows, uint32_t columns)
+{
+	uint32_t c;
+	uint32_t i = 0;
+
+	for (c = 0; c < columns; ++c)
+	{
+		uint32_t r;
+
+		for (r = 0; r < rows; ++r)
+		{
+			ret[i] = x0[i] + x1[c];
+			++i;
+		}
+	}
+
+	return ret;
+}
+
+static double now (void);
+
+static double
+now (void)
+{
+	struct timespec ts;
+
+	clock_gettime (CLOCK_MONOTONIC, &ts);
+	return ts.tv_sec + ts.tv_nsec * 1e-9;
+}
+
+static double time_broadcast (Broadcast f, ValueType *ret, ValueType *x0, ValueType *x1, uint32_t rows, uint32_t columns);
+
+static double
+time_broadcast (Broadcast f,
+                ValueType *ret,
+                ValueType *x0,
+                ValueType *x1,
+                uint32_t   rows,
+                uint32_t   columns)
+{
+	uint32_t size = rows * columns;
+	uint32_t reps = ELEMENTS_PER_RUN / size;
+	uint32_t i;
+	double start;
+
+	if (reps == 0)
+	{
+		reps = 1;
+	}
+
+	start = now ();
+
+	for (i = 0; i < reps; ++i)
+	{
+		f (ret, x0, x1, rows, columns);
+	}
+
+	// ns per element
+	return (now () - start) * 1e9 / ((double)reps * size);
+}
+
+typedef struct
+{
+	char const *name;
+	Broadcast generic;
+	Broadcast builtin;
+	uint32_t rows;
+	uint32_t columns;
+} Case;
+
+int
+main (void)
+{
+	static Case const cases[] = {
+		{"rwise", generic_rwise, CDN_MATH_PLUS_V_RWISE_M_1, 2, 8192},
+		{"rwise", generic_rwise, CDN_MATH_PLUS_V_RWISE_M_1, 3, 8192},
+		{"rwise", generic_rwise, CDN_MATH_PLUS_V_RWISE_M_1, 64, 256},
+		{"rwise", generic_rwise, CDN_MATH_PLUS_V_RWISE_M_1, 256, 64},
+		{"cwise", generic_cwise, CDN_MATH_PLUS_V_CWISE_M_1, 2, 8192},
+		{"cwise", generic_cwise, CDN_MATH_PLUS_V_CWISE_M_1, 4, 4096},
+		{"cwise", generic_cwise, CDN_MATH_PLUS_V_CWISE_M_1, 64, 256},
+		{"cwise", generic_cwise, CDN_MATH_PLUS_V_CWISE_M_1, 16384, 16},
+	};
+
+	uint32_t i;
+
+	printf ("%-6s %8s %8s %14s %14s %8s\n",
+	        "op", "rows", "columns", "generic ns/el", "builtin ns/el", "speedup");
+
+	for (i = 0; i < sizeof (cases) / sizeof (cases[0]); ++i)
+	{
+		Case const *c = cases + i;
+		uint32_t size = c->rows * c->columns;
+		uint32_t vsize = c->generic == generic_cwise ? c->rows : c->columns;
+		ValueType *m = malloc (sizeof (ValueType) * size);
+		ValueType *v = malloc (sizeof (ValueType) * vsize);
+		ValueType *r1 = malloc (sizeof (ValueType) * size);
+		ValueType *r2 = malloc (sizeof (ValueType) * size);
+		double tg;
+		double tb;
+		uint32_t j;
+
+		for (j = 0; j < size; ++j)
+		{
+			m[j] = (ValueType)j;
+		}
+
+		for (j = 0; j < vsize; ++j)
+		{
+			v[j] = (ValueType)(j * 0.5);
+		}
+
+		tg = time_broadcast (c->generic, r1, m, v, c->rows, c->columns);
+		tb = time_broadcast (c->builtin, r2, m, v, c->rows, c->columns);
+
+		if (memcmp (r1, r2, sizeof (ValueType) * size) != 0)
+		{
+			fprintf (stderr, "Mismatch for %s %ux%u\n", c->name, c->rows, c->columns);
+			return 1;
+		}
+
+		printf ("%-6s %8u %8u %14.3f %14.3f %8.2f\n",
+		        c->name, c->rows, c->columns, tg, tb, tg / tb);
+
+		free (m);
+		free (v);
+		free (r1);
+		free (r2);
+	}
+
+	return 0;
+}
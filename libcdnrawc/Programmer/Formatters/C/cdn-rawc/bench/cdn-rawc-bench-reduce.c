@@ -0,0 +1,182 @@
+// Microbenchmark of the _v reductions in cdn-rawc-math.h. Compares the
+// generated multi accumulator, pairwise reductions against the previous
+// single accumulator loop, per vector length, for speed and for the
+// relative error of the sum with respect to a long double reference.
+
+#define _POSIX_C_SOURCE 199309L
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <stdint.h>
+#include <string.h>
+#include <time.h>
+
+#ifndef ValueType
+#define ValueType double
+#endif
+
+#define CDN_MATH_SUM_V_REQUIRED
+#define CDN_MATH_SQSUM_V_REQUIRED
+#define CDN_MATH_MAX_V_REQUIRED
+
+#include <cdn-rawc/cdn-rawc-math.h>
+
+#define MAX_LENGTH (1 << 20)
+#define ELEMENTS_PER_RUN 50000000
+
+static ValueType sink;
+
+static ValueType serial_sum (ValueType *x0, uint32_t l);
+
+static ValueType
+serial_sum (ValueType *x0, uint32_t l)
+{
+	uint32_t i;
+	ValueType ret = x0[0];
+
+	for (i = 1; i < l; ++i)
+	{
+		ret += x0[i];
+	}
+
+	return ret;
+}
+
+static ValueType serial_sqsum (ValueType *x0, uint32_t l);
+
+static ValueType
+serial_sqsum (ValueType *x0, uint32_t l)
+{
+	uint32_t i;
+	ValueType ret = x0[0] * x0[0];
+
+	for (i = 1; i < l; ++i)
+	{
+		ret += x0[i] * x0[i];
+	}
+
+	return ret;
+}
+
+static ValueType serial_max (ValueType *x0, uint32_t l);
+
+static ValueType
+serial_max (ValueType *x0, uint32_t l)
+{
+	uint32_t i;
+	ValueType ret = x0[0];
+
+	for (i = 1; i < l; ++i)
+	{
+		ret = CDN_MATH_MAX (ret, x0[i]);
+	}
+
+	return ret;
+}
+
+static double now (void);
+
+static double
+now (void)
+{
+	struct timespec ts;
+
+	clock_gettime (CLOCK_MONOTONIC, &ts);
+	return ts.tv_sec + ts.tv_nsec * 1e-9;
+}
+
+typedef ValueType (*Reduce) (ValueType *x0, uint32_t l);
+
+static double time_reduce (Reduce f, ValueType *x, uint32_t l);
+
+static double
+time_reduce (Reduce f, ValueType *x, uint32_t l)
+{
+	uint32_t reps = ELEMENTS_PER_RUN / l;
+	uint32_t i;
+	double start;
+
+	if (reps == 0)
+	{
+		reps = 1;
+	}
+
+	start = now ();
+
+	for (i = 0; i < reps; ++i)
+	{
+		sink += f (x, l);
+	}
+
+	// ns per element
+	return (now () - start) * 1e9 / ((double)reps * l);
+}
+
+static double relative_error (ValueType v, long double ref);
+
+static double
+relative_error (ValueType v, long double ref)
+{
+	long double d = (long double)v - ref;
+
+	if (d < 0)
+	{
+		d = -d;
+	}
+
+	return (double)(d / (ref < 0 ? -ref : ref));
+}
+
+int
+main (void)
+{
+	static uint32_t const lengths[] = {4, 16, 64, 256, 1024, 4096, 16384, 65536, MAX_LENGTH};
+	ValueType *x;
+	uint32_t i;
+
+	x = malloc (sizeof (ValueType) * MAX_LENGTH);
+	srand (1);
+
+	for (i = 0; i < MAX_LENGTH; ++i)
+	{
+		x[i] = (ValueType)(1 + rand () / (double)RAND_MAX);
+	}
+
+	printf ("%8s %-6s %12s %12s %8s %12s %12s\n",
+	        "length", "func", "serial ns/el", "reduce ns/el", "speedup", "serial err", "reduce err");
+
+	for (i = 0; i < sizeof (lengths) / sizeof (lengths[0]); ++i)
+	{
+		uint32_t l = lengths[i];
+		long double ref = 0;
+		double ts;
+		double tr;
+		uint32_t j;
+
+		for (j = 0; j < l; ++j)
+		{
+			ref += x[j];
+		}
+
+		ts = time_reduce (serial_sum, x, l);
+		tr = time_reduce (CDN_MATH_SUM_V, x, l);
+
+		printf ("%8u %-6s %12.3f %12.3f %8.2f %12.3g %12.3g\n",
+		        l, "sum", ts, tr, ts / tr,
+		        relative_error (serial_sum (x, l), ref),
+		        relative_error (CDN_MATH_SUM_V (x, l), ref));
+
+		ts = time_reduce (serial_sqsum, x, l);
+		tr = time_reduce (CDN_MATH_SQSUM_V, x, l);
+
+		printf ("%8u %-6s %12.3f %12.3f %8.2f\n", l, "sqsum", ts, tr, ts / tr);
+
+		ts = time_reduce (serial_max, x, l);
+		tr = time_reduce (CDN_MATH_MAX_V, x, l);
+
+		printf ("%8u %-6s %12.3f %12.3f %8.2f\n", l, "max", ts, tr, ts / tr);
+	}
+
+	free (x);
+	return sink == 0;
+}
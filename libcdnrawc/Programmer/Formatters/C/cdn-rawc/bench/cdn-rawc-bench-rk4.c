@@ -0,0 +1,296 @@
+// Microbenchmark of a single Runge-Kutta step. Steps a synthetic network
+// (a ring of coupled linear states with a trivial diff, so that the time is
+// dominated by the integrator) of different sizes and compares the fused
+// integrator against the previous implementation which resolved the stage
+// buffers for every stage and made a separate pass to store each of them.
+
+#define _POSIX_C_SOURCE 199309L
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <stdint.h>
+#include <string.h>
+#include <time.h>
+
+#if defined (__x86_64__) || defined (__i386__)
+#include <x86intrin.h>
+#define HAVE_RDTSC
+#endif
+
+#ifndef ValueType
+#define ValueType double
+#endif
+
+#include <cdn-rawc/integrators/cdn-rawc-integrator-runge-kutta.h>
+
+#define STATES_PER_RUN 20000000
+
+// Each data segment holds the states followed by the derivatives
+static uint32_t num_states;
+
+static ValueType *get_states (void *data);
+
+static ValueType *
+get_states (void *data)
+{
+	return (ValueType *)data;
+}
+
+static ValueType *get_derivatives (void *data);
+
+static ValueType *
+get_derivatives (void *data)
+{
+	return (ValueType *)data + num_states;
+}
+
+static void *get_nth (void *data, uint32_t nth);
+
+static void *
+get_nth (void *data, uint32_t nth)
+{
+	return (ValueType *)data + nth * 2 * num_states;
+}
+
+static void prediff (void *data);
+
+static void
+prediff (void *data)
+{
+}
+
+static void diff (void *data, ValueType t, ValueType dt);
+
+static void
+diff (void *data, ValueType t, ValueType dt)
+{
+	ValueType *x = get_states (data);
+	ValueType *dx = get_derivatives (data);
+	uint32_t i;
+
+	for (i = 0; i < num_states; ++i)
+	{
+		dx[i] = x[i == num_states - 1 ? 0 : i + 1] - x[i];
+	}
+}
+
+// Previous implementation, kept as a reference
+static void
+reference_update (CdnRawcNetwork *network,
+                  void           *data,
+                  uint32_t        n,
+                  double          factor)
+{
+	ValueType *current_state;
+	ValueType *current_deriv;
+	ValueType *next_deriv;
+	ValueType *stored_state;
+	uint32_t num;
+	uint32_t i;
+
+	num = network->states.end - network->states.start;
+
+	current_state = network->get_states (data);
+	current_deriv = network->get_derivatives (data);
+	stored_state = network->get_states (network->get_nth (data, 1));
+	next_deriv = network->get_derivatives (network->get_nth (data, n + 1));
+
+	for (i = 0; i < num; ++i)
+	{
+		next_deriv[i] = current_deriv[i];
+		current_state[i] = stored_state[i] + factor * current_deriv[i];
+	}
+}
+
+static void
+reference_update_total (CdnRawcNetwork *network,
+                        void           *data,
+                        ValueType       dt)
+{
+	ValueType *current_state;
+	ValueType *stored_state;
+	ValueType *k1;
+	ValueType *k2;
+	ValueType *k3;
+	ValueType *k4;
+	uint32_t num;
+	uint32_t i;
+
+	num = network->states.end - network->states.start;
+
+	current_state = network->get_states (data);
+	stored_state = network->get_states (network->get_nth (data, 1));
+
+	k1 = network->get_derivatives (network->get_nth (data, 1));
+	k2 = network->get_derivatives (network->get_nth (data, 2));
+	k3 = network->get_derivatives (network->get_nth (data, 3));
+	k4 = network->get_derivatives (data);
+
+	for (i = 0; i < num; ++i)
+	{
+		current_state[i] = stored_state[i] + (1.0 / 6.0) * dt *
+		                   (k1[i] + 2 * k2[i] + 2 * k3[i] + k4[i]);
+	}
+}
+
+static void reference_diff (CdnRawcIntegrator *integrator,
+                            CdnRawcNetwork    *network,
+                            void              *data,
+                            ValueType          t,
+                            ValueType          dt);
+
+static void
+reference_diff (CdnRawcIntegrator *integrator,
+                CdnRawcNetwork    *network,
+                void              *data,
+                ValueType          t,
+                ValueType          dt)
+{
+	double hdt = 0.5 * dt;
+
+	memcpy (network->get_states (network->get_nth (data, 1)),
+	        network->get_states (data),
+	        sizeof(ValueType) * (network->states.end - network->states.start));
+
+	reference_update (network, data, 0, hdt);
+
+	network->prediff (data);
+	network->diff (data, t + hdt, hdt);
+
+	reference_update (network, data, 1, hdt);
+
+	network->prediff (data);
+	network->diff (data, t + hdt, hdt);
+
+	reference_update (network, data, 2, dt);
+
+	network->prediff (data);
+	network->diff (data, t + dt, hdt);
+
+	reference_update_total (network, data, dt);
+}
+
+static CdnRawcIntegrator reference = {
+	NULL,
+	reference_diff,
+	4
+};
+
+static double now (void);
+
+static double
+now (void)
+{
+	struct timespec ts;
+
+	clock_gettime (CLOCK_MONOTONIC, &ts);
+	return ts.tv_sec + ts.tv_nsec * 1e-9;
+}
+
+static uint64_t cycles (void);
+
+static uint64_t
+cycles (void)
+{
+#ifdef HAVE_RDTSC
+	return __rdtsc ();
+#else
+	return 0;
+#endif
+}
+
+typedef struct
+{
+	double ns;
+	double cycles;
+} Timing;
+
+static Timing time_steps (CdnRawcIntegrator *integrator, CdnRawcNetwork *network, ValueType *data, uint32_t steps);
+
+static Timing
+time_steps (CdnRawcIntegrator *integrator,
+            CdnRawcNetwork    *network,
+            ValueType         *data,
+            uint32_t           steps)
+{
+	Timing ret;
+	uint64_t c;
+	double start;
+	uint32_t i;
+
+	for (i = 0; i < num_states; ++i)
+	{
+		data[i] = (ValueType)(i % 7);
+	}
+
+	// Derivatives at the start of the first step, as
+	// cdn_rawc_integrator_step would have computed them
+	diff (data, 0, 0.001);
+
+	start = now ();
+	c = cycles ();
+
+	for (i = 0; i < steps; ++i)
+	{
+		integrator->diff (integrator, network, data, i * 0.001, 0.001);
+		diff (data, (i + 1) * 0.001, 0.001);
+	}
+
+	ret.cycles = (double)(cycles () - c) / steps;
+	ret.ns = (now () - start) * 1e9 / steps;
+
+	return ret;
+}
+
+int
+main (void)
+{
+	static uint32_t const sizes[] = {2, 8, 32, 128, 1024, 16384};
+
+	CdnRawcIntegrator *fused = cdn_rawc_integrator_runge_kutta ();
+	CdnRawcNetwork network;
+	uint32_t i;
+
+	memset (&network, 0, sizeof (network));
+
+	network.prediff = prediff;
+	network.diff = diff;
+	network.get_states = get_states;
+	network.get_derivatives = get_derivatives;
+	network.get_nth = get_nth;
+
+	printf ("%8s %12s %12s %14s %14s %8s\n",
+	        "states", "ref ns/step", "ns/step", "ref cyc/step", "cyc/step", "speedup");
+
+	for (i = 0; i < sizeof (sizes) / sizeof (sizes[0]); ++i)
+	{
+		uint32_t steps = STATES_PER_RUN / sizes[i];
+		ValueType *r1;
+		ValueType *r2;
+		Timing tr;
+		Timing tf;
+
+		num_states = sizes[i];
+		network.states.end = num_states;
+
+		r1 = calloc (2 * num_states * reference.order, sizeof (ValueType));
+		r2 = calloc (2 * num_states * fused->order, sizeof (ValueType));
+
+		tr = time_steps (&reference, &network, r1, steps);
+		tf = time_steps (fused, &network, r2, steps);
+
+		if (memcmp (r1, r2, sizeof (ValueType) * num_states) != 0)
+		{
+			fprintf (stderr, "Mismatch for %u states\n", num_states);
+			return 1;
+		}
+
+		printf ("%8u %12.1f %12.1f %14.0f %14.0f %8.2f\n",
+		        num_states, tr.ns, tf.ns, tr.cycles, tf.cycles, tr.ns / tf.ns);
+
+		free (r1);
+		free (r2);
+	}
+
+	return 0;
+}
@@ -1,8 +1,21 @@
 #include "cdn-rawc-integrator.h"
 #include "cdn-rawc-network.h"
+#include "cdn-rawc-profile.h"
+#include <stddef.h>
 #include <string.h>
 #include <stdio.h>
 
+void *
+cdn_rawc_integrator_get_work (CdnRawcIntegrator *integrator,
+                              CdnRawcNetwork    *network,
+                              void              *data)
+{
+	size_t slots;
+
+	slots = (size_t)network->size * (network->event_refinement + integrator->order);
+	return (char *)data + CDN_RAWC_INTEGRATOR_WORK_OFFSET (slots);
+}
+
 void
 cdn_rawc_integrator_run (CdnRawcIntegrator *integrator,
                          CdnRawcNetwork    *network,
@@ -24,63 +37,530 @@ cdn_rawc_integrator_run (CdnRawcIntegrator *integrator,
 	}
 }
 
+static void
+record_row (ValueType const *values,
+            uint32_t const  *indices,
+            uint32_t         num_indices,
+            ValueType       *row)
+{
+	uint32_t i;
+
+	for (i = 0; i < num_indices; ++i)
+	{
+		row[i] = values[indices[i]];
+	}
+}
+
+uint32_t
+cdn_rawc_integrator_record (CdnRawcIntegrator *integrator,
+                            CdnRawcNetwork    *network,
+                            void              *data,
+                            ValueType          from,
+                            ValueType          step,
+                            ValueType          to,
+                            uint32_t const    *indices,
+                            uint32_t           num_indices,
+                            ValueType         *buffer,
+                            uint32_t           max_rows)
+{
+	if (max_rows == 0)
+	{
+		return 0;
+	}
+
+	cdn_rawc_network_reset (network, data, from);
+
+	// The first row is always the initial state
+	record_row (cdn_rawc_network_get_data (network, data),
+	            indices,
+	            num_indices,
+	            buffer);
+
+	return 1 + cdn_rawc_integrator_record_steps (integrator,
+	                                             network,
+	                                             data,
+	                                             from,
+	                                             step,
+	                                             to,
+	                                             indices,
+	                                             num_indices,
+	                                             buffer + num_indices,
+	                                             max_rows - 1);
+}
+
+uint32_t
+cdn_rawc_integrator_record_steps (CdnRawcIntegrator *integrator,
+                                  CdnRawcNetwork    *network,
+                                  void              *data,
+                                  ValueType          from,
+                                  ValueType          step,
+                                  ValueType          to,
+                                  uint32_t const    *indices,
+                                  uint32_t           num_indices,
+                                  ValueType         *buffer,
+                                  uint32_t           max_rows)
+{
+	ValueType *values;
+	uint32_t rows = 0;
+
+	values = cdn_rawc_network_get_data (network, data);
+
+	while (rows < max_rows &&
+	       from < to &&
+	       !cdn_rawc_network_get_terminated (network, data))
+	{
+		cdn_rawc_integrator_step (integrator, network, data, from, step);
+		from += values[network->meta.dt];
+
+		record_row (values, indices, num_indices, buffer);
+
+		buffer += num_indices;
+		++rows;
+	}
+
+	return rows;
+}
+
+static void
+set_parameters (ValueType       *values,
+                uint32_t const  *param_indices,
+                uint32_t         num_params,
+                ValueType const *params)
+{
+	uint32_t i;
+
+	for (i = 0; i < num_params; ++i)
+	{
+		values[param_indices[i]] = params[i];
+	}
+}
+
+static void
+reset_instance (CdnRawcNetwork  *network,
+                void            *data,
+                ValueType        t,
+                uint32_t const  *param_indices,
+                uint32_t         num_params,
+                ValueType const *params)
+{
+	ValueType *values;
+
+	values = cdn_rawc_network_get_data (network, data);
+
+	// Same as reset, but with the parameters overridden before init so
+	// that initial values depending on them are computed correctly, and
+	// after init so that parameters with an initial value expression
+	// still take the given value
+	cdn_rawc_network_prepare (network, data, t);
+	set_parameters (values, param_indices, num_params, params);
+
+	cdn_rawc_network_init (network, data, t);
+	set_parameters (values, param_indices, num_params, params);
+}
+
+void
+cdn_rawc_integrator_reset_ensemble (CdnRawcIntegrator *integrator,
+                                    CdnRawcNetwork    *network,
+                                    void              *data,
+                                    uint32_t           count,
+                                    ValueType          t,
+                                    uint32_t const    *param_indices,
+                                    uint32_t           num_params,
+                                    ValueType const   *params)
+{
+	size_t stride;
+	uint32_t i;
+
+	stride = cdn_rawc_network_get_instance_size (network, integrator);
+
+	for (i = 0; i < count; ++i)
+	{
+		reset_instance (network,
+		                (char *)data + (size_t)i * stride,
+		                t,
+		                param_indices,
+		                num_params,
+		                params + (size_t)i * num_params);
+	}
+}
+
 void
-cdn_rawc_integrator_step (CdnRawcIntegrator *integrator,
-                          CdnRawcNetwork    *network,
-                          void              *data,
-                          ValueType          t,
-                          ValueType          dt)
+cdn_rawc_integrator_step_ensemble (CdnRawcIntegrator *integrator,
+                                   CdnRawcNetwork    *network,
+                                   void              *data,
+                                   uint32_t           count,
+                                   ValueType          t,
+                                   ValueType          dt)
 {
-	ValueType *current_state = 0;
-	ValueType *stored_state = 0;
+	size_t stride;
+	uint32_t i;
 
-	if (integrator && integrator->step)
+	stride = cdn_rawc_network_get_instance_size (network, integrator);
+
+	for (i = 0; i < count; ++i)
 	{
-		integrator->step (integrator, network, data, t, dt);
-		return;
+		void *instance = (char *)data + (size_t)i * stride;
+
+		if (!cdn_rawc_network_get_terminated (network, instance))
+		{
+			cdn_rawc_integrator_step (integrator, network, instance, t, dt);
+		}
 	}
+}
 
-	// Precompute step
-	network->pre (data, t, dt);
+void
+cdn_rawc_integrator_record_ensemble (CdnRawcIntegrator *integrator,
+                                     CdnRawcNetwork    *network,
+                                     void              *data,
+                                     uint32_t           count,
+                                     ValueType          from,
+                                     ValueType          step,
+                                     ValueType          to,
+                                     uint32_t const    *param_indices,
+                                     uint32_t           num_params,
+                                     ValueType const   *params,
+                                     uint32_t const    *indices,
+                                     uint32_t           num_indices,
+                                     ValueType         *buffer,
+                                     uint32_t           max_rows,
+                                     uint32_t          *rows)
+{
+	size_t stride;
+	uint32_t i;
 
-	if (network->event_refinement)
+	stride = cdn_rawc_network_get_instance_size (network, integrator);
+
+	for (i = 0; i < count; ++i)
 	{
-		// Store state in last data reserved for events data
-		void *storage = network->get_nth (data, integrator->order);
+		void *instance = (char *)data + (size_t)i * stride;
+		ValueType *out = buffer + (size_t)i * max_rows * num_indices;
+
+		if (max_rows == 0)
+		{
+			rows[i] = 0;
+			continue;
+		}
+
+		reset_instance (network,
+		                instance,
+		                from,
+		                param_indices,
+		                num_params,
+		                params + (size_t)i * num_params);
 
-		current_state = network->get_data (data);
-		stored_state = network->get_data (storage);
+		record_row (cdn_rawc_network_get_data (network, instance),
+		            indices,
+		            num_indices,
+		            out);
 
-		memcpy (stored_state, current_state, network->data_size);
+		rows[i] = 1 + cdn_rawc_integrator_record_steps (integrator,
+		                                                network,
+		                                                instance,
+		                                                from,
+		                                                step,
+		                                                to,
+		                                                indices,
+		                                                num_indices,
+		                                                out + num_indices,
+		                                                max_rows - 1);
 	}
+}
+
+static void
+count_refinement (CdnRawcNetwork *network,
+                  void           *data,
+                  uint32_t        event)
+{
+	uint32_t *refinements;
+
+	refinements = cdn_rawc_network_get_events_refinements (network, data);
+
+	if (refinements)
+	{
+		++refinements[event];
+	}
+}
+
+static void
+fire_events (CdnRawcNetwork *network,
+             void           *data,
+             ValueType       t,
+             ValueType       dt)
+{
+	CDN_RAWC_PROFILE (network, data, CDN_RAWC_PROFILE_EVENTS_FIRE,
+	                  network->events_fire (data));
+
+	network->events_post_update (data);
+
+	CDN_RAWC_PROFILE (network, data, CDN_RAWC_PROFILE_POST,
+	                  network->post (data, t + dt, dt));
+}
+
+// Integrates from the states stored in y0 over dt and evaluates the events
+// at the end of the step. Returns the earliest active event, or -1 if no
+// event became active
+static int64_t
+step_trial (CdnRawcIntegrator *integrator,
+            CdnRawcNetwork    *network,
+            void              *data,
+            ValueType const   *y0,
+            ValueType          t,
+            ValueType          dt)
+{
+	memcpy (network->get_states (data),
+	        y0,
+	        sizeof (ValueType) * (network->states.end - network->states.start));
+
+	CDN_RAWC_PROFILE (network, data, CDN_RAWC_PROFILE_DIFF,
+	                  network->diff (data, t, dt));
+
+	cdn_rawc_integrator_step_diff (integrator,
+	                               network,
+	                               data,
+	                               t,
+	                               dt);
+
+	CDN_RAWC_PROFILE (network, data, CDN_RAWC_PROFILE_EVENTS_UPDATE,
+	                  network->events_update (data));
+
+	if (network->get_events_active_size (data) == 0)
+	{
+		return -1;
+	}
+
+	return network->get_events_active (data, 0);
+}
+
+// Locates the earliest event in [t, t + dt] with the Illinois method. The
+// interval [lo, hi] (relative to t) brackets the event time, the event did
+// not fire when stepping to lo and did when stepping to hi. The values of the
+// event function at the ends of the bracket are used for the secant estimate,
+// falling back to the distance estimated by the event itself, or bisection,
+// when the secant does not fall inside the bracket (e.g. for events that
+// combine conditions). Only the integrated states are restored between
+// trials, which is why this localization is opt-in (see
+// CdnRawcEventLocalization).
+static void
+step_localize (CdnRawcIntegrator *integrator,
+               CdnRawcNetwork    *network,
+               void              *data,
+               ValueType          t,
+               ValueType          dt)
+{
+	ValueType *y0;
+	ValueType lo = 0;
+	ValueType hi = dt;
+	ValueType flo = 0;
+	ValueType fhi = 0;
+	int have_flo = 0;
+	int side = 0;
+	int at_hi = 1;
+	int64_t event;
+	CdnRawcEventValue *value;
+
+	// Store states in last data reserved for events data
+	y0 = network->get_states (network->get_nth (data, integrator->order));
+
+	memcpy (y0,
+	        network->get_states (data),
+	        sizeof (ValueType) * (network->states.end - network->states.start));
+
+	event = step_trial (integrator, network, data, y0, t, dt);
+
+	if (event < 0)
+	{
+		network->events_post_update (data);
+		return;
+	}
+
+	value = network->get_events_value (data, event);
+
+	flo = value->previous;
+	fhi = value->current;
+	have_flo = 1;
 
 	while (1)
 	{
-		// Compute diff
-		network->diff (data, t, dt);
-
-		cdn_rawc_integrator_step_diff (integrator,
-		                               network,
-		                               data,
-		                               t,
-		                               dt);
-
-		// Check for events
-		if (cdn_rawc_integrator_process_events (integrator,
-		                                        network,
-		                                        data,
-		                                        t,
-		                                        &dt) == CDN_RAWC_INTEGRATOR_EVENT_RESULT_OK)
+		ValueType x;
+		int64_t ev;
+
+		if (hi <= network->minimum_timestep ||
+		    hi - lo <= 1e-9 * dt ||
+		    (at_hi && value->distance >= (1 - 1e-9)))
 		{
 			break;
 		}
+
+		x = lo - flo * (hi - lo) / (fhi - flo);
+
+		// Aim just past the estimated event time (within the tolerance of
+		// the distance), so that an accurate estimate brackets the event
+		// from above and ends the search
+		if (x * (1 + 5e-10) < hi)
+		{
+			x *= 1 + 5e-10;
+		}
+
+		if (!have_flo || !(x > lo && x < hi))
+		{
+			// Distance estimated by the event for the step to hi
+			x = at_hi ? value->distance * hi : -1;
+
+			if (!(x > lo && x < hi))
+			{
+				x = lo + (hi - lo) / 2;
+			}
+		}
+
+		if (x < network->minimum_timestep)
+		{
+			x = network->minimum_timestep;
+		}
+
+		if (!(x > lo && x < hi))
+		{
+			break;
+		}
+
+		count_refinement (network, data, event);
+
+		CDN_RAWC_PROFILE (network, data, CDN_RAWC_PROFILE_EVENTS_REFINE,
+		                  ev = step_trial (integrator, network, data, y0, t, x));
+
+		if (ev >= 0)
+		{
+			value = network->get_events_value (data, ev);
+			hi = x;
+			at_hi = 1;
+
+			if (ev != event)
+			{
+				// An earlier event, its values at lo are not known
+				event = ev;
+				have_flo = 0;
+				side = 0;
+			}
+			else if (side > 0)
+			{
+				flo /= 2;
+			}
+
+			fhi = value->current;
+			side = 1;
+		}
 		else
 		{
-			memcpy (current_state,
-			        stored_state,
-			        network->data_size);
+			value = network->get_events_value (data, event);
+			lo = x;
+			at_hi = 0;
+
+			flo = value->current;
+			have_flo = 1;
+
+			if (side < 0)
+			{
+				fhi /= 2;
+			}
+
+			side = -1;
 		}
 	}
+
+	if (!at_hi)
+	{
+		CDN_RAWC_PROFILE (network, data, CDN_RAWC_PROFILE_EVENTS_REFINE,
+		                  step_trial (integrator, network, data, y0, t, hi));
+	}
+
+	fire_events (network, data, t, hi);
+}
+
+// Computes a step and processes the events at the end of it
+static CdnRawcIntegratorEventResult
+step_events (CdnRawcIntegrator *integrator,
+             CdnRawcNetwork    *network,
+             void              *data,
+             ValueType          t,
+             ValueType         *dt)
+{
+	CDN_RAWC_PROFILE (network, data, CDN_RAWC_PROFILE_DIFF,
+	                  network->diff (data, t, *dt));
+
+	cdn_rawc_integrator_step_diff (integrator,
+	                               network,
+	                               data,
+	                               t,
+	                               *dt);
+
+	return cdn_rawc_integrator_process_events (integrator,
+	                                           network,
+	                                           data,
+	                                           t,
+	                                           dt);
+}
+
+static void
+step (CdnRawcIntegrator *integrator,
+      CdnRawcNetwork    *network,
+      void              *data,
+      ValueType          t,
+      ValueType          dt)
+{
+	CdnRawcIntegratorEventResult result;
+	ValueType *current_state;
+	ValueType *stored_state;
+
+	if (integrator && integrator->step)
+	{
+		integrator->step (integrator, network, data, t, dt);
+		return;
+	}
+
+	// Precompute step
+	CDN_RAWC_PROFILE (network, data, CDN_RAWC_PROFILE_PRE,
+	                  network->pre (data, t, dt));
+
+	if (!network->event_refinement)
+	{
+		step_events (integrator, network, data, t, &dt);
+		return;
+	}
+
+	if (network->event_localization == CDN_RAWC_EVENT_LOCALIZATION_ILLINOIS)
+	{
+		step_localize (integrator, network, data, t, dt);
+		return;
+	}
+
+	// Store state in last data reserved for events data
+	current_state = network->get_data (data);
+	stored_state = network->get_data (network->get_nth (data, integrator->order));
+
+	memcpy (stored_state, current_state, network->data_size);
+
+	result = step_events (integrator, network, data, t, &dt);
+
+	// Retry with the timestep reduced to the distance of the event
+	while (result != CDN_RAWC_INTEGRATOR_EVENT_RESULT_OK)
+	{
+		memcpy (current_state,
+		        stored_state,
+		        network->data_size);
+
+		CDN_RAWC_PROFILE (network, data, CDN_RAWC_PROFILE_EVENTS_REFINE,
+		                  result = step_events (integrator, network, data, t, &dt));
+	}
+}
+
+void
+cdn_rawc_integrator_step (CdnRawcIntegrator *integrator,
+                          CdnRawcNetwork    *network,
+                          void              *data,
+                          ValueType          t,
+                          ValueType          dt)
+{
+	CDN_RAWC_PROFILE (network, data, CDN_RAWC_PROFILE_STEP,
+	                  step (integrator, network, data, t, dt));
 }
 
 CdnRawcIntegratorEventResult
@@ -94,7 +574,8 @@ cdn_rawc_integrator_process_events (CdnRawcIntegrator *integrator,
 	uint32_t event;
 	CdnRawcEventValue *event_value;
 
-	network->events_update (data);
+	CDN_RAWC_PROFILE (network, data, CDN_RAWC_PROFILE_EVENTS_UPDATE,
+	                  network->events_update (data));
 
 	num = network->get_events_active_size (data);
 
@@ -111,13 +592,12 @@ cdn_rawc_integrator_process_events (CdnRawcIntegrator *integrator,
 	    event_value->distance >= (1 - 1e-9))
 	{
 		// Fire all events
-		network->events_fire (data);
-		network->events_post_update (data);
-
-		network->post (data, t + *dt, *dt);
+		fire_events (network, data, t, *dt);
 		return CDN_RAWC_INTEGRATOR_EVENT_RESULT_OK;
 	}
 
+	count_refinement (network, data, event);
+
 	*dt = event_value->distance * *dt;
 
 	if (*dt < network->minimum_timestep)
@@ -137,8 +617,10 @@ cdn_rawc_integrator_step_diff (CdnRawcIntegrator *integrator,
 {
 	if (integrator && integrator->diff)
 	{
-		integrator->diff (integrator, network, data, t, dt);
+		CDN_RAWC_PROFILE (network, data, CDN_RAWC_PROFILE_INTEGRATOR_DIFF,
+		                  integrator->diff (integrator, network, data, t, dt));
 	}
 
-	network->post (data, t + dt, dt);
+	CDN_RAWC_PROFILE (network, data, CDN_RAWC_PROFILE_POST,
+	                  network->post (data, t + dt, dt));
 }
@@ -12,6 +12,12 @@ typedef enum
 	CDN_RAWC_INTEGRATOR_EVENT_RESULT_REFINE,
 } CdnRawcIntegratorEventResult;
 
+// Private storage of the integrator in an instance (see
+// CdnRawcIntegrator.work_size), zeroed on allocation
+void *cdn_rawc_integrator_get_work (CdnRawcIntegrator *integrator,
+                                    CdnRawcNetwork    *network,
+                                    void              *data);
+
 void cdn_rawc_integrator_run (CdnRawcIntegrator *integrator,
                               CdnRawcNetwork    *network,
                               void              *data,
@@ -19,6 +25,60 @@ void cdn_rawc_integrator_run (CdnRawcIntegrator *integrator,
                               ValueType          step,
                               ValueType          to);
 
+uint32_t cdn_rawc_integrator_record (CdnRawcIntegrator *integrator,
+                                     CdnRawcNetwork    *network,
+                                     void              *data,
+                                     ValueType          from,
+                                     ValueType          step,
+                                     ValueType          to,
+                                     uint32_t const    *indices,
+                                     uint32_t           num_indices,
+                                     ValueType         *buffer,
+                                     uint32_t           max_rows);
+
+uint32_t cdn_rawc_integrator_record_steps (CdnRawcIntegrator *integrator,
+                                           CdnRawcNetwork    *network,
+                                           void              *data,
+                                           ValueType          from,
+                                           ValueType          step,
+                                           ValueType          to,
+                                           uint32_t const    *indices,
+                                           uint32_t           num_indices,
+                                           ValueType         *buffer,
+                                           uint32_t           max_rows);
+
+void cdn_rawc_integrator_reset_ensemble (CdnRawcIntegrator *integrator,
+                                         CdnRawcNetwork    *network,
+                                         void              *data,
+                                         uint32_t           count,
+                                         ValueType          t,
+                                         uint32_t const    *param_indices,
+                                         uint32_t           num_params,
+                                         ValueType const   *params);
+
+void cdn_rawc_integrator_step_ensemble (CdnRawcIntegrator *integrator,
+                                        CdnRawcNetwork    *network,
+                                        void              *data,
+                                        uint32_t           count,
+                                        ValueType          t,
+                                        ValueType          dt);
+
+void cdn_rawc_integrator_record_ensemble (CdnRawcIntegrator *integrator,
+                                          CdnRawcNetwork    *network,
+                                          void              *data,
+                                          uint32_t           count,
+                                          ValueType          from,
+                                          ValueType          step,
+                                          ValueType          to,
+                                          uint32_t const    *param_indices,
+                                          uint32_t           num_params,
+                                          ValueType const   *params,
+                                          uint32_t const    *indices,
+                                          uint32_t           num_indices,
+                                          ValueType         *buffer,
+                                          uint32_t           max_rows,
+                                          uint32_t          *rows);
+
 void cdn_rawc_integrator_step (CdnRawcIntegrator *integrator,
                                CdnRawcNetwork    *network,
                                void              *data,
@@ -0,0 +1,194 @@
+
+#ifdef CDN_MATH_FAST_REQUIRED
+
+// Fast approximations of transcendental functions, used by the builtins of
+// functions for which CDN_MATH_<FUNC>_FAST (or CDN_MATH_FAST for all of them)
+// is defined. All approximations are evaluated in double precision. The
+// maximum errors below were measured against libm for double:
+//
+//   exp2, exp    relative error < 2.0e-9 (|x| <= 1022, libm outside)
+//   ln, log10    relative error < 7.5e-10
+//   pow          relative error < 2.0e-9 + 7.5e-10 * |x1 * log2 (x0)|
+//                (x0 > 0, libm otherwise)
+//   sin, cos     absolute error < 2.5e-9 (|x| <= 1e5, libm outside)
+//   tanh         relative error < 1.5e-9
+//   erf          absolute error < 1.5e-7 (Abramowitz and Stegun 7.1.26)
+//
+// The rounding below relies on strict IEEE semantics, do not compile with
+// -ffast-math (or -fassociative-math).
+
+#include <float.h>
+
+// Adding and subtracting 1.5 * 2^52 rounds a double (|x| < 2^51) to the
+// nearest integer without calling floor or needing SSE4.1
+#define CDN_MATH_FAST_ROUND(x) (((x) + 6755399441055744.0) - 6755399441055744.0)
+
+typedef union
+{
+	double d;
+	uint64_t i;
+} CdnMathFastDouble;
+
+static double cdn_math_fast_exp2 (double x) GNUC_UNUSED;
+
+static double
+cdn_math_fast_exp2 (double x)
+{
+	CdnMathFastDouble s;
+	double k;
+	double f;
+	double p;
+
+	if (!(x >= -1022 && x <= 1023))
+	{
+		return exp2 (x);
+	}
+
+	// 2^x = 2^k * 2^f with f in [-0.5, 0.5]
+	k = CDN_MATH_FAST_ROUND (x);
+	f = x - k;
+
+	p = 1.0 + f * (0.693147202855083 +
+	          f * (0.2402264791362649 +
+	          f * (0.055503324710999266 +
+	          f * (0.009618437357829216 +
+	          f * (0.001339887442232645 +
+	          f * 0.00015353361886286785)))));
+
+	s.i = (uint64_t)((int64_t)k + 1023) << 52;
+	return p * s.d;
+}
+
+static double cdn_math_fast_log2 (double x) GNUC_UNUSED;
+
+static double
+cdn_math_fast_log2 (double x)
+{
+	CdnMathFastDouble m;
+	double e;
+	double s;
+	double z;
+
+	if (!(x >= DBL_MIN && x <= DBL_MAX))
+	{
+		return log2 (x);
+	}
+
+	// x = 2^e * m with m in [sqrt(0.5), sqrt(2)]
+	m.d = x;
+	e = (double)((int)((m.i >> 52) & 0x7ff) - 1023);
+	m.i = (m.i & 0xfffffffffffffULL) | 0x3ff0000000000000ULL;
+
+	if (m.d > 1.41421356237309504880)
+	{
+		m.d *= 0.5;
+		e += 1;
+	}
+
+	// log2 (m) = log2 ((1 + s) / (1 - s)), odd in s
+	s = (m.d - 1) / (m.d + 1);
+	z = s * s;
+
+	return e + s * (2.8853900797891203 +
+	           z * (0.9617988475884278 +
+	           z * (0.5767143875992274 +
+	           z * 0.43173580845894194)));
+}
+
+static double cdn_math_fast_sin_cos (double x, int cosine) GNUC_UNUSED;
+
+static double
+cdn_math_fast_sin_cos (double x, int cosine)
+{
+	double k;
+	double r;
+	double z;
+	double ret;
+	int q;
+
+	if (!(fabs (x) <= 1e5))
+	{
+		return cosine ? cos (x) : sin (x);
+	}
+
+	// Reduce to r in [-pi/4, pi/4] (two part pi/2 constant) and select the
+	// quadrant, cos (x) is sin (x) shifted one quadrant
+	k = CDN_MATH_FAST_ROUND (x * 0.63661977236758134308);
+	r = (x - k * 1.57079632673412561417e+00) - k * 6.07710050650619224932e-11;
+	z = r * r;
+
+	q = (int)(((int64_t)k + cosine) & 3);
+
+	if (q & 1)
+	{
+		ret = 1.0 + z * (-0.49999999725107974 +
+		            z * (0.04166662332432403 +
+		            z * (-0.001388676379386004 +
+		            z * 2.439045066315645e-05)));
+	}
+	else
+	{
+		ret = r * (0.9999999967617974 +
+		       z * (-0.16666650224239554 +
+		       z * (0.008332016453062934 +
+		       z * -0.00019501822013732396)));
+	}
+
+	return (q & 2) ? -ret : ret;
+}
+
+static double cdn_math_fast_tanh (double x) GNUC_UNUSED;
+
+static double
+cdn_math_fast_tanh (double x)
+{
+	double a = fabs (x);
+	double z;
+	double e;
+
+	if (a < 0.55)
+	{
+		z = x * x;
+
+		return x * (0.9999999990646068 +
+		        z * (-0.33333310958121704 +
+		        z * (0.13332460748827377 +
+		        z * (-0.05384270727131744 +
+		        z * (0.021039675490210033 +
+		        z * -0.006235559566729195)))));
+	}
+	else if (a > 22)
+	{
+		return copysign (1.0, x);
+	}
+
+	e = cdn_math_fast_exp2 (2 * a * 1.44269504088896340736);
+	return copysign (1.0 - 2.0 / (e + 1.0), x);
+}
+
+static double cdn_math_fast_erf (double x) GNUC_UNUSED;
+
+static double
+cdn_math_fast_erf (double x)
+{
+	double a = fabs (x);
+	double t;
+	double p;
+
+	if (a > 6)
+	{
+		return copysign (1.0, x);
+	}
+
+	t = 1.0 / (1.0 + 0.3275911 * a);
+
+	p = t * (0.254829592 +
+	    t * (-0.284496736 +
+	    t * (1.421413741 +
+	    t * (-1.453152027 +
+	    t * 1.061405429))));
+
+	return copysign (1.0 - p * cdn_math_fast_exp2 (-a * a * 1.44269504088896340736), x);
+}
+
+#endif /* CDN_MATH_FAST_REQUIRED */
@@ -15,6 +15,32 @@
 #define M_PI 3.14159265358979323846
 #endif
 
+// Maximum number of elements reduced by the accumulators (sum, product, ...)
+// before partial results are combined pairwise
+#ifndef CDN_MATH_REDUCE_BLOCK
+#define CDN_MATH_REDUCE_BLOCK 128
+#endif
+
+// Number of rows per block in cwise broadcasts of tall matrices
+#ifndef CDN_MATH_BROADCAST_BLOCK
+#define CDN_MATH_BROADCAST_BLOCK 2048
+#endif
+
+// Vectorizable element wise kernels. When enabled, the _v builtins dispatch
+// to restrict qualified omp simd kernels if ret does not overlap any of the
+// inputs and fall back to the plain loops otherwise. The _ip forms always use
+// the plain loops.
+#ifdef CDN_MATH_ENABLE_SIMD
+#ifdef __cplusplus
+#define CDN_MATH_RESTRICT __restrict__
+#else
+#define CDN_MATH_RESTRICT restrict
+#endif
+
+#define CDN_MATH_SIMD _Pragma ("omp simd")
+#define CDN_MATH_OVERLAPS(a, b, l) ((a) < (b) + (l) && (b) < (a) + (l))
+#endif
+
 #define CDN_MATH_VALUE_TYPE_FUNC_REAL_ONE_MORE(Func,ValueType) CDN_MATH_VALUE_TYPE_FUNC_##ValueType(Func)
 #define CDN_MATH_VALUE_TYPE_FUNC_REAL(Func,ValueType) CDN_MATH_VALUE_TYPE_FUNC_REAL_ONE_MORE(Func,ValueType)
 #define CDN_MATH_VALUE_TYPE_FUNC(Func) CDN_MATH_VALUE_TYPE_FUNC_REAL(Func,ValueType)
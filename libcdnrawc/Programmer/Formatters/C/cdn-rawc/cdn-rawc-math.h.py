@@ -18,7 +18,7 @@ def print_guard(f):
 def print_guard_end(f):
     print("#endif /* CDN_MATH_{0} */".format(f.upper()))
 
-def print_func(f, n, body=None):
+def print_func(f, n, body=None, fast=None):
     print_guard(f)
 
     if f != 'rand':
@@ -32,15 +32,54 @@ def print_func(f, n, body=None):
     if not body:
         body = "return CDN_MATH_VALUE_TYPE_FUNC({0})({1});".format(f, argcall)
 
+    body = "\t" + body
+
+    if fast:
+        body = """#ifdef CDN_MATH_{0}_FAST
+	return (ValueType)({1});
+#else
+{2}
+#endif""".format(f.upper(), fast, body)
+
     print("""static inline ValueType cdn_math_{0}_builtin ({1}) GNUC_INLINE;
 
 static ValueType cdn_math_{0}_builtin ({1})
 {{
-	{2}
+{2}
 }}""".format(f, argdecl, body))
 
     print_guard_end(f)
 
+def print_simd_v(f, name, args, ptrs, size, body):
+    # Emits the restrict qualified, omp simd variant of a _v kernel together
+    # with the dispatch code used at the start of the plain builtin
+    sargs = [a.replace('ValueType *', 'ValueType * CDN_MATH_RESTRICT ') for a in args]
+
+    print("""#ifdef CDN_MATH_ENABLE_SIMD
+static ValueType *cdn_math_{0}_v{1}_simd_builtin ({2});
+
+static ValueType *
+cdn_math_{0}_v{1}_simd_builtin ({2})
+{{
+{3}
+
+	return ret;
+}}
+#endif
+""".format(f, name, ", ".join(sargs), body.replace('{simd}', 'CDN_MATH_SIMD')))
+
+    overlaps = " ||\n\t      ".join(['CDN_MATH_OVERLAPS (ret, {0}, {1})'.format(p, size) for p in ptrs])
+    callargs = ", ".join([a.split('*')[-1].split(' ')[-1] for a in args])
+
+    return """#ifdef CDN_MATH_ENABLE_SIMD
+	if (!({0}))
+	{{
+		return cdn_math_{1}_v{2}_simd_builtin ({3});
+	}}
+#endif
+
+""".format(overlaps, f, name, callargs)
+
 def print_func_v_intern(f, combos, ip):
     tps = {
         'm': 'ValueType *',
@@ -75,19 +114,28 @@ def print_func_v_intern(f, combos, ip):
             else:
                 cargs.append('x{0}'.format(i))
 
+        decl = "\tuint32_t i;\n\n"
+
+        loop = decl + """	{{simd}}
+	for (i = 0; i < l; ++i)
+	{{
+		{0}[i] = CDN_MATH_{1} ({2});
+	}}""".format(reti, f.upper(), ", ".join(cargs))
+
+        dispatch = ''
+
+        if not ip:
+            ptrs = ['x{0}'.format(i) for i in range(len(x)) if x[i] == 'm']
+            dispatch = print_simd_v(f, name, args + ['uint32_t l'], ptrs, 'l', loop)
+
         print("""static ValueType *cdn_math_{0}_v{1}_builtin ({2}, uint32_t l);
 
 static ValueType *cdn_math_{0}_v{1}_builtin ({2}, uint32_t l)
 {{
-	uint32_t i;
+{3}{4}{5}
 
-	for (i = 0; i < l; ++i)
-	{{
-		{5}[i] = CDN_MATH_{3} ({4});
-	}}
-
-	return ret;
-}}""".format(f, name, ", ".join(args), f.upper(), ", ".join(cargs), reti))
+	return {6};
+}}""".format(f, name, ", ".join(args), decl, dispatch, loop[len(decl):].replace('\t{simd}\n', ''), reti))
 
         print_guard_end('{0}_v{1}'.format(f, name))
 
@@ -104,72 +152,264 @@ def print_binary_v(f):
 def print_ternary_v(f):
     print_func_v(f, ('mmm', 'mm1', 'm1m', 'm11', '1mm', '1m1', '11m'))
 
-def print_accumulator_v(f, body, init=None, fini=None):
+def print_accumulator_v(f, combine, term='{0}', fini='{0}'):
+    # Reductions use four independent accumulators over blocks of at most
+    # CDN_MATH_REDUCE_BLOCK elements, and blocks are combined pairwise. This
+    # breaks the loop carried dependency on a single accumulator and makes
+    # the rounding error grow with log (l) instead of l.
     print_guard(f + '_v')
 
-    if not init:
-        init = 'x0[0]'
+    def comb(a, b):
+        return combine.format(a, b)
 
-    if not fini:
-        fini = 'ret'
+    def tm(i):
+        return term.format('x0[{0}]'.format(i))
 
-    print("""static ValueType cdn_math_{0}_v_builtin (ValueType *x0, uint32_t l);
+    def paren(e):
+        return e if e.endswith(')') else '(' + e + ')'
 
-static ValueType cdn_math_{0}_v_builtin (ValueType *x0, uint32_t l)
+    print("""static ValueType cdn_math_{0}_v_block_builtin (ValueType *x0, uint32_t l);
+
+static ValueType
+cdn_math_{0}_v_block_builtin (ValueType *x0, uint32_t l)
 {{
 	uint32_t i;
-	ValueType ret = {1};
+	ValueType r0;
+	ValueType r1;
+	ValueType r2;
+	ValueType r3;
 
-	for (i = 1; i < l; ++i)
+	if (l < 8)
 	{{
-		{2}
+		r0 = {1};
+
+		for (i = 1; i < l; ++i)
+		{{
+			r0 = {2};
+		}}
+
+		return r0;
 	}}
 
-	return {3};
-}}""".format(f, init, body, fini))
+	r0 = {1};
+	r1 = {3};
+	r2 = {4};
+	r3 = {5};
+
+	for (i = 4; i + 4 <= l; i += 4)
+	{{
+		r0 = {6};
+		r1 = {7};
+		r2 = {8};
+		r3 = {9};
+	}}
+
+	for (; i < l; ++i)
+	{{
+		r0 = {2};
+	}}
+
+	return {10};
+}}
+
+static ValueType cdn_math_{0}_v_pairwise_builtin (ValueType *x0, uint32_t l);
+
+static ValueType
+cdn_math_{0}_v_pairwise_builtin (ValueType *x0, uint32_t l)
+{{
+	uint32_t h;
+
+	if (l <= CDN_MATH_REDUCE_BLOCK)
+	{{
+		return cdn_math_{0}_v_block_builtin (x0, l);
+	}}
+
+	h = (l / 2) & ~3u;
+
+	return {11};
+}}
+
+static ValueType cdn_math_{0}_v_builtin (ValueType *x0, uint32_t l);
+
+static ValueType cdn_math_{0}_v_builtin (ValueType *x0, uint32_t l)
+{{
+	if (l <= CDN_MATH_REDUCE_BLOCK)
+	{{
+		return {12};
+	}}
+	else
+	{{
+		return {13};
+	}}
+}}""".format(f,
+             tm(0),
+             comb('r0', tm('i')),
+             tm(1),
+             tm(2),
+             tm(3),
+             comb('r0', tm('i')),
+             comb('r1', tm('i + 1')),
+             comb('r2', tm('i + 2')),
+             comb('r3', tm('i + 3')),
+             comb(paren(comb('r0', 'r1')), paren(comb('r2', 'r3'))),
+             comb('cdn_math_{0}_v_pairwise_builtin (x0, h)'.format(f),
+                  'cdn_math_{0}_v_pairwise_builtin (x0 + h, l - h)'.format(f)),
+             fini.format('cdn_math_{0}_v_block_builtin (x0, l)'.format(f)),
+             fini.format('cdn_math_{0}_v_pairwise_builtin (x0, l)'.format(f))))
 
     print_guard_end(f + '_v')
 
 def print_operator_v_crwise(f, op, whichwise):
+    # Broadcast of a vector (x0 for 1_m, x1 for m_1) against a column-major
+    # matrix. Besides the generic column loop this generates unrolled
+    # variants for matrices of 2, 3 or 4 rows (wide matrices, where the inner
+    # row loop would be too short to pay off) and, for cwise, a variant that
+    # is blocked over rows so that the broadcast vector stays in cache for
+    # tall matrices. The builtin dispatches on rows/columns at runtime. The
+    # generator only emits broadcasts against matrices of at least 2 rows
+    # (see CLike/Context.cs), so there is no single row variant.
     combos = {
-        '1m': {'x1': 'x0', 'xm': 'x1'},
-        'm1': {'x1': 'x1', 'xm': 'x0'}
-    }
-
-    whichsel = {
-        'cwise': 'r',
-        'rwise': 'c'
+        '1m': {'xv': 'x0', 'xm': 'x1'},
+        'm1': {'xv': 'x1', 'xm': 'x0'}
     }
 
     for x in combos:
         name = '_'.join(list(x))
         conf = combos[x]
 
-        print_guard('{0}_v_{1}_{2}'.format(f, whichwise, name))
+        # Keep the operand order of the expression
+        def expr(mi, v, xm=conf['xm']):
+            m = '{0}[{1}]'.format(xm, mi)
+
+            if x == '1m':
+                return '{0} {1} {2}'.format(v, op, m)
+            else:
+                return '{0} {1} {2}'.format(m, op, v)
+
+        fname = '{0}_v_{1}_{2}'.format(f, whichwise, name)
+        print_guard(fname)
+
+        args = ['ValueType *ret', 'ValueType *x0', 'ValueType *x1', 'uint32_t rows', 'uint32_t columns']
 
-        print("""static ValueType *cdn_math_{0}_v_{1}_{2}_builtin (ValueType *ret, ValueType *x0, ValueType *x1, uint32_t rows, uint32_t columns);
+        def at(r):
+            return 'o + {0}'.format(r) if r > 0 else 'o'
+
+        for k in (2, 3, 4):
+            if whichwise == 'cwise':
+                vdecl = ''.join(['\tValueType const v{0} = {1}[{0}];\n'.format(r, conf['xv']) for r in range(k)])
+                body = '\n'.join(['\t\tret[{0}] = {1};'.format(at(r), expr(at(r), 'v{0}'.format(r))) for r in range(k)])
+                vinner = ''
+            else:
+                vdecl = ''
+                vinner = '\t\tValueType const v = {0}[c];\n'.format(conf['xv'])
+                body = '\n'.join(['\t\tret[{0}] = {1};'.format(at(r), expr(at(r), 'v')) for r in range(k)])
+
+            print("""static ValueType *cdn_math_{0}_rows_{1}_builtin (ValueType *ret, ValueType *x0, ValueType *x1, uint32_t columns);
 
 static ValueType *
-cdn_math_{0}_v_{1}_{2}_builtin (ValueType *ret, ValueType *x0, ValueType *x1, uint32_t rows, uint32_t columns)
+cdn_math_{0}_rows_{1}_builtin (ValueType *ret, ValueType *x0, ValueType *x1, uint32_t columns)
 {{
-	uint32_t c;
-	uint32_t i = 0;
+{2}	uint32_t c;
 
 	for (c = 0; c < columns; ++c)
 	{{
-		uint32_t r;
+		uint32_t const o = c * {1};
+{3}
+{4}
+	}}
+
+	return ret;
+}}
+""".format(fname, k, vdecl, vinner, body))
+
+        if whichwise == 'cwise':
+            print("""static ValueType *cdn_math_{0}_blocked_builtin ({1});
+
+static ValueType *
+cdn_math_{0}_blocked_builtin ({1})
+{{
+	uint32_t b;
+
+	for (b = 0; b < rows; b += CDN_MATH_BROADCAST_BLOCK)
+	{{
+		uint32_t const e = rows - b > CDN_MATH_BROADCAST_BLOCK ? b + CDN_MATH_BROADCAST_BLOCK : rows;
+		uint32_t c;
+
+		for (c = 0; c < columns; ++c)
+		{{
+			uint32_t const o = c * rows;
+			uint32_t r;
+
+			for (r = b; r < e; ++r)
+			{{
+				ret[o + r] = {2};
+			}}
+		}}
+	}}
+
+	return ret;
+}}
+""".format(fname, ", ".join(args), expr('o + r', '{0}[r]'.format(conf['xv']))))
+
+            blocked = """	if (rows > CDN_MATH_BROADCAST_BLOCK && columns > 1)
+	{{
+		return cdn_math_{0}_blocked_builtin (ret, x0, x1, rows, columns);
+	}}
+
+""".format(fname)
+        else:
+            blocked = ''
+
+        decl = "\tuint32_t c;\n\n"
+
+        if whichwise == 'cwise':
+            vinner = ''
+            v = '{0}[r]'.format(conf['xv'])
+        else:
+            # Read the broadcast value once per column, ret may alias it
+            vinner = '\t\tValueType const v = {0}[c];\n'.format(conf['xv'])
+            v = 'v'
+
+        # Index through per column pointers, which (unlike o + r in 32 bit
+        # arithmetic) the compiler can vectorize without versioning
+        loop = decl + """	for (c = 0; c < columns; ++c)
+	{{
+		ValueType *rc = ret + c * rows;
+		ValueType const *mc = {0} + c * rows;
+{1}		uint32_t r;
 
+		{{simd}}
 		for (r = 0; r < rows; ++r)
 		{{
-			ret[i] = {3}[i] {4} {5}[{6}];
-			++i;
+			rc[r] = {2};
 		}}
+	}}""".format(conf['xm'], vinner, expr('r', v, 'mc'))
+
+        dispatch = print_simd_v(f, '_{0}_{1}'.format(whichwise, name), args, ['x0', 'x1'], 'rows * columns', loop)
+
+        print("""static ValueType *cdn_math_{0}_builtin ({1});
+
+static ValueType *
+cdn_math_{0}_builtin ({1})
+{{
+{2}	switch (rows)
+	{{
+		case 2:
+			return cdn_math_{0}_rows_2_builtin (ret, x0, x1, columns);
+		case 3:
+			return cdn_math_{0}_rows_3_builtin (ret, x0, x1, columns);
+		case 4:
+			return cdn_math_{0}_rows_4_builtin (ret, x0, x1, columns);
+		default:
+			break;
 	}}
 
+{3}{4}{5}
+
 	return ret;
-}}""".format(f, whichwise, name, conf['xm'], op, conf['x1'], whichsel[whichwise]))
+}}""".format(fname, ", ".join(args), decl, blocked, dispatch, loop[len(decl):].replace('\t\t{simd}\n', '')))
 
-        print_guard_end('{0}_v_{1}_{2}'.format(f, whichwise, name))
+        print_guard_end(fname)
 
 def print_operator_v_cwise(f, op):
     print_operator_v_crwise(f, op, 'cwise')
@@ -213,19 +453,25 @@ def print_operator_v(f, n, op):
 
             cargs.append(carg)
 
+        decl = "\tuint32_t i;\n\n"
+
+        loop = decl + """	{{simd}}
+	for (i = 0; i < l; ++i)
+	{{
+		ret[i] = {0};
+	}}""".format(op.join(cargs))
+
+        ptrs = ['x{0}'.format(i) for i in range(len(x)) if x[i] == 'm']
+        dispatch = print_simd_v(f, name, ['ValueType *ret'] + args + ['uint32_t l'], ptrs, 'l', loop)
+
         print("""static ValueType *cdn_math_{0}_v{1}_builtin (ValueType *ret, {2}, uint32_t l);
 
 static ValueType *cdn_math_{0}_v{1}_builtin (ValueType *ret, {2}, uint32_t l)
 {{
-	uint32_t i;
-
-	for (i = 0; i < l; ++i)
-	{{
-		ret[i] = {4};
-	}}
+{3}{4}{5}
 
 	return ret;
-}}""".format(f, name, ", ".join(args), f.upper(), op.join(cargs)))
+}}""".format(f, name, ", ".join(args), decl, dispatch, loop[len(decl):].replace('\t{simd}\n', '')))
 
         print_guard_end('{0}_v{1}'.format(f, name))
 
@@ -305,16 +551,42 @@ print("""
 #define CDN_MATH_SQRT_REQUIRED
 #endif""")
 
+# Fast approximations (see cdn-rawc-math-fast.h), enabled per function with
+# CDN_MATH_<FUNC>_FAST or for all of them with CDN_MATH_FAST
+fast = {
+    'sin': 'cdn_math_fast_sin_cos (x0, 0)',
+    'cos': 'cdn_math_fast_sin_cos (x0, 1)',
+    'tanh': 'cdn_math_fast_tanh (x0)',
+    'exp': 'cdn_math_fast_exp2 (x0 * 1.44269504088896340736)',
+    'exp2': 'cdn_math_fast_exp2 (x0)',
+    'erf': 'cdn_math_fast_erf (x0)',
+    'log10': 'cdn_math_fast_log2 (x0) * 0.30102999566398119521',
+    'ln': 'cdn_math_fast_log2 (x0) * 0.69314718055994530942',
+    'pow': 'x0 > 0 ? cdn_math_fast_exp2 (x1 * cdn_math_fast_log2 (x0)) : CDN_MATH_VALUE_TYPE_FUNC(pow) (x0, x1)',
+}
+
+for f in sorted(fast):
+    print("""
+#if defined(CDN_MATH_FAST) && !defined(CDN_MATH_{0}_FAST)
+#define CDN_MATH_{0}_FAST
+#endif
+
+#if defined(CDN_MATH_{0}_FAST) && defined(CDN_MATH_{0}_REQUIRED) && !defined(CDN_MATH_{0})
+#define CDN_MATH_FAST_REQUIRED
+#endif""".format(f.upper()))
+
+include('cdn-rawc-math-fast.h')
+
 for f in unary:
-    print_func(f, 1)
+    print_func(f, 1, fast=fast.get(f))
 
 for f in binary:
-    print_func(f, 2)
+    print_func(f, 2, fast=fast.get(f))
 
 # Special cases
 print_func('invsqrt', 1, 'return 1.0 / CDN_MATH_SQRT (x0);')
 print_func('abs',   1, 'return CDN_MATH_VALUE_TYPE_FUNC(fabs) (x0);')
-print_func('ln',    1, 'return CDN_MATH_VALUE_TYPE_FUNC(log) (x0);')
+print_func('ln',    1, 'return CDN_MATH_VALUE_TYPE_FUNC(log) (x0);', fast['ln'])
 print_func('sign',  1, 'return signbit (x0) ? -1 : 1;')
 print_func('csign', 2, 'return copysign (x0, x1);')
 print_func('lerp',  3, 'return x1 + (x2 - x1) * x0;')
@@ -353,6 +625,9 @@ print_func('sum', 2, 'return x0 + x1;')
 print_func('sqsum', 2, 'return x0 * x0 + x1 * x1;')
 print_func('sqsum_1', 1, 'return x0 * x0;')
 
+# Networks fill their random states from the per instance generator in
+# cdn-rawc-rand.h, this process global version is only used by the validation
+# build which has to reproduce the random () streams of codyn
 print_func('rand', 1, 'return (random () / (ValueType)RAND_MAX);')
 print_func('modulo', 2, """ValueType ans = CDN_MATH_VALUE_TYPE_FUNC(fmod) (x0, x1);
 
@@ -386,12 +661,12 @@ print_operator_v('nequal', 2, '!=')
 print_operator_v('or', 2, '||')
 print_operator_v('and', 2, '&&')
 
-print_accumulator_v('max', 'ret = CDN_MATH_MAX (ret, x0[i]);', 'x0[0]')
-print_accumulator_v('min', 'ret = CDN_MATH_MIN (ret, x0[i]);', 'x0[0]')
-print_accumulator_v('hypot', 'ret += x0[i] * x0[i];', 'x0[0] * x0[0]', 'CDN_MATH_SQRT (ret)')
-print_accumulator_v('sum', 'ret += x0[i];')
-print_accumulator_v('product', 'ret *= x0[i];')
-print_accumulator_v('sqsum', 'ret += x0[i] * x0[i];', 'x0[0] * x0[0]')
+print_accumulator_v('max', 'CDN_MATH_MAX ({0}, {1})')
+print_accumulator_v('min', 'CDN_MATH_MIN ({0}, {1})')
+print_accumulator_v('hypot', '{0} + {1}', '{0} * {0}', 'CDN_MATH_SQRT ({0})')
+print_accumulator_v('sum', '{0} + {1}')
+print_accumulator_v('product', '{0} * {1}')
+print_accumulator_v('sqsum', '{0} + {1}', '{0} * {0}')
 
 include('cdn-rawc-math-builtin.h')
 include('cdn-rawc-math-footer.h')
@@ -1,5 +1,7 @@
 #include "cdn-rawc-network.h"
+#include "cdn-rawc-profile.h"
 
+#include <stdint.h>
 #include <stdlib.h>
 #include <string.h>
 #include <ctype.h>
@@ -42,7 +44,8 @@ cdn_rawc_network_pre (CdnRawcNetwork *network,
                       ValueType       t,
                       ValueType       dt)
 {
-	network->pre (data, t, dt);
+	CDN_RAWC_PROFILE (network, data, CDN_RAWC_PROFILE_PRE,
+	                  network->pre (data, t, dt));
 }
 
 void
@@ -51,7 +54,8 @@ cdn_rawc_network_diff (CdnRawcNetwork *network,
                        ValueType       t,
                        ValueType       dt)
 {
-	network->diff (data, t, dt);
+	CDN_RAWC_PROFILE (network, data, CDN_RAWC_PROFILE_DIFF,
+	                  network->diff (data, t, dt));
 }
 
 void
@@ -60,14 +64,16 @@ cdn_rawc_network_post (CdnRawcNetwork *network,
                        ValueType       t,
                        ValueType       dt)
 {
-	network->post (data, t, dt);
+	CDN_RAWC_PROFILE (network, data, CDN_RAWC_PROFILE_POST,
+	                  network->post (data, t, dt));
 }
 
 void
 cdn_rawc_network_events_update (CdnRawcNetwork *network,
                                 void           *data)
 {
-	network->events_update (data);
+	CDN_RAWC_PROFILE (network, data, CDN_RAWC_PROFILE_EVENTS_UPDATE,
+	                  network->events_update (data));
 }
 
 void
@@ -81,7 +87,8 @@ void
 cdn_rawc_network_events_fire (CdnRawcNetwork *network,
                               void           *data)
 {
-	network->events_fire (data);
+	CDN_RAWC_PROFILE (network, data, CDN_RAWC_PROFILE_EVENTS_FIRE,
+	                  network->events_fire (data));
 }
 
 ValueType *
@@ -132,6 +139,36 @@ cdn_rawc_network_get_data_count (CdnRawcNetwork *network)
 	return network->data_count;
 }
 
+size_t
+cdn_rawc_network_get_instance_size (CdnRawcNetwork    *network,
+                                    CdnRawcIntegrator *integrator)
+{
+	size_t ret = (size_t)network->size * (network->event_refinement + integrator->order);
+	size_t work;
+
+	if (!integrator->work_size)
+	{
+		return ret;
+	}
+
+	work = integrator->work_size (integrator, network);
+
+	if (work == 0)
+	{
+		return ret;
+	}
+
+	// Private storage which does not fit in the address space
+	if (work > SIZE_MAX - ret - 2 * CDN_RAWC_INTEGRATOR_WORK_ALIGN)
+	{
+		return 0;
+	}
+
+	// Rounded up so that following instances of an ensemble are aligned
+	// as well
+	return CDN_RAWC_INTEGRATOR_WORK_OFFSET (ret) + CDN_RAWC_INTEGRATOR_WORK_OFFSET (work);
+}
+
 uint8_t
 cdn_rawc_network_get_type_size (CdnRawcNetwork *network)
 {
@@ -156,6 +193,71 @@ cdn_rawc_network_get_terminated (CdnRawcNetwork *network, void *data)
 	return network->get_terminated (data);
 }
 
+void
+cdn_rawc_network_seed (CdnRawcNetwork *network,
+                       void           *data,
+                       uint32_t        seed,
+                       uint32_t        stream)
+{
+	if (network->seed)
+	{
+		network->seed (data, seed, stream);
+	}
+}
+
+// Last random stream handed out by cdn_rawc_network_take_streams
+static uint32_t last_stream = 0;
+
+uint32_t
+cdn_rawc_network_take_streams (uint32_t count)
+{
+#ifdef __GNUC__
+	return __sync_fetch_and_add (&last_stream, count) + 1;
+#else
+	uint32_t ret = last_stream + 1;
+
+	last_stream += count;
+	return ret;
+#endif
+}
+
+uint32_t *
+cdn_rawc_network_get_events_refinements (CdnRawcNetwork *network,
+                                         void           *data)
+{
+	if (network->get_events_refinements)
+	{
+		return network->get_events_refinements (data);
+	}
+
+	return NULL;
+}
+
+uint32_t
+cdn_rawc_network_get_events_size (CdnRawcNetwork *network)
+{
+	return network->events_size;
+}
+
+void
+cdn_rawc_network_set_event_localization (CdnRawcNetwork           *network,
+                                         CdnRawcEventLocalization  localization)
+{
+	network->event_localization = localization;
+}
+
+CdnRawcProfile *
+cdn_rawc_network_get_profile (CdnRawcNetwork *network,
+                              void           *data)
+{
+	if (network->get_profile)
+	{
+		return network->get_profile (data);
+	}
+
+	return NULL;
+}
+
 #ifdef ENABLE_META_LOOKUP
 static uint8_t
 compare_names (char const *name, char const *cmpto, int len)
@@ -213,7 +315,7 @@ extract_next_part (char const  *s,
 			return NULL;
 		}
 
-		*len = s - ret - 1;
+		*len = s - ret;
 
 		// Skip over the double quote
 		++s;
@@ -223,12 +325,12 @@ extract_next_part (char const  *s,
 		ret = s;
 
 		// Read until the next dot or space
-		while (*s && *s != '.' && isspace (*s))
+		while (*s && *s != '.' && !isspace (*s))
 		{
 			++s;
 		}
 
-		*len = s - ret - 1;
+		*len = s - ret;
 	}
 
 	s = skip_ws (s);
@@ -248,11 +350,63 @@ extract_next_part (char const  *s,
 	return ret;
 }
 
+static uint8_t
+is_plain_name (char const *name)
+{
+	while (*name)
+	{
+		if (*name == '"' || isspace (*name))
+		{
+			return 0;
+		}
+
+		++name;
+	}
+
+	return 1;
+}
+
+static uint32_t
+rawc_find_child_indexed (CdnRawcNetwork *network,
+                         char const     *name)
+{
+	uint32_t lower = 0;
+	uint32_t upper = network->meta.names_size;
+
+	while (lower < upper)
+	{
+		uint32_t mid = lower + (upper - lower) / 2;
+		int cmp = strcmp (name, network->meta.names[mid].name);
+
+		if (cmp == 0)
+		{
+			return network->meta.names[mid].child;
+		}
+		else if (cmp < 0)
+		{
+			upper = mid;
+		}
+		else
+		{
+			lower = mid + 1;
+		}
+	}
+
+	return 0;
+}
+
 static uint32_t
 rawc_find_child (CdnRawcNetwork *network,
                  uint32_t        root,
                  char const     *name)
 {
+	// Names relative to the network can be looked up in the sorted name
+	// index, which does not depend on the number of siblings
+	if (root == 1 && network->meta.names_size > 0 && is_plain_name (name))
+	{
+		return rawc_find_child_indexed (network, name);
+	}
+
 	// Only support simple . syntax
 	do
 	{
@@ -347,7 +501,7 @@ cdn_rawc_network_meta_find_variable (CdnRawcNetwork *network,
 {
 	uint32_t child;
 
-	child = rawc_find_child (network, 1, name);
+	child = rawc_find_child (network, root, name);
 
 	if (child == 0 || network->meta.children[child].is_node)
 	{
@@ -366,7 +520,7 @@ cdn_rawc_network_meta_find_node (CdnRawcNetwork *network,
 {
 	uint32_t child;
 
-	child = rawc_find_child (network, 1, name);
+	child = rawc_find_child (network, root, name);
 
 	if (child == 0 || !network->meta.children[child].is_node)
 	{
@@ -384,7 +538,44 @@ void *
 cdn_rawc_network_alloc (CdnRawcNetwork *network,
                         uint32_t        order)
 {
-	return malloc (network->size * (network->event_refinement + order));
+	CdnRawcIntegrator slots = {NULL, NULL, order, NULL};
+
+	return cdn_rawc_network_alloc_ensemble (network, &slots, 1);
+}
+
+void *
+cdn_rawc_network_alloc_ensemble (CdnRawcNetwork    *network,
+                                 CdnRawcIntegrator *integrator,
+                                 uint32_t           count)
+{
+	size_t size = cdn_rawc_network_get_instance_size (network, integrator);
+	char *ret;
+	uint32_t i;
+
+	// Refuse sizes which do not fit in the address space instead of
+	// allocating a wrapped around (too small) block
+	if (size == 0 || count > SIZE_MAX / size)
+	{
+		return NULL;
+	}
+
+	// Zeroed, so that state kept by integrators in their private storage
+	// (e.g. statistics) starts out cleared
+	ret = calloc (count, size);
+
+	// Each instance gets its own random stream, not shared with any other
+	// instance allocated in the process
+	if (ret)
+	{
+		uint32_t stream = cdn_rawc_network_take_streams (count);
+
+		for (i = 0; i < count; ++i)
+		{
+			cdn_rawc_network_seed (network, ret + (size_t)i * size, 0, stream + i);
+		}
+	}
+
+	return ret;
 }
 
 void
@@ -46,6 +46,33 @@ void cdn_rawc_network_events_fire      (CdnRawcNetwork *network,
 uint8_t cdn_rawc_network_get_terminated (CdnRawcNetwork *network,
                                         void           *data);
 
+// Every (seed, stream) pair is an independent random sequence. Allocated
+// instances (single or in an ensemble) are seeded with seed 0 and a stream
+// of their own from cdn_rawc_network_take_streams. Instances seeded by hand
+// with the same seed must use distinct streams, e.g. ensembles seeded by
+// offsetting the stream of each instance (stream + i) must use
+// non-overlapping stream ranges
+void cdn_rawc_network_seed             (CdnRawcNetwork *network,
+                                        void           *data,
+                                        uint32_t        seed,
+                                        uint32_t        stream);
+
+// Reserves count consecutive streams for seed 0 that were not handed out
+// before in this process and returns the first. Stream 0 is never handed
+// out. Only thread safe when compiled with GCC (or a compatible compiler)
+uint32_t cdn_rawc_network_take_streams (uint32_t count);
+
+uint32_t *cdn_rawc_network_get_events_refinements (CdnRawcNetwork *network,
+                                                   void           *data);
+
+uint32_t cdn_rawc_network_get_events_size (CdnRawcNetwork *network);
+
+CdnRawcProfile *cdn_rawc_network_get_profile (CdnRawcNetwork *network,
+                                              void           *data);
+
+void cdn_rawc_network_set_event_localization (CdnRawcNetwork           *network,
+                                              CdnRawcEventLocalization  localization);
+
 ValueType *cdn_rawc_network_get_data        (CdnRawcNetwork *network,
                                              void           *data);
 
@@ -83,8 +110,20 @@ uint8_t cdn_rawc_network_get_type_size      (CdnRawcNetwork *network);
 uint32_t cdn_rawc_network_get_data_size     (CdnRawcNetwork *network);
 uint32_t cdn_rawc_network_get_data_count    (CdnRawcNetwork *network);
 
+// Size of an instance integrated by integrator: the order and event
+// refinement slots, followed by the private storage of the integrator
+size_t cdn_rawc_network_get_instance_size   (CdnRawcNetwork    *network,
+                                             CdnRawcIntegrator *integrator);
+
 #ifdef ENABLE_MALLOC
+// Only allocates the slots of an integrator of the given order, use
+// cdn_rawc_network_alloc_ensemble for integrators with private storage
 void *cdn_rawc_network_alloc                (CdnRawcNetwork *network, uint32_t order);
+
+void *cdn_rawc_network_alloc_ensemble       (CdnRawcNetwork    *network,
+                                             CdnRawcIntegrator *integrator,
+                                             uint32_t           count);
+
 void  cdn_rawc_network_free                 (void *ptr);
 #endif
 
@@ -0,0 +1,39 @@
+#define _POSIX_C_SOURCE 199309L
+
+#include "cdn-rawc-profile.h"
+
+#ifdef ENABLE_PROFILE
+#include <time.h>
+
+uint64_t
+cdn_rawc_profile_now (void)
+{
+	struct timespec ts;
+
+	clock_gettime (CLOCK_MONOTONIC, &ts);
+	return (uint64_t)ts.tv_sec * 1000000000 + ts.tv_nsec;
+}
+
+void
+cdn_rawc_profile_add (CdnRawcNetwork      *network,
+                      void                *data,
+                      CdnRawcProfilePhase  phase,
+                      uint64_t             start)
+{
+	CdnRawcProfile *profile;
+	uint64_t end;
+
+	// Read the clock first to leave the bookkeeping out of the timing
+	end = cdn_rawc_profile_now ();
+
+	if (!network->get_profile)
+	{
+		return;
+	}
+
+	profile = network->get_profile (data);
+
+	++profile->calls[phase];
+	profile->time[phase] += end - start;
+}
+#endif
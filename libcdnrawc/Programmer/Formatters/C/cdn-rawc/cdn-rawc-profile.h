@@ -0,0 +1,33 @@
+#ifndef __CDN_RAWC_PROFILE_H__
+#define __CDN_RAWC_PROFILE_H__
+
+#include <cdn-rawc/cdn-rawc-types.h>
+#include <cdn-rawc/cdn-rawc-macros.h>
+
+CDN_RAWC_BEGIN_DECLS
+
+#ifdef ENABLE_PROFILE
+uint64_t cdn_rawc_profile_now (void);
+
+void     cdn_rawc_profile_add (CdnRawcNetwork      *network,
+                               void                *data,
+                               CdnRawcProfilePhase  phase,
+                               uint64_t             start);
+
+// Runs stmt and adds a call and its duration to a phase in the profile of
+// the instance
+#define CDN_RAWC_PROFILE(network, data, phase, stmt)				\
+	do									\
+	{									\
+		uint64_t cdn_rawc_profile_start = cdn_rawc_profile_now ();	\
+										\
+		stmt;								\
+		cdn_rawc_profile_add (network, data, phase, cdn_rawc_profile_start);	\
+	} while (0)
+#else
+#define CDN_RAWC_PROFILE(network, data, phase, stmt) stmt
+#endif
+
+CDN_RAWC_END_DECLS
+
+#endif /* __CDN_RAWC_PROFILE_H__ */
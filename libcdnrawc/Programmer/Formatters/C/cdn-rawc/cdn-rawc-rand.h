@@ -0,0 +1,136 @@
+#ifndef __CDN_RAWC_RAND_H__
+#define __CDN_RAWC_RAND_H__
+
+#include <stdint.h>
+#include <stddef.h>
+#include <string.h>
+#include <cdn-rawc/cdn-rawc-types.h>
+#include <cdn-rawc/cdn-rawc-macros.h>
+
+CDN_RAWC_BEGIN_DECLS
+
+// Counter based random number generator (Philox4x32-10, Salmon et al.,
+// "Parallel random numbers: as easy as 1, 2, 3", SC 2011). Each block of four
+// random words is a pure function of (key, counter), so generators need no
+// shared state. The key is set when seeding (seed, stream) and is kept when
+// a network is reset, the counter is reset with the rest of the network so
+// that a seeded network reproduces its sequence after a reset.
+typedef struct
+{
+	uint32_t counter[2];
+	uint32_t key[2];
+} CdnRawcRand;
+
+#define CDN_RAWC_RAND_M0 0xD2511F53u
+#define CDN_RAWC_RAND_M1 0xCD9E8D57u
+#define CDN_RAWC_RAND_W0 0x9E3779B9u
+#define CDN_RAWC_RAND_W1 0xBB67AE85u
+
+// Number of values generated from a block of four words, doubles use two
+// words (53 bits) per value
+#define CDN_RAWC_RAND_PER_BLOCK (sizeof (ValueType) > 4 ? 2 : 4)
+
+static void cdn_rawc_rand_seed  (CdnRawcRand *rand,
+                                 uint32_t     seed,
+                                 uint32_t     stream) GNUC_UNUSED;
+
+static void cdn_rawc_rand_block (uint32_t const *counter,
+                                 uint32_t const *key,
+                                 uint32_t        block,
+                                 uint32_t       *ret) GNUC_UNUSED;
+
+static void cdn_rawc_rand_fill  (CdnRawcRand *rand,
+                                 ValueType   *ret,
+                                 uint32_t     size) GNUC_UNUSED;
+
+static void
+cdn_rawc_rand_seed (CdnRawcRand *rand,
+                    uint32_t     seed,
+                    uint32_t     stream)
+{
+	memset (rand->counter, 0, sizeof (rand->counter));
+
+	rand->key[0] = seed;
+	rand->key[1] = stream;
+}
+
+static void
+cdn_rawc_rand_block (uint32_t const *counter,
+                     uint32_t const *key,
+                     uint32_t        block,
+                     uint32_t       *ret)
+{
+	uint32_t c0 = counter[0] + block;
+	uint32_t c1 = counter[1] + (c0 < counter[0]);
+	uint32_t c2 = 0;
+	uint32_t c3 = 0;
+	uint32_t k0 = key[0];
+	uint32_t k1 = key[1];
+	int i;
+
+	for (i = 0; i < 10; ++i)
+	{
+		uint64_t p0 = (uint64_t)CDN_RAWC_RAND_M0 * c0;
+		uint64_t p1 = (uint64_t)CDN_RAWC_RAND_M1 * c2;
+
+		c0 = (uint32_t)(p1 >> 32) ^ c1 ^ k0;
+		c2 = (uint32_t)(p0 >> 32) ^ c3 ^ k1;
+		c1 = (uint32_t)p1;
+		c3 = (uint32_t)p0;
+
+		k0 += CDN_RAWC_RAND_W0;
+		k1 += CDN_RAWC_RAND_W1;
+	}
+
+	ret[0] = c0;
+	ret[1] = c1;
+	ret[2] = c2;
+	ret[3] = c3;
+}
+
+static void
+cdn_rawc_rand_fill (CdnRawcRand *rand,
+                    ValueType   *ret,
+                    uint32_t     size)
+{
+	uint32_t blocks = (size + CDN_RAWC_RAND_PER_BLOCK - 1) / CDN_RAWC_RAND_PER_BLOCK;
+	uint32_t counter;
+	uint32_t b;
+
+	// Blocks only depend on their index, which leaves the loop free of
+	// dependencies between iterations
+	for (b = 0; b < blocks; ++b)
+	{
+		uint32_t words[4];
+		uint32_t n = size - b * CDN_RAWC_RAND_PER_BLOCK;
+		uint32_t j;
+
+		if (n > CDN_RAWC_RAND_PER_BLOCK)
+		{
+			n = CDN_RAWC_RAND_PER_BLOCK;
+		}
+
+		cdn_rawc_rand_block (rand->counter, rand->key, b, words);
+
+		for (j = 0; j < n; ++j)
+		{
+			if (CDN_RAWC_RAND_PER_BLOCK == 2)
+			{
+				uint64_t m = ((uint64_t)(words[j * 2] >> 5) << 26) | (words[j * 2 + 1] >> 6);
+				ret[b * 2 + j] = (ValueType)(m * (1.0 / 9007199254740992.0));
+			}
+			else
+			{
+				ret[b * 4 + j] = (ValueType)((words[j] >> 8) * (1.0f / 16777216.0f));
+			}
+		}
+	}
+
+	counter = rand->counter[0];
+	rand->counter[0] += blocks;
+	rand->counter[1] += (rand->counter[0] < counter);
+}
+
+CDN_RAWC_END_DECLS
+
+#endif /* __CDN_RAWC_RAND_H__ */
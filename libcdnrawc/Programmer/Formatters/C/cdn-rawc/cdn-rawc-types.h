@@ -2,6 +2,7 @@
 #define __CDN_RAWC_TYPES_H__
 
 #include <stdint.h>
+#include <stddef.h>
 
 #ifdef __cplusplus
 extern "C" {
@@ -78,6 +79,15 @@ typedef struct
 	uint32_t next;
 } CdnRawcTemplateMeta;
 
+typedef struct
+{
+	// Full name relative to the network, with parts separated by dots
+	char const *name;
+
+	// Index into network.meta.children
+	uint32_t child;
+} CdnRawcNameMeta;
+
 typedef struct
 {
 	uint32_t t;
@@ -99,6 +109,10 @@ typedef struct
 
 	CdnRawcTemplateMeta const *templates;
 	uint32_t templates_size;
+
+	// Full names of all children, sorted by strcmp for binary search
+	CdnRawcNameMeta const *names;
+	uint32_t names_size;
 } CdnRawcNetworkMeta;
 
 typedef struct
@@ -108,6 +122,48 @@ typedef struct
 	ValueType distance;
 } CdnRawcEventValue;
 
+// How the time of an event is located within a step when the network has
+// events that need refinement
+typedef enum
+{
+	// Retry the whole step from a copy of all data, shrinking the timestep
+	// by the distance estimated by the event until it fires at the end of
+	// the step (possibly taking several shorter steps)
+	CDN_RAWC_EVENT_LOCALIZATION_STEP,
+
+	// Bracket the event time and refine it with the Illinois variant of
+	// the secant method, retrying from a copy of only the integrated
+	// states. Data written in post (e.g. the history of delayed states)
+	// keeps the values of the last rejected trial, so this is only valid
+	// for networks that compute everything else from the states. Never the
+	// default, networks opt in by setting event_localization
+	CDN_RAWC_EVENT_LOCALIZATION_ILLINOIS
+} CdnRawcEventLocalization;
+
+// Phases of a step that are profiled when the runtime and the network are
+// compiled with ENABLE_PROFILE. The refinement phase covers the repeated
+// trials of a step for events and overlaps with the other phases.
+typedef enum
+{
+	CDN_RAWC_PROFILE_STEP,
+	CDN_RAWC_PROFILE_PRE,
+	CDN_RAWC_PROFILE_DIFF,
+	CDN_RAWC_PROFILE_INTEGRATOR_DIFF,
+	CDN_RAWC_PROFILE_POST,
+	CDN_RAWC_PROFILE_EVENTS_UPDATE,
+	CDN_RAWC_PROFILE_EVENTS_FIRE,
+	CDN_RAWC_PROFILE_EVENTS_REFINE,
+	CDN_RAWC_PROFILE_NUM_PHASES
+} CdnRawcProfilePhase;
+
+typedef struct
+{
+	uint64_t calls[CDN_RAWC_PROFILE_NUM_PHASES];
+
+	// Cumulative time in nanoseconds
+	uint64_t time[CDN_RAWC_PROFILE_NUM_PHASES];
+} CdnRawcProfile;
+
 typedef struct
 {
 	ValueType *data;
@@ -161,15 +217,45 @@ typedef struct
 
 	uint8_t (*get_terminated) (void *data);
 
+	// Number of times the step was refined for each event (events_size
+	// entries), reset with the network
+	uint32_t *(*get_events_refinements) (void *data);
+
+	// Profile of an instance, reset with the network. NULL if the network
+	// was not compiled with ENABLE_PROFILE
+	CdnRawcProfile *(*get_profile) (void *data);
+
 	CdnRawcDimension const *(*get_dimension) (CdnRawcDimension const *dimensions,
 	                                          uint32_t                i);
 
+	// Seed the random number generator of an instance, NULL if the network
+	// does not use random numbers
+	void (*seed) (void     *data,
+	              uint32_t  seed,
+	              uint32_t  stream);
+
 	CdnRawcRange states;
 	CdnRawcRange derivatives;
 	CdnRawcRange event_values;
+	uint32_t events_size;
 
 	CdnRawcDimension const *dimensions;
 
+	// Data index of each entry in dimensions, dimensions_size entries.
+	// Data indices that are not listed have dimension 1x1
+	uint32_t const *dimension_indices;
+	uint32_t dimensions_size;
+
+	// Sparsity pattern of the Jacobian of the derivatives with respect to
+	// the states, in compressed sparse column format. Column j has the rows
+	// jacobian_rows[jacobian_columns[j]] to jacobian_rows[jacobian_columns[j + 1] - 1].
+	// Columns with the same color share no rows, so they can be estimated
+	// together. NULL if the pattern is not available (assume dense).
+	uint32_t const *jacobian_columns;
+	uint32_t const *jacobian_rows;
+	uint32_t const *jacobian_colors;
+	uint32_t jacobian_num_colors;
+
 	uint32_t size;
 	uint32_t data_size;
 	uint32_t data_count;
@@ -177,6 +263,9 @@ typedef struct
 	uint8_t event_refinement;
 	uint8_t type_size;
 
+	// CdnRawcEventLocalization
+	uint8_t event_localization;
+
 	ValueType minimum_timestep;
 	ValueType default_timestep;
 
@@ -200,8 +289,22 @@ struct _CdnRawcIntegrator
 	              ValueType          dt);
 
 	uint32_t order;
+
+	// Size in bytes of the private storage of the integrator in every
+	// instance (e.g. statistics or work buffers), which follows the order
+	// and event refinement slots, see cdn_rawc_integrator_get_work. NULL if
+	// the integrator does not keep any
+	size_t (*work_size) (CdnRawcIntegrator *integrator,
+	                     CdnRawcNetwork    *network);
 };
 
+// Alignment of the private storage of an integrator within an instance
+#define CDN_RAWC_INTEGRATOR_WORK_ALIGN 8
+
+// Offset of the private storage of an integrator within an instance, given
+// the size of its order and event refinement slots
+#define CDN_RAWC_INTEGRATOR_WORK_OFFSET(slots_size) (((slots_size) + CDN_RAWC_INTEGRATOR_WORK_ALIGN - 1) & ~((size_t)CDN_RAWC_INTEGRATOR_WORK_ALIGN - 1))
+
 #ifdef __cplusplus
 }
 #endif
@@ -3,6 +3,7 @@
 
 #include <cdn-rawc/cdn-rawc-types.h>
 #include <cdn-rawc/cdn-rawc-macros.h>
+#include <cdn-rawc/cdn-rawc-rand.h>
 #include <cdn-rawc/cdn-rawc-integrator.h>
 
 #endif /* __CDN_RAWC_H__ */
@@ -0,0 +1,300 @@
+#include "cdn-rawc-integrator-dormand-prince.h"
+#include <string.h>
+#include <math.h>
+#include <float.h>
+
+static void diff (CdnRawcIntegrator *integrator,
+                  CdnRawcNetwork    *network,
+                  void              *data,
+                  ValueType          t,
+                  ValueType          dt);
+
+static size_t work_size (CdnRawcIntegrator *integrator,
+                         CdnRawcNetwork    *network);
+
+static CdnRawcIntegratorDormandPrince integrator_class = {
+	{
+		NULL,
+		diff,
+		CDN_RAWC_INTEGRATOR_DORMAND_PRINCE_ORDER,
+		work_size
+	},
+	1e-6,
+	1e-8
+};
+
+CdnRawcIntegrator *
+cdn_rawc_integrator_dormand_prince ()
+{
+	return (CdnRawcIntegrator *)&integrator_class;
+}
+
+static size_t
+work_size (CdnRawcIntegrator *integrator,
+           CdnRawcNetwork    *network)
+{
+	return CDN_RAWC_INTEGRATOR_DORMAND_PRINCE_WORK_SIZE (network->states.end - network->states.start);
+}
+
+CdnRawcIntegratorDormandPrinceStatistics *
+cdn_rawc_integrator_dormand_prince_get_statistics (CdnRawcIntegrator *integrator,
+                                                   CdnRawcNetwork    *network,
+                                                   void              *data)
+{
+	CdnRawcIntegratorDormandPrinceWork *work;
+
+	work = cdn_rawc_integrator_get_work (integrator, network, data);
+	return &work->statistics;
+}
+
+#define NUM_STAGES 7
+
+// Butcher tableau, c and a for stages 2 to 6, b for the 5th order solution
+// and e = b - b* for the error estimate against the embedded 4th order
+// solution. The 7th stage is the derivative at the new state, which is
+// reused as the first stage of the next substep.
+static double const c[NUM_STAGES] = {
+	0, 1.0 / 5.0, 3.0 / 10.0, 4.0 / 5.0, 8.0 / 9.0, 1, 1
+};
+
+static double const a[NUM_STAGES][NUM_STAGES - 1] = {
+	{0},
+	{1.0 / 5.0},
+	{3.0 / 40.0, 9.0 / 40.0},
+	{44.0 / 45.0, -56.0 / 15.0, 32.0 / 9.0},
+	{19372.0 / 6561.0, -25360.0 / 2187.0, 64448.0 / 6561.0, -212.0 / 729.0},
+	{9017.0 / 3168.0, -355.0 / 33.0, 46732.0 / 5247.0, 49.0 / 176.0, -5103.0 / 18656.0},
+	{35.0 / 384.0, 0, 500.0 / 1113.0, 125.0 / 192.0, -2187.0 / 6784.0, 11.0 / 84.0}
+};
+
+static double const e[NUM_STAGES] = {
+	71.0 / 57600.0,
+	0,
+	-71.0 / 16695.0,
+	71.0 / 1920.0,
+	-17253.0 / 339200.0,
+	22.0 / 525.0,
+	-1.0 / 40.0
+};
+
+// Limits of the step size controller
+#define SAFETY 0.9
+#define MIN_FACTOR 0.2
+#define MAX_FACTOR 5.0
+
+#define EPSILON (sizeof (ValueType) > 4 ? DBL_EPSILON : FLT_EPSILON)
+
+static void
+stage (ValueType        *state,
+       ValueType const  *start,
+       ValueType       **k,
+       uint32_t          n,
+       ValueType         h,
+       uint32_t          num)
+{
+	uint32_t i;
+
+	for (i = 0; i < num; ++i)
+	{
+		ValueType s = 0;
+		uint32_t j;
+
+		for (j = 0; j < n; ++j)
+		{
+			s += a[n][j] * k[j][i];
+		}
+
+		state[i] = start[i] + h * s;
+	}
+}
+
+static ValueType
+error_norm (CdnRawcIntegratorDormandPrince  *dp,
+            ValueType const                 *start,
+            ValueType const                 *state,
+            ValueType                      **k,
+            ValueType                        h,
+            uint32_t                         num)
+{
+	ValueType ret = 0;
+	uint32_t i;
+
+	for (i = 0; i < num; ++i)
+	{
+		ValueType err = 0;
+		ValueType scale;
+		uint32_t j;
+
+		for (j = 0; j < NUM_STAGES; ++j)
+		{
+			err += e[j] * k[j][i];
+		}
+
+		scale = dp->atol + dp->rtol * fmax (fabs (start[i]), fabs (state[i]));
+		err = h * err / scale;
+
+		ret += err * err;
+	}
+
+	return sqrt (ret / num);
+}
+
+static ValueType
+step_factor (ValueType err)
+{
+	ValueType ret;
+
+	if (err == 0)
+	{
+		return MAX_FACTOR;
+	}
+
+	ret = SAFETY * pow (err, -0.2);
+
+	// Also catches errors that are not finite
+	if (!(ret >= MIN_FACTOR))
+	{
+		return MIN_FACTOR;
+	}
+	else if (ret > MAX_FACTOR)
+	{
+		return MAX_FACTOR;
+	}
+
+	return ret;
+}
+
+static void
+diff (CdnRawcIntegrator *integrator,
+      CdnRawcNetwork    *network,
+      void              *data,
+      ValueType          t,
+      ValueType          dt)
+{
+	CdnRawcIntegratorDormandPrince *dp = (CdnRawcIntegratorDormandPrince *)integrator;
+	CdnRawcIntegratorDormandPrinceWork *work;
+	ValueType *k[NUM_STAGES];
+	ValueType *state;
+	ValueType *start;
+	ValueType end;
+	ValueType tc;
+	ValueType h;
+	uint32_t num;
+	uint32_t i;
+
+	num = network->states.end - network->states.start;
+
+	if (num == 0)
+	{
+		return;
+	}
+
+	state = network->get_states (data);
+
+	// The state at the start of a substep and the first stage (which is
+	// computed before this function is called, see cdn_rawc_integrator_step)
+	// are stored in the first extra data segment, the other stages in the
+	// following segments. The final stage is the derivative of the network
+	// itself
+	start = network->get_states (network->get_nth (data, 1));
+
+	for (i = 0; i < NUM_STAGES - 1; ++i)
+	{
+		k[i] = network->get_derivatives (network->get_nth (data, i + 1));
+	}
+
+	k[NUM_STAGES - 1] = network->get_derivatives (data);
+
+	// The substep size of the previous step and the statistics are kept
+	// with the instance, the integrator itself is shared
+	work = cdn_rawc_integrator_get_work (integrator, network, data);
+
+	if (work->hint_t == t && work->hint > 0)
+	{
+		h = work->hint;
+	}
+	else
+	{
+		h = dt;
+	}
+
+	memcpy (k[0], k[NUM_STAGES - 1], sizeof (ValueType) * num);
+
+	tc = t;
+	end = t + dt;
+
+	while (tc < end)
+	{
+		ValueType hmin;
+		ValueType hstep;
+		ValueType err;
+		int last = 0;
+
+		// Do not let the substep shrink below what can still advance time
+		hmin = 16 * EPSILON * fmax (fabs (tc), fabs (dt));
+
+		if (hmin < network->minimum_timestep)
+		{
+			hmin = network->minimum_timestep;
+		}
+
+		if (h < hmin)
+		{
+			h = hmin;
+		}
+
+		hstep = h;
+
+		if (hstep >= end - tc)
+		{
+			hstep = end - tc;
+			last = 1;
+		}
+
+		memcpy (start, state, sizeof (ValueType) * num);
+
+		for (i = 1; i < NUM_STAGES; ++i)
+		{
+			stage (state, start, k, i, hstep, num);
+
+			network->prediff (data);
+			network->diff (data, tc + c[i] * hstep, hstep);
+
+			if (i != NUM_STAGES - 1)
+			{
+				memcpy (k[i], k[NUM_STAGES - 1], sizeof (ValueType) * num);
+			}
+		}
+
+		work->statistics.evaluations += NUM_STAGES - 1;
+
+		err = error_norm (dp, start, state, k, hstep, num);
+
+		if (err <= 1 || hstep <= hmin)
+		{
+			++work->statistics.accepted;
+
+			tc = last ? end : tc + hstep;
+
+			// First stage of the next substep
+			memcpy (k[0], k[NUM_STAGES - 1], sizeof (ValueType) * num);
+
+			// Only grow from the clipped last substep if it was accurate
+			// enough at the full size
+			if (!last || hstep == h)
+			{
+				h = hstep * step_factor (err);
+			}
+		}
+		else
+		{
+			++work->statistics.rejected;
+
+			memcpy (state, start, sizeof (ValueType) * num);
+			h = hstep * step_factor (err);
+		}
+	}
+
+	work->hint = h;
+	work->hint_t = end;
+}
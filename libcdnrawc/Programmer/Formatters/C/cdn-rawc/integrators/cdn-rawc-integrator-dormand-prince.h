@@ -0,0 +1,61 @@
+#ifndef __CDN_RAWC_INTEGRATOR_DORMAND_PRINCE_H__
+#define __CDN_RAWC_INTEGRATOR_DORMAND_PRINCE_H__
+
+#include <cdn-rawc/cdn-rawc-integrator.h>
+
+CDN_RAWC_BEGIN_DECLS
+
+// Adaptive Dormand-Prince 5(4) integrator. Every step of the network
+// (t to t + dt) is integrated with as many substeps as the error control
+// requires. The last accepted substep size is remembered per instance and
+// used as the first substep of the next step.
+//
+// The tolerances apply to all instances using the integrator. The substep
+// size and the statistics are kept per instance (so that instances can be
+// stepped concurrently), in the private storage of the integrator.
+typedef struct
+{
+	CdnRawcIntegrator integrator;
+
+	// Error tolerance per state: atol + rtol * |state|
+	ValueType rtol;
+	ValueType atol;
+} CdnRawcIntegratorDormandPrince;
+
+// Number of accepted and rejected substeps, and of derivative evaluations,
+// of an instance. They count from when the storage was (zero) allocated, and
+// are not cleared by a reset.
+typedef struct
+{
+	uint64_t accepted;
+	uint64_t rejected;
+	uint64_t evaluations;
+} CdnRawcIntegratorDormandPrinceStatistics;
+
+typedef struct
+{
+	CdnRawcIntegratorDormandPrinceStatistics statistics;
+
+	// Last accepted substep size, and the time of the end of the step it
+	// was taken in, so that it is not used after a reset
+	ValueType hint;
+	ValueType hint_t;
+} CdnRawcIntegratorDormandPrinceWork;
+
+// Stages 2 to 6 are evaluated in order slots 2 to 6, slot 1 holds the
+// state at the start of a substep and the first stage
+#define CDN_RAWC_INTEGRATOR_DORMAND_PRINCE_ORDER 7
+
+// Size of the private storage of an instance with the given number of states
+#define CDN_RAWC_INTEGRATOR_DORMAND_PRINCE_WORK_SIZE(states) sizeof (CdnRawcIntegratorDormandPrinceWork)
+
+CdnRawcIntegrator *cdn_rawc_integrator_dormand_prince (void);
+
+CdnRawcIntegratorDormandPrinceStatistics *
+cdn_rawc_integrator_dormand_prince_get_statistics (CdnRawcIntegrator *integrator,
+                                                   CdnRawcNetwork    *network,
+                                                   void              *data);
+
+CDN_RAWC_END_DECLS
+
+#endif /* __CDN_RAWC_INTEGRATOR_DORMAND_PRINCE_H__ */
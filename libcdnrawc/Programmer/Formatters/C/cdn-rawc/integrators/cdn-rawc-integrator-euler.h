@@ -11,6 +11,7 @@ typedef struct
 } CdnRawcIntegratorEuler;
 
 #define CDN_RAWC_INTEGRATOR_EULER_ORDER 1
+#define CDN_RAWC_INTEGRATOR_EULER_WORK_SIZE(states) 0
 
 CdnRawcIntegrator *cdn_rawc_integrator_euler (void);
 
@@ -0,0 +1,426 @@
+#include "cdn-rawc-integrator-rosenbrock.h"
+#include <string.h>
+#include <math.h>
+#include <float.h>
+#include <stdint.h>
+
+static void diff (CdnRawcIntegrator *integrator,
+                  CdnRawcNetwork    *network,
+                  void              *data,
+                  ValueType          t,
+                  ValueType          dt);
+
+static size_t work_size (CdnRawcIntegrator *integrator,
+                         CdnRawcNetwork    *network);
+
+static CdnRawcIntegratorRosenbrock integrator_class = {
+	{
+		NULL,
+		diff,
+		CDN_RAWC_INTEGRATOR_ROSENBROCK_ORDER,
+		work_size
+	}
+};
+
+CdnRawcIntegrator *
+cdn_rawc_integrator_rosenbrock ()
+{
+	return (CdnRawcIntegrator *)&integrator_class;
+}
+
+static size_t
+work_size (CdnRawcIntegrator *integrator,
+           CdnRawcNetwork    *network)
+{
+	size_t num = network->states.end - network->states.start;
+
+	// The matrix does not fit in the address space, which makes the
+	// allocation of the network fail
+	if (num > 0 && num > (SIZE_MAX - sizeof (CdnRawcIntegratorRosenbrockWork)) / (num * sizeof (ValueType) + sizeof (uint32_t)))
+	{
+		return SIZE_MAX;
+	}
+
+	return CDN_RAWC_INTEGRATOR_ROSENBROCK_WORK_SIZE (num);
+}
+
+uint64_t *
+cdn_rawc_integrator_rosenbrock_get_failures (CdnRawcIntegrator *integrator,
+                                             CdnRawcNetwork    *network,
+                                             void              *data)
+{
+	CdnRawcIntegratorRosenbrockWork *work;
+
+	work = cdn_rawc_integrator_get_work (integrator, network, data);
+	return &work->failures;
+}
+
+// gamma = 1 + 1 / sqrt(2)
+#define GAMMA 1.70710678118654752440
+
+#define EPSILON (sizeof (ValueType) > 4 ? DBL_EPSILON : FLT_EPSILON)
+
+// Estimates the Jacobian and stores the iteration matrix I - gamma dt J in m
+// (row major). The states are perturbed one color at a time, y0 and f0 are
+// the unperturbed states and derivatives.
+static void
+iteration_matrix (CdnRawcNetwork  *network,
+                  void            *data,
+                  ValueType        t,
+                  ValueType        dt,
+                  ValueType const *y0,
+                  ValueType const *f0,
+                  ValueType       *m,
+                  uint32_t         num)
+{
+	ValueType *state;
+	ValueType *deriv;
+	ValueType delta = sqrt (EPSILON);
+	ValueType gdt = GAMMA * dt;
+	uint32_t const *columns = network->jacobian_columns;
+	uint32_t const *rows = network->jacobian_rows;
+	uint32_t const *colors = network->jacobian_colors;
+	uint32_t num_colors;
+	uint32_t color;
+	uint32_t i;
+	uint32_t j;
+
+	state = network->get_states (data);
+	deriv = network->get_derivatives (data);
+
+	// Without a sparsity pattern every column is a color of its own
+	num_colors = columns ? network->jacobian_num_colors : num;
+
+	memset (m, 0, sizeof (ValueType) * num * num);
+
+	for (color = 0; color < num_colors; ++color)
+	{
+		for (j = 0; j < num; ++j)
+		{
+			if (columns ? colors[j] == color : j == color)
+			{
+				state[j] = y0[j] + delta * fmax (fabs (y0[j]), 1);
+			}
+		}
+
+		network->prediff (data);
+		network->diff (data, t, dt);
+
+		for (j = 0; j < num; ++j)
+		{
+			ValueType h;
+
+			if (columns ? colors[j] != color : j != color)
+			{
+				continue;
+			}
+
+			// Use the actual (rounded) perturbation
+			h = state[j] - y0[j];
+			state[j] = y0[j];
+
+			if (columns)
+			{
+				uint32_t r;
+
+				for (r = columns[j]; r < columns[j + 1]; ++r)
+				{
+					i = rows[r];
+					m[i * num + j] = -gdt * (deriv[i] - f0[i]) / h;
+				}
+			}
+			else
+			{
+				for (i = 0; i < num; ++i)
+				{
+					m[i * num + j] = -gdt * (deriv[i] - f0[i]) / h;
+				}
+			}
+		}
+	}
+
+	for (i = 0; i < num; ++i)
+	{
+		m[i * num + i] += 1;
+	}
+}
+
+// LU decomposition with partial pivoting, in place. Rows that are already
+// zero in the pivot column are skipped, which avoids most of the work for
+// sparse Jacobians. Returns 0 if the matrix is (numerically) singular, i.e.
+// a pivot is below the accuracy of the finite difference Jacobian relative to
+// the identity or the largest element.
+static int
+factorize (ValueType *m,
+           uint32_t  *pivots,
+           uint32_t   num)
+{
+	ValueType tiny = 1;
+	uint32_t i;
+	uint32_t j;
+	uint32_t k;
+
+	for (i = 0; i < num * num; ++i)
+	{
+		tiny = fmax (tiny, fabs (m[i]));
+	}
+
+	tiny *= sqrt (EPSILON);
+
+	for (k = 0; k < num; ++k)
+	{
+		uint32_t p = k;
+		ValueType *pivot;
+
+		for (i = k + 1; i < num; ++i)
+		{
+			if (fabs (m[i * num + k]) > fabs (m[p * num + k]))
+			{
+				p = i;
+			}
+		}
+
+		pivots[k] = p;
+
+		if (fabs (m[p * num + k]) <= tiny)
+		{
+			return 0;
+		}
+
+		if (p != k)
+		{
+			for (j = 0; j < num; ++j)
+			{
+				ValueType tmp = m[k * num + j];
+
+				m[k * num + j] = m[p * num + j];
+				m[p * num + j] = tmp;
+			}
+		}
+
+		pivot = m + k * num;
+
+		for (i = k + 1; i < num; ++i)
+		{
+			ValueType *row = m + i * num;
+			ValueType f;
+
+			if (row[k] == 0)
+			{
+				continue;
+			}
+
+			f = row[k] / pivot[k];
+			row[k] = f;
+
+			for (j = k + 1; j < num; ++j)
+			{
+				row[j] -= f * pivot[j];
+			}
+		}
+	}
+
+	return 1;
+}
+
+static void
+solve (ValueType const *m,
+       uint32_t const  *pivots,
+       ValueType       *b,
+       uint32_t         num)
+{
+	uint32_t i;
+	uint32_t j;
+
+	for (i = 0; i < num; ++i)
+	{
+		if (pivots[i] != i)
+		{
+			ValueType tmp = b[i];
+
+			b[i] = b[pivots[i]];
+			b[pivots[i]] = tmp;
+		}
+	}
+
+	for (i = 1; i < num; ++i)
+	{
+		ValueType s = b[i];
+
+		for (j = 0; j < i; ++j)
+		{
+			s -= m[i * num + j] * b[j];
+		}
+
+		b[i] = s;
+	}
+
+	for (i = num; i > 0; --i)
+	{
+		ValueType s = b[i - 1];
+
+		for (j = i; j < num; ++j)
+		{
+			s -= m[(i - 1) * num + j] * b[j];
+		}
+
+		b[i - 1] = s / m[(i - 1) * num + i - 1];
+	}
+}
+
+// Maximum number of times a step is halved when the iteration matrix is
+// singular
+#define MAX_HALVINGS 8
+
+// One ROS2 step of size h from the current state, the derivatives at the
+// current state must be up to date. Returns 0 if the step could not be taken
+// because the iteration matrix is singular, in which case the state is left
+// untouched
+static int
+step_ros2 (CdnRawcNetwork *network,
+           void           *data,
+           ValueType       t,
+           ValueType       h,
+           ValueType      *m,
+           uint32_t       *pivots,
+           uint32_t        num)
+{
+	ValueType *state;
+	ValueType *deriv;
+	ValueType *y0;
+	ValueType *f0;
+	ValueType *k1;
+	ValueType *k2;
+	uint32_t i;
+
+	state = network->get_states (data);
+	deriv = network->get_derivatives (data);
+
+	// The states and derivatives at the start of the step are stored in the
+	// first extra data segment, the stages in the second
+	y0 = network->get_states (network->get_nth (data, 1));
+	f0 = network->get_derivatives (network->get_nth (data, 1));
+	k1 = network->get_derivatives (network->get_nth (data, 2));
+	k2 = network->get_states (network->get_nth (data, 2));
+
+	memcpy (y0, state, sizeof (ValueType) * num);
+	memcpy (f0, deriv, sizeof (ValueType) * num);
+
+	iteration_matrix (network, data, t, h, y0, f0, m, num);
+
+	if (!factorize (m, pivots, num))
+	{
+		memcpy (deriv, f0, sizeof (ValueType) * num);
+		return 0;
+	}
+
+	// (I - gamma h J) k1 = f (t, y0)
+	memcpy (k1, f0, sizeof (ValueType) * num);
+	solve (m, pivots, k1, num);
+
+	for (i = 0; i < num; ++i)
+	{
+		state[i] = y0[i] + h * k1[i];
+	}
+
+	network->prediff (data);
+	network->diff (data, t + h, h);
+
+	// (I - gamma h J) k2 = f (t + h, y0 + h k1) - 2 k1
+	for (i = 0; i < num; ++i)
+	{
+		k2[i] = deriv[i] - 2 * k1[i];
+	}
+
+	solve (m, pivots, k2, num);
+
+	for (i = 0; i < num; ++i)
+	{
+		state[i] = y0[i] + h * (1.5 * k1[i] + 0.5 * k2[i]);
+	}
+
+	return 1;
+}
+
+static void
+diff (CdnRawcIntegrator *integrator,
+      CdnRawcNetwork    *network,
+      void              *data,
+      ValueType          t,
+      ValueType          dt)
+{
+	CdnRawcIntegratorRosenbrockWork *work;
+	ValueType *m;
+	uint32_t *pivots;
+	ValueType end;
+	ValueType tc;
+	ValueType h;
+	uint32_t halvings = 0;
+	uint32_t num;
+
+	num = network->states.end - network->states.start;
+
+	if (num == 0)
+	{
+		return;
+	}
+
+	// The iteration matrix (row major) and its pivots follow the header of
+	// the private storage of the instance, see work_size
+	work = cdn_rawc_integrator_get_work (integrator, network, data);
+	m = (ValueType *)(work + 1);
+	pivots = (uint32_t *)(m + (size_t)num * num);
+
+	tc = t;
+	end = t + dt;
+	h = dt;
+
+	// The derivatives at t are computed before this function is called (see
+	// cdn_rawc_integrator_step). A singular iteration matrix is retried with
+	// halved substeps, since it tends to the identity for small steps
+	while (tc < end)
+	{
+		int last = 0;
+
+		if (h >= end - tc)
+		{
+			h = end - tc;
+			last = 1;
+		}
+
+		if (!step_ros2 (network, data, tc, h, m, pivots, num))
+		{
+			if (halvings < MAX_HALVINGS)
+			{
+				h *= 0.5;
+				++halvings;
+				continue;
+			}
+			else
+			{
+				ValueType *state = network->get_states (data);
+				uint32_t i;
+
+				// Do not continue with a state the method could not
+				// compute, the NaN states propagate to everything that
+				// depends on them
+				++work->failures;
+
+				for (i = 0; i < num; ++i)
+				{
+					state[i] = NAN;
+				}
+
+				return;
+			}
+		}
+
+		tc = last ? end : tc + h;
+
+		if (tc < end)
+		{
+			network->prediff (data);
+			network->diff (data, tc, h);
+		}
+	}
+}
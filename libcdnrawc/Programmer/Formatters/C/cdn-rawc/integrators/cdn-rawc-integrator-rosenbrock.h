@@ -0,0 +1,49 @@
+#ifndef __CDN_RAWC_INTEGRATOR_ROSENBROCK_H__
+#define __CDN_RAWC_INTEGRATOR_ROSENBROCK_H__
+
+#include <cdn-rawc/cdn-rawc-integrator.h>
+
+CDN_RAWC_BEGIN_DECLS
+
+// Linearly implicit, L-stable Rosenbrock integrator for stiff networks (ROS2,
+// Verwer et al. 1999). The Jacobian is estimated by finite differences of
+// network->diff, perturbing all columns of one color of the Jacobian sparsity
+// pattern of the network at once.
+typedef struct
+{
+	CdnRawcIntegrator integrator;
+} CdnRawcIntegratorRosenbrock;
+
+// Private storage of an instance, so that instances can be stepped
+// concurrently. The header is followed by the iteration matrix (n * n values,
+// row major, for a network with n integrated states) and its n pivots. The
+// matrix is dense, which limits the method to networks with at most a few
+// hundred states.
+typedef struct
+{
+	// Number of steps which could not be completed because the iteration
+	// matrix remained singular after reducing the substep size. The states
+	// of such a step are set to NaN. Counts from when the storage was (zero)
+	// allocated, and is not cleared by a reset.
+	uint64_t failures;
+} CdnRawcIntegratorRosenbrockWork;
+
+// Slot 1 holds the state and derivatives at the start of a step, slot 2 the
+// stages
+#define CDN_RAWC_INTEGRATOR_ROSENBROCK_ORDER 3
+
+// Size of the private storage of an instance with the given number of states
+#define CDN_RAWC_INTEGRATOR_ROSENBROCK_WORK_SIZE(states) \
+	(sizeof (CdnRawcIntegratorRosenbrockWork) + \
+	 (size_t)(states) * (states) * sizeof (ValueType) + \
+	 (size_t)(states) * sizeof (uint32_t))
+
+CdnRawcIntegrator *cdn_rawc_integrator_rosenbrock (void);
+
+uint64_t *cdn_rawc_integrator_rosenbrock_get_failures (CdnRawcIntegrator *integrator,
+                                                       CdnRawcNetwork    *network,
+                                                       void              *data);
+
+CDN_RAWC_END_DECLS
+
+#endif /* __CDN_RAWC_INTEGRATOR_ROSENBROCK_H__ */
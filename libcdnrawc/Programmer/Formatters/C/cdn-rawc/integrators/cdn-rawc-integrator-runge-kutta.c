@@ -1,5 +1,5 @@
 #include "cdn-rawc-integrator-runge-kutta.h"
-#include <string.h>
+#include <stddef.h>
 
 static void diff (CdnRawcIntegrator *integrator,
                   CdnRawcNetwork    *network,
@@ -21,83 +21,62 @@ cdn_rawc_integrator_runge_kutta ()
 	return (CdnRawcIntegrator *)&integrator_class;
 }
 
+// Stores the first stage (K1) and the original states, and prepares the
+// states for the second stage
 static void
-update (CdnRawcNetwork    *network,
-        void              *data,
-        uint32_t           n,
-        double             factor)
+stage_first (ValueType       *state,
+             ValueType const *deriv,
+             ValueType       *stored_state,
+             ValueType       *total,
+             double           factor,
+             uint32_t         num)
 {
-	ValueType *current_state;
-	ValueType *current_deriv;
-	ValueType *next_deriv;
-	ValueType *stored_state;
-	uint32_t num;
 	uint32_t i;
 
-	num = network->states.end - network->states.start;
-
-	if (num == 0)
-	{
-		return;
-	}
-
-	current_state = network->get_states (data);
-	current_deriv = network->get_derivatives (data);
-
-	// Original states are always stored in the first extra data segment
-	stored_state = network->get_states (network->get_nth (data, 1));
-
-	next_deriv = network->get_derivatives (network->get_nth (data, n + 1));
-
 	for (i = 0; i < num; ++i)
 	{
-		// Store state
-		next_deriv[i] = current_deriv[i];
+		ValueType s = state[i];
+
+		stored_state[i] = s;
+		total[i] = deriv[i];
 
-		// Prepare next state
-		current_state[i] = stored_state[i] + factor * current_deriv[i];
+		state[i] = s + factor * deriv[i];
 	}
 }
 
-#include <stdio.h>
-
+// Accumulates an intermediate stage (K2, K3) and prepares the states for the
+// next stage
 static void
-update_total (CdnRawcNetwork *network,
-              void           *data,
-              ValueType       dt)
+stage_next (ValueType       *state,
+            ValueType const *deriv,
+            ValueType const *stored_state,
+            ValueType       *total,
+            double           factor,
+            uint32_t         num)
 {
-	ValueType *current_state;
-	ValueType *current_deriv;
-	ValueType *stored_state;
-	ValueType *k1;
-	ValueType *k2;
-	ValueType *k3;
-	ValueType *k4;
-	uint32_t num;
 	uint32_t i;
 
-	num = network->states.end - network->states.start;
-
-	if (num == 0)
+	for (i = 0; i < num; ++i)
 	{
-		return;
+		total[i] = total[i] + 2 * deriv[i];
+		state[i] = stored_state[i] + factor * deriv[i];
 	}
+}
 
-	current_state = network->get_states (data);
-	current_deriv = network->get_derivatives (data);
-
-	// Original states are always stored in the first extra data segment
-	stored_state = network->get_states (network->get_nth (data, 1));
-
-	k1 = network->get_derivatives (network->get_nth (data, 1));
-	k2 = network->get_derivatives (network->get_nth (data, 2));
-	k3 = network->get_derivatives (network->get_nth (data, 3));
-	k4 = current_deriv;
+static void
+stage_last (ValueType       *state,
+            ValueType const *deriv,
+            ValueType const *stored_state,
+            ValueType const *total,
+            ValueType        dt,
+            uint32_t         num)
+{
+	uint32_t i;
 
 	for (i = 0; i < num; ++i)
 	{
-		current_state[i] = stored_state[i] + (1.0 / 6.0) * dt *
-		                   (k1[i] + 2 * k2[i] + 2 * k3[i] + k4[i]);
+		state[i] = stored_state[i] + (1.0 / 6.0) * dt *
+		           (total[i] + deriv[i]);
 	}
 }
 
@@ -109,35 +88,52 @@ diff (CdnRawcIntegrator *integrator,
       ValueType          dt)
 {
 	double hdt = 0.5 * dt;
+	ValueType *state;
+	ValueType *deriv;
+	ValueType *stored_state;
+	ValueType *total;
+	void *stored;
+	uint32_t num;
+
+	num = network->states.end - network->states.start;
+
+	if (num == 0)
+	{
+		return;
+	}
+
+	// Resolve all buffers once per step, the network does not move them
+	// when it is evaluated. The original states are stored in the first
+	// extra data segment, together with the weighted sum of the stages
+	// (K1 + 2 K2 + 2 K3) which is accumulated in its derivatives
+	state = network->get_states (data);
+	deriv = network->get_derivatives (data);
+
+	stored = network->get_nth (data, 1);
 
-	// First, store original states in the next data segment
-	memcpy (network->get_states (network->get_nth (data, 1)),
-	        network->get_states (data),
-	        sizeof(ValueType) * (network->states.end - network->states.start));
+	stored_state = network->get_states (stored);
+	total = network->get_derivatives (stored);
 
-	// Then, store derivatives, K1, which are already computed before this
-	// function is called (see cdn_rawc_integrator_step) and update
-	// current states for the next diff
-	update (network, data, 0, hdt);
+	// K1 is already computed before this function is called (see
+	// cdn_rawc_integrator_step)
+	stage_first (state, deriv, stored_state, total, hdt, num);
 
 	// Calculate next diff, K2
 	network->prediff (data);
 	network->diff (data, t + hdt, hdt);
 
-	// Store derivatives for K2
-	update (network, data, 1, hdt);
+	stage_next (state, deriv, stored_state, total, hdt, num);
 
 	// Calculate next diff, K3
 	network->prediff (data);
 	network->diff (data, t + hdt, hdt);
 
-	// Store derivatives for K3
-	update (network, data, 2, dt);
+	stage_next (state, deriv, stored_state, total, dt, num);
 
 	// Calculate next diff, K4
 	network->prediff (data);
 	network->diff (data, t + dt, hdt);
 
 	// Update total derivative
-	update_total (network, data, dt);
+	stage_last (state, deriv, stored_state, total, dt, num);
 }
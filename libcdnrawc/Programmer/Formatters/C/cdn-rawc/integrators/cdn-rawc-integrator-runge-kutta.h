@@ -10,7 +10,8 @@ typedef struct
 	CdnRawcIntegrator integrator;
 } CdnRawcIntegratorRungeKutta;
 
-#define CDN_RAWC_INTEGRATOR_RUNGE_KUTTA_ORDER 4
+#define CDN_RAWC_INTEGRATOR_RUNGE_KUTTA_ORDER 2
+#define CDN_RAWC_INTEGRATOR_RUNGE_KUTTA_WORK_SIZE(states) 0
 
 CdnRawcIntegrator *cdn_rawc_integrator_runge_kutta (void);
 
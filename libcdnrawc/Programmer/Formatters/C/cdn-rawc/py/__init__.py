@@ -1,4 +1,11 @@
-import ctypes, platform, os, sys
+import ctypes, platform, os, sys, math, array, mmap, struct, threading
+
+try:
+    import numpy
+    import numpy.ctypeslib
+    import numpy.lib.format
+except ImportError:
+    numpy = None
 
 valuetype = ctypes.c_double
 valuetypeptr = ctypes.POINTER(valuetype)
@@ -27,12 +34,6 @@ class CdnRawcDimension(ctypes.Structure):
                                                                            self.rows,
                                                                            self.columns)
 
-class CdnRawcNetwork(ctypes.Structure):
-    pass
-
-class CdnRawcIntegrator(ctypes.Structure):
-    pass
-
 class CdnRawcStateMeta(ctypes.Structure):
     _fields_ = [
         ('name', ctypes.c_char_p),
@@ -63,6 +64,12 @@ class CdnRawcTemplateMeta(ctypes.Structure):
         ('next', ctypes.c_uint32),
     ]
 
+class CdnRawcNameMeta(ctypes.Structure):
+    _fields_ = [
+        ('name', ctypes.c_char_p),
+        ('child', ctypes.c_uint32),
+    ]
+
 class CdnRawcNetworkMeta(ctypes.Structure):
     _fields_ = [
         ('t', ctypes.c_uint32),
@@ -80,62 +87,167 @@ class CdnRawcNetworkMeta(ctypes.Structure):
 
         ('templates', ctypes.POINTER(CdnRawcTemplateMeta)),
         ('templates_size', ctypes.c_uint32),
+
+        ('names', ctypes.POINTER(CdnRawcNameMeta)),
+        ('names_size', ctypes.c_uint32),
+    ]
+
+# Phases of CdnRawcProfilePhase
+profile_phases = ['step',
+                  'pre',
+                  'diff',
+                  'integrator_diff',
+                  'post',
+                  'events_update',
+                  'events_fire',
+                  'events_refine']
+
+class CdnRawcProfile(ctypes.Structure):
+    _fields_ = [
+        ('calls', ctypes.c_uint64 * len(profile_phases)),
+        ('time', ctypes.c_uint64 * len(profile_phases)),
     ]
 
-# Callback signatures
-NetworkFuncT = ctypes.CFUNCTYPE(None, ctypes.c_void_p, valuetype)
-NetworkFuncTDT = ctypes.CFUNCTYPE(None, ctypes.c_void_p, valuetype, valuetype)
 NetworkFuncData = ctypes.CFUNCTYPE(None, ctypes.c_void_p)
-NetworkFuncValueGetter = ctypes.CFUNCTYPE(valuetypeptr, ctypes.c_void_p)
 
-IntegratorFunc = ctypes.CFUNCTYPE(None, ctypes.POINTER(CdnRawcIntegrator), ctypes.POINTER(CdnRawcNetwork), ctypes.c_void_p, valuetype, valuetype)
+def _network_fields(t):
+    return [('prepare', t.NetworkFuncT),
+            ('init', t.NetworkFuncT),
+            ('reset', t.NetworkFuncT),
+            ('update', t.NetworkFuncT),
+            ('pre', t.NetworkFuncTDT),
+            ('prediff', NetworkFuncData),
+            ('diff', t.NetworkFuncTDT),
+            ('post', t.NetworkFuncTDT),
+
+            ('events_update', NetworkFuncData),
+            ('events_post_update', NetworkFuncData),
+            ('events_fire', NetworkFuncData),
+
+            ('get_data', t.NetworkFuncValueGetter),
+            ('get_states', t.NetworkFuncValueGetter),
+            ('get_derivatives', t.NetworkFuncValueGetter),
+            ('get_nth', ctypes.CFUNCTYPE(ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint32)),
+
+            ('get_events_active_size', ctypes.CFUNCTYPE(ctypes.c_uint32, ctypes.c_void_p)),
+            ('get_events_active', ctypes.CFUNCTYPE(ctypes.c_uint32, ctypes.c_void_p, ctypes.c_uint32)),
+            ('get_events_value', ctypes.CFUNCTYPE(ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint32)),
+            ('get_terminated', ctypes.CFUNCTYPE(ctypes.c_void_p)),
+            ('get_events_refinements', ctypes.CFUNCTYPE(ctypes.POINTER(ctypes.c_uint32), ctypes.c_void_p)),
+            ('get_profile', ctypes.CFUNCTYPE(ctypes.POINTER(CdnRawcProfile), ctypes.c_void_p)),
+
+            ('get_dimension', ctypes.CFUNCTYPE(ctypes.c_void_p, ctypes.POINTER(CdnRawcDimension), ctypes.c_uint32)),
+            ('seed', ctypes.CFUNCTYPE(None, ctypes.c_void_p, ctypes.c_uint32, ctypes.c_uint32)),
+
+            ('states', CdnRawcRange),
+            ('derivatives', CdnRawcRange),
+            ('event_values', CdnRawcRange),
+            ('events_size', ctypes.c_uint32),
+
+            ('dimensions', ctypes.POINTER(CdnRawcDimension)),
+            ('dimension_indices', ctypes.POINTER(ctypes.c_uint32)),
+            ('dimensions_size', ctypes.c_uint32),
+
+            ('jacobian_columns', ctypes.POINTER(ctypes.c_uint32)),
+            ('jacobian_rows', ctypes.POINTER(ctypes.c_uint32)),
+            ('jacobian_colors', ctypes.POINTER(ctypes.c_uint32)),
+            ('jacobian_num_colors', ctypes.c_uint32),
+
+            ('size', ctypes.c_uint32),
+            ('data_size', ctypes.c_uint32),
+            ('data_count', ctypes.c_uint32),
+
+            ('event_refinement', ctypes.c_uint8),
+            ('type_size', ctypes.c_uint8),
+            ('event_localization', ctypes.c_uint8),
+
+            ('minimum_timestep', t.valuetype),
+            ('default_timestep', t.valuetype),
+
+            ('meta', CdnRawcNetworkMeta)]
+
+class ValueTypes:
+    # Structures and callback signatures that depend on the value type a
+    # network was compiled with. Use value_types() to get the (shared)
+    # instance for a ctypes type, so networks compiled for float and for
+    # double can be loaded in the same process.
+    def __init__(self, valuetype):
+        self.valuetype = valuetype
+        self.valuetypeptr = ctypes.POINTER(valuetype)
+
+        if not numpy is None:
+            self.dtype = numpy.dtype(valuetype)
+        else:
+            self.dtype = None
 
-CdnRawcNetwork._fields_ = [('prepare', NetworkFuncT),
-                           ('init', NetworkFuncT),
-                           ('reset', NetworkFuncT),
-                           ('update', NetworkFuncT),
-                           ('pre', NetworkFuncTDT),
-                           ('prediff', NetworkFuncData),
-                           ('diff', NetworkFuncTDT),
-                           ('post', NetworkFuncTDT),
+        # Callback signatures
+        self.NetworkFuncT = ctypes.CFUNCTYPE(None, ctypes.c_void_p, valuetype)
+        self.NetworkFuncTDT = ctypes.CFUNCTYPE(None, ctypes.c_void_p, valuetype, valuetype)
+        self.NetworkFuncValueGetter = ctypes.CFUNCTYPE(self.valuetypeptr, ctypes.c_void_p)
 
-                           ('events_update', NetworkFuncData),
-                           ('events_post_update', NetworkFuncData),
-                           ('events_fire', NetworkFuncData),
+        self.CdnRawcNetwork = type('CdnRawcNetwork', (ctypes.Structure,), {})
+        self.CdnRawcIntegrator = type('CdnRawcIntegrator', (ctypes.Structure,), {})
 
-                           ('get_data', NetworkFuncValueGetter),
-                           ('get_states', NetworkFuncValueGetter),
-                           ('get_derivatives', NetworkFuncValueGetter),
-                           ('get_nth', ctypes.CFUNCTYPE(ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint32)),
+        self.IntegratorFunc = ctypes.CFUNCTYPE(None,
+                                               ctypes.POINTER(self.CdnRawcIntegrator),
+                                               ctypes.POINTER(self.CdnRawcNetwork),
+                                               ctypes.c_void_p,
+                                               valuetype,
+                                               valuetype)
 
-                           ('get_events_active_size', ctypes.CFUNCTYPE(ctypes.c_uint32, ctypes.c_void_p)),
-                           ('get_events_active', ctypes.CFUNCTYPE(ctypes.c_uint32, ctypes.c_void_p, ctypes.c_uint32)),
-                           ('get_events_value', ctypes.CFUNCTYPE(ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint32)),
-                           ('get_terminated', ctypes.CFUNCTYPE(ctypes.c_void_p)),
+        self.CdnRawcNetwork._fields_ = _network_fields(self)
 
-                           ('get_dimension', ctypes.CFUNCTYPE(ctypes.c_void_p, ctypes.POINTER(CdnRawcDimension), ctypes.c_uint32)),
+        self.CdnRawcIntegrator._fields_ = [('step', self.IntegratorFunc),
+                                           ('diff', self.IntegratorFunc),
+                                           ('order', ctypes.c_uint32),
+                                           ('work_size', ctypes.CFUNCTYPE(ctypes.c_size_t,
+                                                                          ctypes.POINTER(self.CdnRawcIntegrator),
+                                                                          ctypes.POINTER(self.CdnRawcNetwork)))]
 
-                           ('states', CdnRawcRange),
-                           ('derivatives', CdnRawcRange),
-                           ('event_values', CdnRawcRange),
+        self.CdnRawcIntegratorDormandPrince = type('CdnRawcIntegratorDormandPrince', (ctypes.Structure,), {
+            '_fields_': [('integrator', self.CdnRawcIntegrator),
+                         ('rtol', valuetype),
+                         ('atol', valuetype)]
+        })
 
-                           ('dimensions', ctypes.c_void_p),
+_value_types = {}
 
-                           ('size', ctypes.c_uint32),
-                           ('data_size', ctypes.c_uint32),
-                           ('data_count', ctypes.c_uint32),
+def value_types(valuetype):
+    if not valuetype in _value_types:
+        _value_types[valuetype] = ValueTypes(valuetype)
 
-                           ('event_refinement', ctypes.c_uint8),
-                           ('type_size', ctypes.c_uint8),
+    return _value_types[valuetype]
 
-                           ('minimum_timestep', valuetype),
-                           ('default_timestep', valuetype),
+class CdnRawcIntegratorDormandPrinceStatistics(ctypes.Structure):
+    _fields_ = [('accepted', ctypes.c_uint64),
+                ('rejected', ctypes.c_uint64),
+                ('evaluations', ctypes.c_uint64)]
 
-                           ('meta', CdnRawcNetworkMeta)]
+# CdnRawcEventLocalization
+EVENT_LOCALIZATION_STEP = 0
+EVENT_LOCALIZATION_ILLINOIS = 1
 
-CdnRawcIntegrator._fields_ = [('step', IntegratorFunc),
-                              ('diff', IntegratorFunc),
-                              ('order', ctypes.c_uint32)]
+# Value types by the type_size of a network
+_type_sizes = {
+    4: ctypes.c_float,
+    8: ctypes.c_double,
+}
+
+# Default (double) bindings
+_double = value_types(valuetype)
+
+NetworkFuncT = _double.NetworkFuncT
+NetworkFuncTDT = _double.NetworkFuncTDT
+NetworkFuncValueGetter = _double.NetworkFuncValueGetter
+IntegratorFunc = _double.IntegratorFunc
+
+CdnRawcNetwork = _double.CdnRawcNetwork
+CdnRawcIntegrator = _double.CdnRawcIntegrator
+
+# The fields up to type_size do not depend on the value type, they are
+# used to find out the value type of a network before binding it
+class CdnRawcNetworkHeader(ctypes.Structure):
+    _fields_ = [f for f in CdnRawcNetwork._fields_ if f[0] != 'meta' and f[1] != valuetype]
 
 class API:
     def __init__(self, lib, name, libname):
@@ -144,8 +256,29 @@ class API:
         self.name = name
         self.libname = libname
 
+        # Bind to the value type the network was compiled with
+        spec = getattr(lib, 'cdn_rawc_' + name + '_network')
+        spec.restype = ctypes.POINTER(CdnRawcNetworkHeader)
+
+        type_size = spec().contents.type_size
+
+        if not type_size in _type_sizes:
+            raise ValueError('Unsupported value type size {0} in network `{1}\''.format(type_size, name))
+
+        self.types = value_types(_type_sizes[type_size])
+
+        valuetype = self.types.valuetype
+        valuetypeptr = self.types.valuetypeptr
+
+        CdnRawcNetwork = self.types.CdnRawcNetwork
+        CdnRawcIntegrator = self.types.CdnRawcIntegrator
+
+        self.valuetype = valuetype
+        self.valuetypeptr = valuetypeptr
+        self.dtype = self.types.dtype
+
         # Try loading integrators
-        for integrator in ['euler', 'runge_kutta']:
+        for integrator in ['euler', 'runge_kutta', 'dormand_prince', 'rosenbrock']:
             fullname = 'cdn_rawc_integrator_' + integrator
 
             try:
@@ -156,6 +289,20 @@ class API:
             ptr.restype = ctypes.POINTER(CdnRawcIntegrator)
             setattr(self, fullname, ptr)
 
+        if hasattr(self, 'cdn_rawc_integrator_dormand_prince'):
+            self.cdn_rawc_integrator_dormand_prince_get_statistics = lib.cdn_rawc_integrator_dormand_prince_get_statistics
+            self.cdn_rawc_integrator_dormand_prince_get_statistics.restype = ctypes.POINTER(CdnRawcIntegratorDormandPrinceStatistics)
+            self.cdn_rawc_integrator_dormand_prince_get_statistics.argtypes = [ctypes.POINTER(CdnRawcIntegrator),
+                                                                              ctypes.POINTER(CdnRawcNetwork),
+                                                                              ctypes.c_void_p]
+
+        if hasattr(self, 'cdn_rawc_integrator_rosenbrock'):
+            self.cdn_rawc_integrator_rosenbrock_get_failures = lib.cdn_rawc_integrator_rosenbrock_get_failures
+            self.cdn_rawc_integrator_rosenbrock_get_failures.restype = ctypes.POINTER(ctypes.c_uint64)
+            self.cdn_rawc_integrator_rosenbrock_get_failures.argtypes = [ctypes.POINTER(CdnRawcIntegrator),
+                                                                        ctypes.POINTER(CdnRawcNetwork),
+                                                                        ctypes.c_void_p]
+
         self.cdn_rawc_integrator_run = lib.cdn_rawc_integrator_run
         self.cdn_rawc_integrator_run.argtypes = [ctypes.POINTER(CdnRawcIntegrator),
                                                  ctypes.POINTER(CdnRawcNetwork),
@@ -171,6 +318,67 @@ class API:
                                                   valuetype,
                                                   valuetype]
 
+        self.cdn_rawc_integrator_record = lib.cdn_rawc_integrator_record
+        self.cdn_rawc_integrator_record.restype = ctypes.c_uint32
+        self.cdn_rawc_integrator_record.argtypes = [ctypes.POINTER(CdnRawcIntegrator),
+                                                    ctypes.POINTER(CdnRawcNetwork),
+                                                    ctypes.c_void_p,
+                                                    valuetype,
+                                                    valuetype,
+                                                    valuetype,
+                                                    ctypes.POINTER(ctypes.c_uint32),
+                                                    ctypes.c_uint32,
+                                                    valuetypeptr,
+                                                    ctypes.c_uint32]
+
+        self.cdn_rawc_integrator_record_steps = lib.cdn_rawc_integrator_record_steps
+        self.cdn_rawc_integrator_record_steps.restype = ctypes.c_uint32
+        self.cdn_rawc_integrator_record_steps.argtypes = [ctypes.POINTER(CdnRawcIntegrator),
+                                                          ctypes.POINTER(CdnRawcNetwork),
+                                                          ctypes.c_void_p,
+                                                          valuetype,
+                                                          valuetype,
+                                                          valuetype,
+                                                          ctypes.POINTER(ctypes.c_uint32),
+                                                          ctypes.c_uint32,
+                                                          valuetypeptr,
+                                                          ctypes.c_uint32]
+
+        self.cdn_rawc_integrator_reset_ensemble = lib.cdn_rawc_integrator_reset_ensemble
+        self.cdn_rawc_integrator_reset_ensemble.argtypes = [ctypes.POINTER(CdnRawcIntegrator),
+                                                            ctypes.POINTER(CdnRawcNetwork),
+                                                            ctypes.c_void_p,
+                                                            ctypes.c_uint32,
+                                                            valuetype,
+                                                            ctypes.POINTER(ctypes.c_uint32),
+                                                            ctypes.c_uint32,
+                                                            valuetypeptr]
+
+        self.cdn_rawc_integrator_step_ensemble = lib.cdn_rawc_integrator_step_ensemble
+        self.cdn_rawc_integrator_step_ensemble.argtypes = [ctypes.POINTER(CdnRawcIntegrator),
+                                                           ctypes.POINTER(CdnRawcNetwork),
+                                                           ctypes.c_void_p,
+                                                           ctypes.c_uint32,
+                                                           valuetype,
+                                                           valuetype]
+
+        self.cdn_rawc_integrator_record_ensemble = lib.cdn_rawc_integrator_record_ensemble
+        self.cdn_rawc_integrator_record_ensemble.argtypes = [ctypes.POINTER(CdnRawcIntegrator),
+                                                             ctypes.POINTER(CdnRawcNetwork),
+                                                             ctypes.c_void_p,
+                                                             ctypes.c_uint32,
+                                                             valuetype,
+                                                             valuetype,
+                                                             valuetype,
+                                                             ctypes.POINTER(ctypes.c_uint32),
+                                                             ctypes.c_uint32,
+                                                             valuetypeptr,
+                                                             ctypes.POINTER(ctypes.c_uint32),
+                                                             ctypes.c_uint32,
+                                                             valuetypeptr,
+                                                             ctypes.c_uint32,
+                                                             ctypes.POINTER(ctypes.c_uint32)]
+
         # Raw CdnRawcNetwork API
         self.cdn_rawc_network_init = lib.cdn_rawc_network_init
         self.cdn_rawc_network_init.argtypes = [ctypes.POINTER(CdnRawcNetwork),
@@ -225,15 +433,52 @@ class API:
         self.cdn_rawc_network_get_derivatives.argtypes = [ctypes.POINTER(CdnRawcNetwork),
                                                           ctypes.c_void_p]
 
+        self.cdn_rawc_network_get_nth = lib.cdn_rawc_network_get_nth
+        self.cdn_rawc_network_get_nth.restype = ctypes.c_void_p
+        self.cdn_rawc_network_get_nth.argtypes = [ctypes.POINTER(CdnRawcNetwork),
+                                                  ctypes.c_void_p,
+                                                  ctypes.c_uint32]
+
         self.cdn_rawc_network_get_dimension = lib.cdn_rawc_network_get_dimension
         self.cdn_rawc_network_get_dimension.restype = ctypes.POINTER(CdnRawcDimension)
         self.cdn_rawc_network_get_dimension.argtypes = [ctypes.POINTER(CdnRawcNetwork),
                                                           ctypes.c_uint32]
 
+        self.cdn_rawc_network_seed = lib.cdn_rawc_network_seed
+        self.cdn_rawc_network_seed.argtypes = [ctypes.POINTER(CdnRawcNetwork),
+                                               ctypes.c_void_p,
+                                               ctypes.c_uint32,
+                                               ctypes.c_uint32]
+
+        self.cdn_rawc_network_take_streams = lib.cdn_rawc_network_take_streams
+        self.cdn_rawc_network_take_streams.restype = ctypes.c_uint32
+        self.cdn_rawc_network_take_streams.argtypes = [ctypes.c_uint32]
+
+        self.cdn_rawc_network_get_events_refinements = lib.cdn_rawc_network_get_events_refinements
+        self.cdn_rawc_network_get_events_refinements.restype = ctypes.POINTER(ctypes.c_uint32)
+        self.cdn_rawc_network_get_events_refinements.argtypes = [ctypes.POINTER(CdnRawcNetwork),
+                                                                 ctypes.c_void_p]
+
+        self.cdn_rawc_network_get_profile = lib.cdn_rawc_network_get_profile
+        self.cdn_rawc_network_get_profile.restype = ctypes.POINTER(CdnRawcProfile)
+        self.cdn_rawc_network_get_profile.argtypes = [ctypes.POINTER(CdnRawcNetwork),
+                                                      ctypes.c_void_p]
+
         self.cdn_rawc_network_alloc = lib.cdn_rawc_network_alloc
         self.cdn_rawc_network_alloc.restype = ctypes.c_void_p
         self.cdn_rawc_network_alloc.argtypes = [ctypes.POINTER(CdnRawcNetwork), ctypes.c_uint32]
 
+        self.cdn_rawc_network_alloc_ensemble = lib.cdn_rawc_network_alloc_ensemble
+        self.cdn_rawc_network_alloc_ensemble.restype = ctypes.c_void_p
+        self.cdn_rawc_network_alloc_ensemble.argtypes = [ctypes.POINTER(CdnRawcNetwork),
+                                                         ctypes.POINTER(CdnRawcIntegrator),
+                                                         ctypes.c_uint32]
+
+        self.cdn_rawc_network_get_instance_size = lib.cdn_rawc_network_get_instance_size
+        self.cdn_rawc_network_get_instance_size.restype = ctypes.c_size_t
+        self.cdn_rawc_network_get_instance_size.argtypes = [ctypes.POINTER(CdnRawcNetwork),
+                                                            ctypes.POINTER(CdnRawcIntegrator)]
+
         self.cdn_rawc_network_free = lib.cdn_rawc_network_free
         self.cdn_rawc_network_free.argtypes = [ctypes.c_void_p]
 
@@ -266,27 +511,75 @@ class API:
     def Network(self):
         return Network(self)
 
+    def Ensemble(self, count, integrator=None):
+        return Ensemble(self, count, integrator)
+
+    def ParallelRunner(self, count, integrator=None, workers=None):
+        return ParallelRunner(self, count, integrator, workers)
+
     def Integrator(self, name):
         sym = 'cdn_rawc_integrator_' + name
 
-        if hasattr(self, sym):
-            return Integrator(getattr(self, sym)())
-        else:
+        if not hasattr(self, sym):
             return None
 
+        ptr = getattr(self, sym)()
+
+        if name == 'dormand_prince':
+            return DormandPrince(ptr, self.types, name)
+        elif name == 'rosenbrock':
+            return Rosenbrock(ptr, name)
+        else:
+            return Integrator(ptr, name)
+
     def Euler(self):
         return self.Integrator('euler')
 
     def RungeKutta(self):
         return self.Integrator('runge_kutta')
 
-class MetaVariable:
-    def __init__(self, network):
+    def Rosenbrock(self):
+        return self.Integrator('rosenbrock')
+
+    def DormandPrince(self, rtol=None, atol=None):
+        ret = self.Integrator('dormand_prince')
+
+        if not ret is None:
+            if not rtol is None:
+                ret.rtol = rtol
+
+            if not atol is None:
+                ret.atol = atol
+
+        return ret
+
+class MetaVariable(object):
+    # Light proxy for a state in the network meta. Name and index are read
+    # from the meta tables of the network on access, so a proxy only holds
+    # the network, its state index and its parent node.
+    __slots__ = ('_network', '_state', 'parent')
+
+    def __init__(self, network, state=0, parent=None):
         self._network = network
-        self.name = None
-        self.parent = None
-        self.index = 0
-        self._dimension = None
+        self._state = state
+        self.parent = parent
+
+    @property
+    def name(self):
+        return self._network.meta_info.states[self._state].name.decode('utf-8')
+
+    @property
+    def index(self):
+        return self._network.meta_info.states[self._state].index
+
+    def __eq__(self, other):
+        return isinstance(other, MetaVariable) and other._network is self._network and other._state == self._state
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash((id(self._network), self._state))
 
     def __getitem__(self, idx):
         if isinstance(idx, tuple):
@@ -295,14 +588,13 @@ class MetaVariable:
           return self._flat_value(idx)
 
     def __setitem__(self, idx, v):
-        idx = idx + self.index
+        if isinstance(idx, tuple):
+            idx = idx[0] + idx[1] * self.dimension.rows
 
         if hasattr(v, '__getitem__') and hasattr(v, '__len__'):
-            for i in range(len(v)):
-                self._network.data[idx] = v[i]
-                idx += 1
+            self._write(idx, v)
         else:
-            self._network.data[idx] = v
+            self._network.data[self.index + idx] = v
 
     def __len__(self):
         return self.dimension.size
@@ -312,10 +604,7 @@ class MetaVariable:
 
     @property
     def dimension(self):
-        if self._dimension is None:
-            self._dimension = self._network.get_dimension(self.index)
-
-        return self._dimension
+        return self._network.dimension(self.index)
 
     def _flat_value(self, idx=-1):
         start = self.index
@@ -328,32 +617,65 @@ class MetaVariable:
 
         if start == end:
             return self._network.data[start]
+        elif not numpy is None:
+            return self._network.data_view()[start:end].tolist()
         else:
             return self._network.data[start:end]
 
     @property
     def value(self):
         dim = self.dimension
-        val = self._flat_value()
 
-        if dim.rows > 1 or dim.columns > 1:
-            return self._make_matrix(val, dim)
+        if dim.rows == 1 and dim.columns == 1:
+            return self._network.data[self.index]
+        elif not numpy is None:
+            return self.matrix().tolist()
         else:
-            return val[0]
+            return self._make_matrix(self._flat_value(), dim)
 
     def __float__(self):
         return self[0]
 
-    def assign(self, v):
+    def matrix(self, copy=False):
+        # Matrices are stored column-major, so the block at index maps onto a
+        # Fortran ordered view of the network data without copying
+        if numpy is None:
+            raise RuntimeError('numpy is required for matrix views')
+
+        dim = self.dimension
         start = self.index
+
+        ret = self._network.data_view()[start:start + dim.size].reshape((dim.rows, dim.columns), order='F')
+
+        if copy:
+            return ret.copy(order='F')
+        else:
+            return ret
+
+    def assign(self, v):
         dim = self.dimension
 
         if dim.rows == 1 and dim.columns == 1:
             self._network.data[self.index] = v
         else:
-            for i in range(self.dimension.size):
-                self._network.data[start] = v[i]
-                start += 1
+            self._write(0, v)
+
+    def _write(self, offset, v):
+        start = self.index + offset
+
+        if not numpy is None:
+            # Matrices given as nested sequences are laid out column-major
+            v = numpy.asarray(v, dtype=self._network.api.dtype).ravel(order='F')
+
+            self._network.data_view()[start:start + len(v)] = v
+        else:
+            valuetype = self._network.api.valuetype
+
+            if not isinstance(v, ctypes.Array) or v._type_ != valuetype:
+                v = (valuetype * len(v))(*v)
+
+            addr = ctypes.cast(self._network.data, ctypes.c_void_p).value
+            ctypes.memmove(addr + start * ctypes.sizeof(valuetype), v, ctypes.sizeof(v))
 
     def _make_matrix(self, v, dim):
         ret = [None] * dim.rows
@@ -377,33 +699,114 @@ class MetaVariable:
             return self.name
 
     def __repr__(self):
-        return unicode('<{0} instance at 0x{1:x}, {2}: {3}>').format(self.__class__,
-                                                             id(self),
-                                                             self.fullname,
-                                                             self.value).encode('utf-8')
+        ret = unicode('<{0} instance at 0x{1:x}, {2}: {3}>').format(self.__class__,
+                                                            id(self),
+                                                            self.fullname,
+                                                            self.value)
+
+        if sys.version_info.major >= 3:
+            return ret
+        else:
+            return ret.encode('utf-8')
 
 class MetaNode(object):
-    def __init__(self, network):
+    # Children, variables and templates are only read from the network meta
+    # when they are first accessed. Variables are kept as state indices and
+    # only wrapped in a MetaVariable when requested.
+    __slots__ = ('_network', '_index', '_expanded', '_templates', '_children',
+                 '_variables', '_name_to_child', 'name', 'parent')
+
+    def __init__(self, network, index=0):
         self._network = network
+        self._index = index
+        self._expanded = False
+        self._templates = []
+        self._children = []
+        self._variables = array.array('I')
+        self._name_to_child = {}
         self.name = None
         self.parent = None
-        self.templates = []
-        self.children = []
-        self.variables = []
-        self.name_to_child = {}
 
-    def __getitem__(self, key):
-        if key in self.name_to_child:
-            return self.name_to_child[key]
+    def _expand(self):
+        if self._expanded:
+            return
+
+        self._expanded = True
+
+        if self._index == 0:
+            return
+
+        info = self._network.meta_info
+        child = info.nodes[self._index].first_child
+
+        while child > 0:
+            cm = info.children[child]
+
+            if cm.is_node:
+                n = MetaNode(self._network, cm.index)
+
+                n.name = info.nodes[cm.index].name.decode('utf-8')
+                n.parent = self
+
+                self._children.append(n)
+                self._name_to_child[n.name] = n
+            else:
+                self._variables.append(cm.index)
+                self._name_to_child[info.states[cm.index].name.decode('utf-8')] = cm.index
+
+            child = cm.next
+
+        template = info.nodes[self._index].first_template
+
+        while template > 0:
+            tm = info.templates[template]
+
+            self._templates.append(tm.name.decode('utf-8'))
+            template = tm.next
+
+    @property
+    def templates(self):
+        self._expand()
+        return self._templates
+
+    @property
+    def children(self):
+        self._expand()
+        return self._children
+
+    @property
+    def variables(self):
+        self._expand()
+        return [MetaVariable(self._network, state, self) for state in self._variables]
+
+    @property
+    def name_to_child(self):
+        self._expand()
+        return dict((key, self._child(key)) for key in self._name_to_child)
+
+    def _child(self, key):
+        self._expand()
+
+        child = self._name_to_child[key]
+
+        if isinstance(child, MetaNode):
+            return child
         else:
-            raise AttributeError('The node `{0}\' does not contain the variable `{1}\''.format(self.fullname, key))
+            return MetaVariable(self._network, child, self)
 
-        return self.name_to_child[key]
+    def __getitem__(self, key):
+        try:
+            return self._child(key)
+        except KeyError:
+            raise AttributeError('The node `{0}\' does not contain the variable `{1}\''.format(self.fullname, key))
 
     def __getattr__(self, key):
-        if key in self.name_to_child:
-            return self.name_to_child[key]
-        else:
+        if key.startswith('_'):
+            raise AttributeError(key)
+
+        try:
+            return self._child(key)
+        except KeyError:
             raise AttributeError('The node `{0}\' does not contain the variable `{1}\''.format(self.fullname, key))
 
     @property
@@ -432,11 +835,52 @@ class MetaNode(object):
 
 class MetaRoot:
     def __init__(self, network):
-        self.network = MetaNode(network)
-        self.network.name = unicode('(cdn)')
+        info = network.meta_info
+
+        # Start at the root node
+        if len(info.nodes) > 1:
+            self.network = MetaNode(network, 1)
+            self.network.name = info.nodes[1].name.decode('utf-8')
+        else:
+            self.network = MetaNode(network)
+            self.network.name = unicode('(cdn)')
+
+        self._template_to_nodes = None
+        self._fullname_to_node = None
+
+    def _index(self):
+        # Building the indices requires expanding the complete tree
+        self._template_to_nodes = {}
+        self._fullname_to_node = {}
 
-        self.template_to_nodes = {}
-        self.fullname_to_node = {}
+        queue = list(self.network.children)
+
+        while len(queue) > 0:
+            node = queue.pop()
+
+            self._fullname_to_node[node.fullname] = node
+
+            for t in node.templates:
+                if t in self._template_to_nodes:
+                    self._template_to_nodes[t].append(node)
+                else:
+                    self._template_to_nodes[t] = [node]
+
+            queue.extend(node.children)
+
+    @property
+    def template_to_nodes(self):
+        if self._template_to_nodes is None:
+            self._index()
+
+        return self._template_to_nodes
+
+    @property
+    def fullname_to_node(self):
+        if self._fullname_to_node is None:
+            self._index()
+
+        return self._fullname_to_node
 
 def load(name, libname=None):
     if platform.system() == 'Darwin':
@@ -472,9 +916,70 @@ def load(name, libname=None):
     lib = ctypes.cdll.LoadLibrary(libname)
     return API(lib, name, libname)
 
+def _resolve_indices(api, network, variables):
+    if numpy is None:
+        raise RuntimeError('numpy is required for recording')
+
+    if variables is None:
+        return numpy.arange(network.contents.data_count, dtype=numpy.uint32)
+
+    if isinstance(variables, numpy.ndarray):
+        return numpy.ascontiguousarray(variables, dtype=numpy.uint32)
+
+    ret = []
+
+    for v in variables:
+        if isinstance(v, MetaVariable):
+            ret.extend(range(v.index, v.index + len(v)))
+        elif isinstance(v, (int, numpy.integer)):
+            ret.append(v)
+        else:
+            name = v
+
+            if not isinstance(name, bytes):
+                name = name.encode('utf-8')
+
+            i = api.cdn_rawc_network_find_variable(network, name)
+
+            if i < 0:
+                raise KeyError('The variable `{0}\' could not be found'.format(v))
+
+            ret.extend(range(i, i + api.cdn_rawc_network_get_dimension(network, i).contents.size))
+
+    return numpy.array(ret, dtype=numpy.uint32)
+
+def _num_rows(start, dt, end):
+    # Number of rows needed to record from start to end, including the
+    # initial state. One spare row absorbs accumulated rounding in t.
+    return int(math.ceil((end - start) / float(dt))) + 2
+
+def _as_pointer(arr, tp):
+    return arr.ctypes.data_as(ctypes.POINTER(tp))
+
 # Pythonic bindings
+class _Storage(object):
+    # Owns memory allocated by cdn_rawc_network_alloc(_ensemble). Array views
+    # reference the owner instead of the network, so that they do not form a
+    # reference cycle with it
+    def __init__(self, api, ptr):
+        self.api = api
+        self.ptr = ptr
+
+    def free(self):
+        if self.ptr:
+            self.api.cdn_rawc_network_free(self.ptr)
+
+        self.ptr = None
+
+    def __del__(self):
+        self.free()
+
 class Network:
-    def __init__(self, api, libname=None):
+    def __init__(self, api, libname=None, integrator=None):
+        self.storage = None
+        self._storage = None
+        self._seed = None
+
         if isinstance(api, API):
             self.api = api
         else:
@@ -482,9 +987,17 @@ class Network:
 
         self.libname = self.api.libname
         self.network = self.api.cdn_rawc_network()
-        self.set_integrator(Integrator(self.api.cdn_rawc_integrator()))
 
-        self._parse_meta()
+        if integrator is None:
+            integrator = Integrator(self.api.cdn_rawc_integrator())
+
+        self.set_integrator(integrator)
+
+        # The topology is built on first use
+        self._meta_info = None
+        self._topology = None
+
+        self._read_dimensions()
 
     class DataIter:
         def __init__(self, network, slic=None):
@@ -525,6 +1038,8 @@ class Network:
 
                 return ret
 
+        __next__ = next
+
     def __iter__(self):
         return Network.DataIter(self)
 
@@ -555,7 +1070,54 @@ class Network:
 
     @property
     def data(self):
-        return self.api.cdn_rawc_network_get_data(self.network, self.storage)
+        self._check_open()
+        return self._data
+
+    @property
+    def slots(self):
+        return self.integrator.order + self.network.contents.event_refinement
+
+    def nth(self, nth):
+        self._check_open()
+
+        if nth < 0 or nth >= self.slots:
+            raise IndexError
+
+        return self.api.cdn_rawc_network_get_nth(self.network, self.storage, nth)
+
+    def _view(self, nth, rng):
+        self._check_open()
+
+        key = (nth, rng)
+
+        if key in self._views:
+            return self._views[key]
+
+        if numpy is None:
+            raise RuntimeError('numpy is required for array views')
+
+        ptr = self.api.cdn_rawc_network_get_data(self.network, self.nth(nth))
+        buf = (self.api.valuetype * self.network.contents.data_count).from_address(ctypes.addressof(ptr.contents))
+
+        # Views keep the storage alive
+        buf._storage = self._storage
+        ret = numpy.ctypeslib.as_array(buf)
+
+        if not rng is None:
+            r = getattr(self.network.contents, rng)
+            ret = ret[r.start:r.end]
+
+        self._views[key] = ret
+        return ret
+
+    def data_view(self, nth=0):
+        return self._view(nth, None)
+
+    def states_view(self, nth=0):
+        return self._view(nth, 'states')
+
+    def derivatives_view(self, nth=0):
+        return self._view(nth, 'derivatives')
 
     @property
     def data_size(self):
@@ -585,42 +1147,358 @@ class Network:
     def minimum_timestep(self):
         return self.network.contents.minimum_timestep
 
+    # Note that the localization is part of the network description, which is
+    # shared by all instances of the network in the library. It defaults to
+    # EVENT_LOCALIZATION_STEP, EVENT_LOCALIZATION_ILLINOIS is only valid for
+    # networks which do not write data in post (see cdn-rawc-types.h)
+    @property
+    def event_localization(self):
+        return self.network.contents.event_localization
+
+    @event_localization.setter
+    def event_localization(self, v):
+        self.network.contents.event_localization = v
+
+    def event_refinements(self):
+        # Number of step refinements per event since the last reset
+        self._check_open()
+
+        ptr = self.api.cdn_rawc_network_get_events_refinements(self.network, self.storage)
+
+        if not ptr:
+            return []
+
+        return [ptr[i] for i in range(self.network.contents.events_size)]
+
+    def profile(self):
+        # Calls and cumulative time (in seconds) per phase since the last
+        # reset, None if the network was not compiled with ENABLE_PROFILE
+        self._check_open()
+
+        ptr = self.api.cdn_rawc_network_get_profile(self.network, self.storage)
+
+        if not ptr:
+            return None
+
+        p = ptr.contents
+        ret = {}
+
+        for i, phase in enumerate(profile_phases):
+            ret[phase] = {'calls': p.calls[i], 'time': p.time[i] * 1e-9}
+
+        return ret
+
     def set_integrator(self, integrator):
+        # Create enough data, replacing the previous storage
+        storage = self.api.cdn_rawc_network_alloc_ensemble(self.network, integrator.integrator, 1)
+
+        if not storage:
+            raise MemoryError('Could not allocate the network')
+
+        self.close()
+
         self.integrator = integrator
+        self.storage = storage
+        self._storage = _Storage(self.api, storage)
+
+        # The data pointer is fixed for the lifetime of the storage, so
+        # resolve it once instead of on every access
+        self._data = self.api.cdn_rawc_network_get_data(self.network, self.storage)
+        self._views = {}
+
+        self._instance_size = self.api.cdn_rawc_network_get_instance_size(self.network, self.integrator.integrator)
+        self._snapshot_pool = {}
+
+        # New storage is seeded with a stream of its own, keep the seed the
+        # user chose instead
+        if not self._seed is None:
+            self.seed(*self._seed)
+
+    def close(self):
+        # Frees the storage. Neither the data pointer nor array views may be
+        # used afterwards. Without close, the storage is freed once both the
+        # network and its views are released
+        if self._storage:
+            self._storage.free()
+
+        self.storage = None
+        self._storage = None
+        self._data = None
+        self._views = {}
+
+    def _check_open(self):
+        # The storage is gone after close, passing it to the library would
+        # crash
+        if self.storage is None:
+            raise ValueError('The network `{0}\' is closed'.format(self.name))
+
+    def snapshot(self, full=False, filename=None):
+        # Copies the live data of the network into a pooled buffer. Use full
+        # to also copy the integrator slots, adaptive integrators keep their
+        # step size there between steps
+        self._check_open()
+
+        if full:
+            size = self._instance_size
+        else:
+            size = self.size
+
+        snap = Snapshot(self.name, size, full, self._snapshot_pool.setdefault(size, []))
+        ctypes.memmove(snap.buffer, self.storage, size)
+
+        if not filename is None:
+            snap.save(filename)
+
+        return snap
+
+    def restore(self, snap):
+        # Restores a snapshot, or a snapshot file, of this network
+        self._check_open()
+
+        if not isinstance(snap, Snapshot):
+            snap = Snapshot.load(snap)
+
+        if snap.name != self.name or snap.size != (self._instance_size if snap.full else self.size):
+            raise ValueError('The snapshot does not match the network `{0}\''.format(self.name))
+
+        ctypes.memmove(self.storage, snap.buffer, snap.size)
+
+    def fork(self):
+        # A new network continuing from the current state
+        self._check_open()
+
+        ret = Network(self.api, integrator=self.integrator)
+
+        ctypes.memmove(ret.storage, self.storage, self._instance_size)
+        ret._seed = self._seed
+
+        return ret
+
+    def run(self, start, step, end, sink=None, variables=None, state=None):
+        self._check_open()
+
+        if sink is None:
+            self.api.cdn_rawc_integrator_run(self.integrator.integrator,
+                                             self.network,
+                                             self.storage,
+                                             start,
+                                             step,
+                                             end)
+            return
+
+        # Stream the trajectory of the selected variables into the sink,
+        # the rows are written by the native code directly into the mapped
+        # file, one block at a time. An empty sink starts with a reset and
+        # the initial state. A sink which already has rows is appended to,
+        # continuing from state: a Snapshot (or snapshot file) taken where
+        # the trajectory in the sink ended, since the storage of the network
+        # does not hold that state when resuming in another process. Pass
+        # state=network.snapshot() to continue from the current state. The
+        # appended rows continue from the time of that state, not start.
+        fresh = (sink.rows == 0)
+
+        if fresh and not state is None:
+            raise ValueError('The state to continue from only applies when appending to a sink')
+        elif not fresh and state is None:
+            raise ValueError('Appending to the sink `{0}\' requires the state to continue from'.format(sink.filename))
+
+        indices = self.record_indices(variables)
+        sink._open(self.api.dtype, len(indices))
+
+        pindices = _as_pointer(indices, ctypes.c_uint32)
+
+        if not fresh:
+            self.restore(state)
+            start = self.t
+
+        while True:
+            block = sink._block()
+            buf = _as_pointer(block, self.api.valuetype)
+
+            if fresh:
+                # Reset and start with the initial state
+                rows = self.api.cdn_rawc_integrator_record(self.integrator.integrator,
+                                                           self.network,
+                                                           self.storage,
+                                                           start,
+                                                           step,
+                                                           end,
+                                                           pindices,
+                                                           len(indices),
+                                                           buf,
+                                                           block.shape[0])
+                fresh = False
+            else:
+                # Continue from the current state, either the previous
+                # block or a previous run appended to the same sink
+                rows = self.api.cdn_rawc_integrator_record_steps(self.integrator.integrator,
+                                                                 self.network,
+                                                                 self.storage,
+                                                                 start,
+                                                                 step,
+                                                                 end,
+                                                                 pindices,
+                                                                 len(indices),
+                                                                 buf,
+                                                                 block.shape[0])
+
+            # Release the block, the sink may remap the file for the next one
+            full = (rows == block.shape[0])
+            block = buf = None
+
+            sink._commit(rows)
+
+            if not full:
+                break
+
+            start = self.t
+
+    def record_indices(self, variables=None):
+        return _resolve_indices(self.api, self.network, variables)
+
+    def record(self, start, dt, end, variables=None, out=None):
+        self._check_open()
+
+        indices = self.record_indices(variables)
+
+        if out is None:
+            out = numpy.empty((_num_rows(start, dt, end), len(indices)), dtype=self.api.dtype)
+        elif out.ndim != 2 or out.shape[1] != len(indices) or not out.flags.c_contiguous:
+            raise ValueError('The output buffer must be a contiguous (steps x vars) array')
+
+        rows = self.api.cdn_rawc_integrator_record(self.integrator.integrator,
+                                                   self.network,
+                                                   self.storage,
+                                                   start,
+                                                   dt,
+                                                   end,
+                                                   _as_pointer(indices, ctypes.c_uint32),
+                                                   len(indices),
+                                                   _as_pointer(out, self.api.valuetype),
+                                                   out.shape[0])
+
+        return out[:rows]
+
+    def iter_chunks(self, start, dt, end, chunk_steps, variables=None, double_buffer=False):
+        # Yields (rows x vars) views of the trajectory, chunk_steps rows at a
+        # time. The first chunk starts with the initial state. The buffers are
+        # reused for later chunks, so copy a chunk to keep it. With
+        # double_buffer the next chunk is computed in a background thread
+        # while the current one is processed, the network must not be used
+        # by the consumer until the generator is done.
+        self._check_open()
+
+        indices = self.record_indices(variables)
+        pindices = _as_pointer(indices, ctypes.c_uint32)
+
+        bufs = [numpy.empty((chunk_steps, len(indices)), dtype=self.api.dtype)]
+
+        if double_buffer:
+            bufs.append(numpy.empty_like(bufs[0]))
+
+        def fill(buf, first):
+            if first:
+                f = self.api.cdn_rawc_integrator_record
+                t = start
+            else:
+                f = self.api.cdn_rawc_integrator_record_steps
+                t = self.t
+
+            return f(self.integrator.integrator,
+                     self.network,
+                     self.storage,
+                     t,
+                     dt,
+                     end,
+                     pindices,
+                     len(indices),
+                     _as_pointer(buf, self.api.valuetype),
+                     chunk_steps)
+
+        rows = fill(bufs[0], True)
+        i = 0
 
-        # Create enough data
-        self.storage = self.api.cdn_rawc_network_alloc(self.network, self.integrator.order)
+        while rows > 0:
+            cur = bufs[i]
+            full = (rows == chunk_steps)
+            worker = None
 
-    def run(self, start, step, end):
-        self.api.cdn_rawc_integrator_run(self.integrator.integrator,
-                                         self.network,
-                                         self.storage,
-                                         start,
-                                         step,
-                                         end)
+            if double_buffer and full:
+                # The native call releases the GIL. An error in the worker is
+                # raised here when its chunk is collected
+                result = {}
+
+                def fill_next(buf, result=result):
+                    try:
+                        result['rows'] = fill(buf, False)
+                    except Exception as e:
+                        result['error'] = e
+
+                worker = threading.Thread(target=fill_next, args=(bufs[1 - i],))
+                worker.start()
+
+            try:
+                yield cur[:rows]
+            finally:
+                if not worker is None:
+                    worker.join()
+
+            if not full:
+                break
+
+            if worker is None:
+                rows = fill(cur, False)
+            else:
+                if 'error' in result:
+                    raise result['error']
+
+                rows = result['rows']
+                i = 1 - i
+
+    def seed(self, seed, stream=0):
+        # Sets the key of the random number generator, the sequence restarts
+        # whenever the network is reset. Every (seed, stream) pair is an
+        # independent sequence. Unless seeded, every network draws from
+        # seed 0 and a stream of its own. Networks (and ensembles, which use
+        # a range of streams) seeded with the same seed must use distinct
+        # streams, use a seed other than 0 to not overlap with the streams
+        # handed out on allocation
+        self._check_open()
+
+        self.api.cdn_rawc_network_seed(self.network, self.storage, seed, stream)
+        self._seed = (seed, stream)
 
     def init(self, t=0):
+        self._check_open()
         self.api.cdn_rawc_network_init(self.network, self.storage, t)
 
     def prepare(self, t=0):
+        self._check_open()
         self.api.cdn_rawc_network_prepare(self.network, self.storage, t)
 
     def reset(self, t=0):
+        self._check_open()
         self.api.cdn_rawc_network_reset(self.network, self.storage, t)
 
     def pre(self, t, dt):
+        self._check_open()
         self.api.cdn_rawc_network_pre(self.network, self.storage, t, dt)
 
     def post(self, t, dt):
+        self._check_open()
         self.api.cdn_rawc_network_post(self.network, self.storage, t, dt)
 
     def update(self, t = 0):
+        self._check_open()
         self.api.cdn_rawc_network_update(self.network, self.storage, t)
 
     def diff(self, t, dt):
+        self._check_open()
         self.api.cdn_rawc_network_diff(self.network, self.storage, t, dt)
 
     def step(self, dt=None):
+        self._check_open()
+
         if dt is None:
             dt = self.default_timestep
 
@@ -631,6 +1509,8 @@ class Network:
                                           dt)
 
     def step_diff(self, dt):
+        self._check_open()
+
         self.api.cdn_rawc_integrator_step_diff(self.integrator.integrator,
                                                self.network,
                                                self.storage,
@@ -640,113 +1520,835 @@ class Network:
     def get_dimension(self, i):
         return self.api.cdn_rawc_network_get_dimension(self.network, i).contents
 
+    def dimension(self, i):
+        return CdnRawcDimension(int(self._dimension_rows[i]), int(self._dimension_columns[i]))
+
+    def _read_dimensions(self):
+        # Read the complete dimension table once. Only non 1x1 dimensions
+        # are stored in the network, together with their data index.
+        net = self.network.contents
+        count = net.data_count
+
+        if not numpy is None:
+            self.dimensions = numpy.ones(count, dtype=[('rows', numpy.uint16), ('columns', numpy.uint16)])
+
+            if net.dimensions_size > 0:
+                dims = numpy.ctypeslib.as_array(net.dimensions, shape=(net.dimensions_size,))
+                indices = numpy.ctypeslib.as_array(net.dimension_indices, shape=(net.dimensions_size,))
+
+                self.dimensions['rows'][indices] = dims['rows']
+                self.dimensions['columns'][indices] = dims['columns']
+
+            self._dimension_rows = self.dimensions['rows']
+            self._dimension_columns = self.dimensions['columns']
+        else:
+            self.dimensions = None
+
+            self._dimension_rows = array.array('H', [1]) * count
+            self._dimension_columns = array.array('H', [1]) * count
+
+            for i in range(net.dimensions_size):
+                index = net.dimension_indices[i]
+
+                self._dimension_rows[index] = net.dimensions[i].rows
+                self._dimension_columns[index] = net.dimensions[i].columns
+
     def find_variable(self, name):
+        if not isinstance(name, bytes):
+            name = name.encode('utf-8')
+
         return self.api.cdn_rawc_network_find_variable(self.network, name)
 
     def find_meta_variable(self, name, rootid=1):
-        return self.api.cdn_rawc_network_find_meta_variable(self.network, rootid, name)
+        if not isinstance(name, bytes):
+            name = name.encode('utf-8')
+
+        return self.api.cdn_rawc_network_meta_find_variable(self.network, rootid, name)
 
     def find_meta_node(self, name, rootid=1):
-        return self.api.cdn_rawc_network_find_meta_node(self.network, rootid, name)
+        if not isinstance(name, bytes):
+            name = name.encode('utf-8')
+
+        return self.api.cdn_rawc_network_meta_find_node(self.network, rootid, name)
+
+    @property
+    def meta_info(self):
+        if self._meta_info is None:
+            meta = self.network.contents.meta
 
-    def _parse_meta_node(self, node, meta_node, meta_info, fullname=None):
-        # Fill node info
-        node.name = meta_node.name.decode('utf-8')
+            class MetaInfo:
+                def __init__(self):
+                    self.nodes = None
+                    self.states = None
+                    self.children = None
+                    self.templates = None
 
-        # Traverse children
-        child = meta_node.first_child
+            info = MetaInfo()
 
-        if not fullname is None:
-            fullname = list(fullname)
-            fullname.append(node.name)
+            NodesType = ctypes.POINTER(CdnRawcNodeMeta * meta.nodes_size)
+            info.nodes = ctypes.cast(meta.nodes, NodesType).contents
 
-            meta_info.fullname_to_node[unicode('.').join(fullname)] = node
+            ChildrenType = ctypes.POINTER(CdnRawcChildMeta * meta.children_size)
+            info.children = ctypes.cast(meta.children, ChildrenType).contents
+
+            TemplatesType = ctypes.POINTER(CdnRawcTemplateMeta * meta.templates_size)
+            info.templates = ctypes.cast(meta.templates, TemplatesType).contents
+
+            StatesType = ctypes.POINTER(CdnRawcStateMeta * meta.states_size)
+            info.states = ctypes.cast(meta.states, StatesType).contents
+
+            self._meta_info = info
+
+        return self._meta_info
+
+    @property
+    def topology(self):
+        if self._topology is None:
+            self._topology = MetaRoot(self)
+
+        return self._topology
+
+class Ensemble:
+    def __init__(self, api, count, integrator=None):
+        self.storage = None
+        self._storage = None
+
+        if isinstance(api, API):
+            self.api = api
         else:
-            fullname = []
+            self.api = load(api)
 
-        while child > 0:
-            cm = meta_info.children[child]
+        if numpy is None:
+            raise RuntimeError('numpy is required for ensembles')
 
-            if cm.is_node:
-                n = MetaNode(self)
-                nm = meta_info.nodes[cm.index]
+        if integrator is None:
+            integrator = Integrator(self.api.cdn_rawc_integrator())
 
-                n.parent = node
+        self.count = count
+        self.network = self.api.cdn_rawc_network()
+        self.integrator = integrator
 
-                self._parse_meta_node(n, nm, meta_info, fullname)
+        self.instance_size = self.api.cdn_rawc_network_get_instance_size(self.network, integrator.integrator)
+        self.storage = self.api.cdn_rawc_network_alloc_ensemble(self.network, integrator.integrator, count)
 
-                node.children.append(n)
-                node.name_to_child[n.name] = n
-            else:
-                v = MetaVariable(self)
-                vm = meta_info.states[cm.index]
+        if not self.storage:
+            raise MemoryError('Could not allocate {0} instances of the network'.format(count))
 
-                v.name = vm.name.decode('utf-8')
-                v.parent = node
-                v.index = vm.index
+        self._storage = _Storage(self.api, self.storage)
 
-                node.variables.append(v)
-                node.name_to_child[v.name] = v
+        self.parameter_indices = numpy.zeros(0, dtype=numpy.uint32)
+        self.parameters = numpy.zeros((count, 0), dtype=self.api.dtype)
 
-            child = cm.next
+        self.rows = numpy.zeros(count, dtype=numpy.uint32)
+        self.t = 0
 
-        # Traverse templates
-        template = meta_node.first_template
+        # Strided view on the order-0 data of every instance
+        data = self.api.cdn_rawc_network_get_data(self.network, self.storage)
+        offset = ctypes.cast(data, ctypes.c_void_p).value - self.storage
+        buf = (ctypes.c_char * (self.instance_size * count)).from_address(self.storage)
 
-        while template > 0:
-            tm = meta_info.templates[template]
+        # Views keep the storage alive
+        buf._storage = self._storage
 
-            node.templates.append(tm.name)
+        self._data = numpy.ndarray((count, self.network.contents.data_count),
+                                   dtype=self.api.dtype,
+                                   buffer=buf,
+                                   offset=offset,
+                                   strides=(self.instance_size, ctypes.sizeof(self.api.valuetype)))
 
-            if tm.name in meta_info.template_to_nodes:
-                meta_info.template_to_nodes[tm.name].append(node)
-            else:
-                meta_info.template_to_nodes[tm.name] = [node]
+    def __len__(self):
+        return self.count
 
-            template = tm.next
+    def close(self):
+        # Frees the storage of all instances, see Network.close
+        if self._storage:
+            self._storage.free()
 
-    def _parse_meta(self):
-        self.topology = MetaRoot(self)
+        self.storage = None
+        self._storage = None
+        self._data = None
 
-        class MetaInfo:
-            def __init__(self):
-                self.nodes = None
-                self.states = None
-                self.children = None
-                self.templates = None
+    def _check_open(self):
+        # See Network._check_open
+        if self.storage is None:
+            raise ValueError('The ensemble is closed')
 
-                self.template_to_nodes = {}
-                self.fullname_to_node = {}
+    def instance(self, i):
+        self._check_open()
 
-        info = MetaInfo()
+        if i < 0 or i >= self.count:
+            raise IndexError
 
-        NodesType = ctypes.POINTER(CdnRawcNodeMeta * self.network.contents.meta.nodes_size)
-        info.nodes = ctypes.cast(self.network.contents.meta.nodes, NodesType).contents
+        return self.storage + i * self.instance_size
 
-        ChildrenType = ctypes.POINTER(CdnRawcChildMeta * self.network.contents.meta.children_size)
-        info.children = ctypes.cast(self.network.contents.meta.children, ChildrenType).contents
+    def data_view(self):
+        self._check_open()
+        return self._data
 
-        TemplatesType = ctypes.POINTER(CdnRawcTemplateMeta * self.network.contents.meta.templates_size)
-        info.templates = ctypes.cast(self.network.contents.meta.templates, TemplatesType).contents
+    def states_view(self):
+        self._check_open()
 
-        StatesType = ctypes.POINTER(CdnRawcStateMeta * self.network.contents.meta.states_size)
-        info.states = ctypes.cast(self.network.contents.meta.states, StatesType).contents
+        r = self.network.contents.states
+        return self._data[:, r.start:r.end]
 
-        # Start at the root node and traverse
-        if len(info.nodes) > 1:
-            self._parse_meta_node(self.topology.network, info.nodes[1], info)
+    def derivatives_view(self):
+        self._check_open()
+
+        r = self.network.contents.derivatives
+        return self._data[:, r.start:r.end]
+
+    def event_refinements(self):
+        # Number of step refinements per instance and event since the last reset
+        ret = numpy.zeros((self.count, self.network.contents.events_size), dtype=numpy.uint32)
+
+        for i in range(self.count):
+            ptr = self.api.cdn_rawc_network_get_events_refinements(self.network, self.instance(i))
+
+            if ptr:
+                ret[i] = ptr[:ret.shape[1]]
+
+        return ret
+
+    def seed(self, seed, stream=0):
+        # Instance i draws from stream + i, so the ensemble uses the streams
+        # stream to stream + count - 1. Ensembles seeded with the same seed
+        # must not overlap in that range, e.g. use stream = k * count for the
+        # k-th ensemble, or a different seed per ensemble. Unless seeded, the
+        # instances draw from seed 0 and streams of their own (see
+        # Network.seed)
+        for i in range(self.count):
+            self.api.cdn_rawc_network_seed(self.network, self.instance(i), seed, stream + i)
+
+    def set_parameters(self, variables, values):
+        indices = _resolve_indices(self.api, self.network, variables)
+        values = numpy.ascontiguousarray(values, dtype=self.api.dtype)
+
+        if values.ndim == 1:
+            values = values.reshape((self.count, -1))
+
+        if values.shape != (self.count, len(indices)):
+            raise ValueError('Expected a ({0} x {1}) parameter matrix'.format(self.count, len(indices)))
+
+        self.parameter_indices = indices
+        self.parameters = values
+
+    def reset(self, t=0):
+        self._check_open()
+
+        self.api.cdn_rawc_integrator_reset_ensemble(self.integrator.integrator,
+                                                    self.network,
+                                                    self.storage,
+                                                    self.count,
+                                                    t,
+                                                    _as_pointer(self.parameter_indices, ctypes.c_uint32),
+                                                    len(self.parameter_indices),
+                                                    _as_pointer(self.parameters, self.api.valuetype))
+
+        self.t = t
+
+    def step(self, dt=None):
+        self._check_open()
+
+        if dt is None:
+            dt = self.network.contents.default_timestep
+
+        self.api.cdn_rawc_integrator_step_ensemble(self.integrator.integrator,
+                                                   self.network,
+                                                   self.storage,
+                                                   self.count,
+                                                   self.t,
+                                                   dt)
+
+        self.t += dt
+
+    def record(self, start, dt, end, variables=None, out=None):
+        self._check_open()
+
+        indices = _resolve_indices(self.api, self.network, variables)
+
+        if out is None:
+            out = numpy.empty((self.count, _num_rows(start, dt, end), len(indices)), dtype=self.api.dtype)
+        elif out.ndim != 3 or out.shape[0] != self.count or out.shape[2] != len(indices) or not out.flags.c_contiguous:
+            raise ValueError('The output buffer must be a contiguous (instances x steps x vars) array')
+
+        self.api.cdn_rawc_integrator_record_ensemble(self.integrator.integrator,
+                                                     self.network,
+                                                     self.storage,
+                                                     self.count,
+                                                     start,
+                                                     dt,
+                                                     end,
+                                                     _as_pointer(self.parameter_indices, ctypes.c_uint32),
+                                                     len(self.parameter_indices),
+                                                     _as_pointer(self.parameters, self.api.valuetype),
+                                                     _as_pointer(indices, ctypes.c_uint32),
+                                                     len(indices),
+                                                     _as_pointer(out, self.api.valuetype),
+                                                     out.shape[1],
+                                                     _as_pointer(self.rows, ctypes.c_uint32))
+
+        return out[:, :self.rows.max()]
+
+class ParallelRunner:
+    # Runs an ensemble sharded over a thread pool. Calls through ctypes
+    # release the GIL, so shards run concurrently on separate cores.
+    #
+    # What is shared between the workers, and is read-only while running:
+    #   - the API (the library handle and the ctypes prototypes)
+    #   - the network descriptor returned by cdn_rawc_<name>_network,
+    #     including its meta and dimension tables
+    #   - the integrator descriptor, its settings (e.g. the tolerances of
+    #     DormandPrince) must not be changed while the workers run
+    #
+    # What is private to each worker:
+    #   - the instance storage, every shard allocates its own ensemble block.
+    #     Anything an integrator updates while stepping (e.g. the step size
+    #     and statistics of DormandPrince) is kept there as well
+    #   - the parameter rows and the slice of the output it writes to
+    #
+    # Every instance has its own random stream (consecutive streams over the
+    # instances of the runner), so results do not depend on the number of
+    # workers.
+    def __init__(self, api, count, integrator=None, workers=None):
+        if isinstance(api, API):
+            self.api = api
+        else:
+            self.api = load(api)
+
+        if workers is None:
+            workers = os.cpu_count() if hasattr(os, 'cpu_count') else 1
+
+        workers = max(1, min(workers, count))
+
+        self.count = count
+        self.workers = workers
+
+        # Divide instances as evenly as possible over the shards
+        bounds = [(count * i) // workers for i in range(workers + 1)]
+
+        self.shards = []
+        self.bounds = []
+
+        for i in range(workers):
+            lo, hi = bounds[i], bounds[i + 1]
+
+            self.shards.append(Ensemble(self.api, hi - lo, integrator))
+            self.bounds.append((lo, hi))
+
+        # The shards are allocated separately, seed them from one range of
+        # streams so instance i draws from the same stream for any number
+        # of workers
+        stream = self.api.cdn_rawc_network_take_streams(count)
+
+        for shard, (lo, hi) in zip(self.shards, self.bounds):
+            shard.seed(0, stream + lo)
+
+        self.rows = numpy.zeros(count, dtype=numpy.uint32)
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if not self._executor is None:
+            self._executor.shutdown()
+            self._executor = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            import concurrent.futures
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers)
+
+        return self._executor
+
+    def seed(self, seed):
+        # Instance i draws from (seed, i), see Ensemble.seed
+        for shard, (lo, hi) in zip(self.shards, self.bounds):
+            shard.seed(seed, lo)
+
+    def set_parameters(self, variables, values):
+        values = numpy.asarray(values, dtype=self.api.dtype)
+
+        if values.ndim == 1:
+            values = values.reshape((self.count, -1))
+
+        for shard, (lo, hi) in zip(self.shards, self.bounds):
+            shard.set_parameters(variables, values[lo:hi])
+
+    def _map(self, f):
+        futures = [self.executor.submit(f, shard, lo, hi) for shard, (lo, hi) in zip(self.shards, self.bounds)]
+
+        for future in futures:
+            future.result()
+
+    def reset(self, t=0):
+        self._map(lambda shard, lo, hi: shard.reset(t))
+
+    def step(self, dt=None):
+        self._map(lambda shard, lo, hi: shard.step(dt))
+
+    def run(self, start, dt, end):
+        self.record(start, dt, end, [])
+
+    def record(self, start, dt, end, variables=None, out=None):
+        indices = _resolve_indices(self.api, self.shards[0].network, variables)
+
+        if out is None:
+            out = numpy.empty((self.count, _num_rows(start, dt, end), len(indices)), dtype=self.api.dtype)
+
+        def record_shard(shard, lo, hi):
+            shard.record(start, dt, end, indices, out[lo:hi])
+            self.rows[lo:hi] = shard.rows
+
+        self._map(record_shard)
+
+        return out[:, :self.rows.max()]
+
+# Process based sweeps. Every worker process loads the library once and
+# writes the trajectories of its chunks straight into a shared memory
+# block, so only the chunk bounds travel back to the parent.
+_sweep_worker = None
+
+class _SweepWorker:
+    def __init__(self, name, libname, integrator, shm_name, shape):
+        from multiprocessing import shared_memory
 
-        self.topology.template_to_nodes = info.template_to_nodes
-        self.topology.fullname_to_node = info.fullname_to_node
+        self.api = load(name, libname)
 
-class Integrator:
-    def __init__(self, integrator):
+        # Rebuilt from the spec of the integrator in the parent, including
+        # its settings (e.g. the tolerances of DormandPrince)
+        name, settings = integrator
+
+        if name is None:
+            self.integrator = Integrator(self.api.cdn_rawc_integrator())
+        else:
+            self.integrator = self.api.Integrator(name)
+
+        for k, v in settings.items():
+            setattr(self.integrator, k, v)
+
+        self.shm = shared_memory.SharedMemory(name=shm_name)
+        self.out = numpy.ndarray(shape, dtype=self.api.dtype, buffer=self.shm.buf)
+        self.ensembles = {}
+
+    def ensemble(self, count):
+        if not count in self.ensembles:
+            self.ensembles[count] = Ensemble(self.api, count, self.integrator)
+
+        return self.ensembles[count]
+
+def _sweep_init(*args):
+    global _sweep_worker
+    _sweep_worker = _SweepWorker(*args)
+
+def _sweep_chunk(args):
+    lo, hi, start, dt, end, param_indices, params, indices, seed, stream = args
+
+    ensemble = _sweep_worker.ensemble(hi - lo)
+    ensemble.seed(seed, stream + lo)
+    ensemble.set_parameters(param_indices, params)
+    ensemble.record(start, dt, end, indices, _sweep_worker.out[lo:hi])
+
+    return lo, hi, ensemble.rows.copy()
+
+class Sweep:
+    def __init__(self, api, variables, values, start, dt, end, record=None, processes=None, chunk_size=None, integrator=None, seed=None):
+        if isinstance(api, API):
+            self.api = api
+        else:
+            self.api = load(api)
+
+        import multiprocessing
+        from multiprocessing import shared_memory
+
+        network = self.api.cdn_rawc_network()
+
+        values = numpy.ascontiguousarray(values, dtype=self.api.dtype)
+        count = values.shape[0]
+
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+
+        processes = max(1, min(processes, count))
+
+        if chunk_size is None:
+            # A few chunks per process keeps the load balanced while
+            # streaming results back regularly
+            chunk_size = max(1, int(math.ceil(count / float(processes * 4))))
+
+        # The integrator is given by name or as an Integrator, workers get
+        # its spec since integrators can not be pickled
+        if integrator is None:
+            integrator = Integrator(self.api.cdn_rawc_integrator())
+        elif not isinstance(integrator, Integrator):
+            name = integrator
+            integrator = self.api.Integrator(name)
+
+            if integrator is None:
+                raise ValueError('Unknown integrator `{0}\''.format(name))
+
+        self.count = count
+        self.param_indices = _resolve_indices(self.api, network, variables)
+        self.indices = _resolve_indices(self.api, network, record)
+        self.values = values.reshape((count, len(self.param_indices)))
+
+        self.start = start
+        self.dt = dt
+        self.end = end
+        # Parameter set i draws from (seed, stream + i). Without a seed, the
+        # streams are taken from the ones handed out on allocation in this
+        # process, so they do not overlap with those of other networks
+        if seed is None:
+            self.seed = 0
+            self.stream = self.api.cdn_rawc_network_take_streams(count)
+        else:
+            self.seed = seed
+            self.stream = 0
+
+        shape = (count, _num_rows(start, dt, end), len(self.indices))
+        size = max(1, int(numpy.prod(shape)) * self.api.dtype.itemsize)
+
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        self.data = numpy.ndarray(shape, dtype=self.api.dtype, buffer=self.shm.buf)
+        self.rows = numpy.zeros(count, dtype=numpy.uint32)
+
+        self.chunks = [(lo, min(lo + chunk_size, count)) for lo in range(0, count, chunk_size)]
+
+        self.pool = multiprocessing.Pool(processes,
+                                         initializer=_sweep_init,
+                                         initargs=(self.api.name,
+                                                   self.api.libname,
+                                                   integrator.spec(),
+                                                   self.shm.name,
+                                                   shape))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        # Yields (lo, hi, trajectories) as soon as a chunk of parameter sets
+        # is done, trajectories is a view into the shared result block
+        tasks = [(lo, hi, self.start, self.dt, self.end, self.param_indices, self.values[lo:hi], self.indices, self.seed, self.stream) for lo, hi in self.chunks]
+
+        for lo, hi, rows in self.pool.imap_unordered(_sweep_chunk, tasks):
+            self.rows[lo:hi] = rows
+            yield lo, hi, self.data[lo:hi, :rows.max()]
+
+    def run(self):
+        for chunk in self:
+            pass
+
+        return self.data[:, :self.rows.max()]
+
+    def close(self):
+        if not self.pool is None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+        if not self.shm is None:
+            self.data = None
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+def sweep(api, variables, values, start, dt, end, record=None, processes=None, chunk_size=None, integrator=None, seed=None):
+    with Sweep(api, variables, values, start, dt, end, record, processes, chunk_size, integrator, seed) as s:
+        return s.run().copy()
+
+class Snapshot(object):
+    """Copy of the storage of a network, see Network.snapshot.
+
+    The buffer is returned to the pool of the network when the snapshot is
+    released, or garbage collected."""
+
+    _magic = b'CDNRAWCS'
+    _header = struct.Struct('<8sIIB')
+
+    def __init__(self, name, size, full, pool=None):
+        self.name = name
+        self.size = size
+        self.full = full
+
+        if pool:
+            self.buffer = pool.pop()
+        else:
+            self.buffer = ctypes.create_string_buffer(size)
+
+        self._pool = pool
+
+    def __del__(self):
+        self.release()
+
+    def release(self):
+        if not self._pool is None and not self.buffer is None:
+            self._pool.append(self.buffer)
+
+        self.buffer = None
+
+    def save(self, filename):
+        with open(filename, 'wb') as f:
+            f.write(self._header.pack(self._magic, len(self.name), self.size, int(self.full)))
+            f.write(self.name)
+            f.write(ctypes.string_at(self.buffer, self.size))
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, 'rb') as f:
+            magic, namelen, size, full = cls._header.unpack(f.read(cls._header.size))
+
+            if magic != cls._magic:
+                raise ValueError('The file `{0}\' is not a network snapshot'.format(filename))
+
+            name = f.read(namelen)
+            data = f.read(size)
+
+        if len(data) != size:
+            raise ValueError('The snapshot `{0}\' is truncated'.format(filename))
+
+        ret = cls(name, size, bool(full))
+        ctypes.memmove(ret.buffer, data, size)
+
+        return ret
+
+class NpySink(object):
+    """Trajectory sink writing to a memory mapped .npy file.
+
+    The file is preallocated and grown in blocks, and the header is updated
+    after every block so that the file can be loaded (for example with
+    numpy.load(filename, mmap_mode='r')) while a run is still going. Use
+    append=True to continue an existing trajectory file."""
+
+    # Room for a shape of up to 21 digits per axis, as numpy does
+    _header_align = 64
+    _shape_digits = 21
+
+    def __init__(self, filename, append=False, block_rows=65536):
+        self.filename = filename
+        self.block_rows = block_rows
+        self.rows = 0
+        self.dtype = None
+        self.columns = None
+
+        self._file = None
+        self._map = None
+        self._header_size = 0
+        self._capacity = 0
+        self._version = (1, 0)
+
+        if append and os.path.exists(filename):
+            self._file = open(filename, 'r+b')
+            self._read_header()
+        else:
+            self._file = open(filename, 'w+b')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+    def _read_header(self):
+        version = numpy.lib.format.read_magic(self._file)
+
+        if version == (1, 0):
+            shape, fortran_order, dtype = numpy.lib.format.read_array_header_1_0(self._file)
+        else:
+            shape, fortran_order, dtype = numpy.lib.format.read_array_header_2_0(self._file)
+
+        if fortran_order or len(shape) != 2:
+            raise ValueError('The file `{0}\' does not contain a (steps x vars) trajectory'.format(self.filename))
+
+        self._version = version
+        self._header_size = self._file.tell()
+
+        self.rows, self.columns = shape
+        self.dtype = dtype
+
+    def _header(self, rows):
+        d = "{{'descr': {0}, 'fortran_order': False, 'shape': ({1}, {2}), }}".format(repr(numpy.lib.format.dtype_to_descr(self.dtype)),
+                                                                                   rows,
+                                                                                   self.columns)
+
+        if self._version == (1, 0):
+            prefix = len(numpy.lib.format.MAGIC_PREFIX) + 2 + 2
+        else:
+            prefix = len(numpy.lib.format.MAGIC_PREFIX) + 2 + 4
+
+        if self._header_size == 0:
+            # Pad for the largest possible number of rows, so that the data
+            # never has to move when the header grows
+            size = prefix + len(d) + self._shape_digits + 1
+            self._header_size = int(math.ceil(size / float(self._header_align))) * self._header_align
+
+        n = self._header_size - prefix - 1
+
+        if len(d) > n:
+            raise ValueError('The header of `{0}\' is too small for {1} rows'.format(self.filename, rows))
+
+        d = (d + ' ' * (n - len(d)) + '\n').encode('latin1')
+
+        if self._version == (1, 0):
+            size = numpy.array([n + 1], dtype='<u2').tobytes()
+        else:
+            size = numpy.array([n + 1], dtype='<u4').tobytes()
+
+        return numpy.lib.format.magic(*self._version) + size + d
+
+    def _open(self, dtype, columns):
+        dtype = numpy.dtype(dtype)
+
+        if self.dtype is None:
+            self.dtype = dtype
+            self.columns = columns
+            self._file.write(self._header(0))
+
+        if self.dtype != dtype or self.columns != columns:
+            raise ValueError('The sink `{0}\' records {1} values of type {2}, not {3} values of type {4}'.format(self.filename, self.columns, self.dtype, columns, dtype))
+
+    def _row_size(self):
+        return self.columns * self.dtype.itemsize
+
+    def _map_file(self, size):
+        # Release the previous map, growing a file which is mapped is not
+        # portable
+        if not self._map is None:
+            self._map.flush()
+            self._map.close()
+            self._map = None
+
+        self._file.flush()
+        self._file.truncate(size)
+
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self._capacity = (size - self._header_size) // max(self._row_size(), 1)
+
+    def _block(self):
+        # The next block of rows to be written, doubling the file if needed
+        if self._capacity < self.rows + self.block_rows:
+            capacity = max(self.rows + self.block_rows, 2 * self._capacity)
+            self._map_file(self._header_size + capacity * self._row_size())
+
+        return numpy.frombuffer(self._map,
+                                dtype=self.dtype,
+                                count=self.block_rows * self.columns,
+                                offset=self._header_size + self.rows * self._row_size()).reshape((self.block_rows, self.columns))
+
+    def _commit(self, rows):
+        # Make the data visible before the header which announces it
+        self.rows += rows
+
+        self._map.flush()
+        self._map[:self._header_size] = self._header(self.rows)
+        self._map.flush()
+
+    def close(self):
+        if self._file is None:
+            return
+
+        if not self._map is None:
+            self._map.flush()
+            self._map.close()
+            self._map = None
+
+        # Drop the preallocated space which was not used
+        if not self.dtype is None:
+            self._file.seek(0)
+            self._file.write(self._header(self.rows))
+            self._file.truncate(self._header_size + self.rows * self._row_size())
+
+        self._file.close()
+        self._file = None
+
+    def load(self, mmap_mode='r'):
+        return numpy.load(self.filename, mmap_mode=mmap_mode)
+
+class Integrator(object):
+    def __init__(self, integrator, name=None):
         self.integrator = integrator
+        self.name = name
 
     @property
     def order(self):
         return self.integrator.contents.order
 
-__all__ = ['Network', 'Integrator', 'Euler', 'RungeKutta']
+    def spec(self):
+        # Picklable (name, settings) pair to rebuild the integrator in
+        # another process, see Sweep. The name is None for the default
+        # integrator of the network
+        return (self.name, {})
+
+class DormandPrince(Integrator):
+    # Adaptive integrator, the tolerances are shared by all networks of the
+    # library using it. The statistics are counted per instance, in the
+    # private storage of the integrator (see cdn-rawc-integrator-dormand-prince.h)
+    statistics_fields = ('accepted', 'rejected', 'evaluations')
+
+    def __init__(self, integrator, types, name=None):
+        Integrator.__init__(self, integrator, name)
+        self.params = ctypes.cast(integrator, ctypes.POINTER(types.CdnRawcIntegratorDormandPrince)).contents
+
+    def spec(self):
+        return (self.name, {'rtol': self.rtol, 'atol': self.atol})
+
+    @property
+    def rtol(self):
+        return self.params.rtol
+
+    @rtol.setter
+    def rtol(self, val):
+        self.params.rtol = val
+
+    @property
+    def atol(self):
+        return self.params.atol
+
+    @atol.setter
+    def atol(self, val):
+        self.params.atol = val
+
+    def _statistics(self, network):
+        network._check_open()
+
+        api = network.api
+        return api.cdn_rawc_integrator_dormand_prince_get_statistics(self.integrator, network.network, network.storage).contents
+
+    def statistics(self, network):
+        stats = self._statistics(network)
+        return dict((k, getattr(stats, k)) for k in self.statistics_fields)
+
+    def reset_statistics(self, network):
+        stats = self._statistics(network)
+
+        for k in self.statistics_fields:
+            setattr(stats, k, 0)
+
+class Rosenbrock(Integrator):
+    # Steps which failed because the iteration matrix remained singular (see
+    # cdn-rawc-integrator-rosenbrock.h) are counted per instance, in the
+    # private storage of the integrator. The states of a failed step are NaN
+    def _failures(self, network):
+        network._check_open()
+
+        api = network.api
+        return api.cdn_rawc_integrator_rosenbrock_get_failures(self.integrator, network.network, network.storage)
+
+    def failures(self, network):
+        return self._failures(network)[0]
+
+    def reset_failures(self, network):
+        self._failures(network)[0] = 0
+
+__all__ = ['Network', 'Ensemble', 'ParallelRunner', 'Sweep', 'sweep', 'Snapshot', 'NpySink', 'Integrator', 'DormandPrince', 'Rosenbrock', 'Euler', 'RungeKutta']
 
 # vi:ts=4:et
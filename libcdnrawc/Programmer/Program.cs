@@ -204,6 +204,105 @@ namespace Cdn.RawC.Programmer
 			}
 		}
 
+		public List<int>[] JacobianSparsity()
+		{
+			// Rows (offsets into the derivatives) that depend on each column
+			// (offset into the integrated states) of the Jacobian. Matrix
+			// valued states are treated as dense blocks
+			var srange = StateRange(Knowledge.Instance.Integrated, new int[] {0, 0});
+			var drange = StateRange(Knowledge.Instance.DerivativeStates, new int[] {0, 0});
+
+			var ret = new List<int>[srange[1] - srange[0]];
+
+			for (int i = 0; i < ret.Length; ++i)
+			{
+				ret[i] = new List<int>();
+			}
+
+			foreach (var d in Knowledge.Instance.DerivativeStates)
+			{
+				var ditem = d_statetable[d];
+				var row = ditem.DataIndex - drange[0];
+				var numrows = ditem.Dimension.Size();
+
+				foreach (var s in Knowledge.Instance.Integrated)
+				{
+					if (!d_dependencyGraph.DependsOn(d, s.Object))
+					{
+						continue;
+					}
+
+					var sitem = d_statetable[s];
+					var col = sitem.DataIndex - srange[0];
+
+					for (int c = 0; c < sitem.Dimension.Size(); ++c)
+					{
+						for (int r = 0; r < numrows; ++r)
+						{
+							ret[col + c].Add(row + r);
+						}
+					}
+				}
+			}
+
+			foreach (var col in ret)
+			{
+				col.Sort();
+			}
+
+			return ret;
+		}
+
+		public int[] JacobianColoring(List<int>[] sparsity, out int numcolors)
+		{
+			// Greedy coloring of the columns such that columns sharing a row
+			// get different colors
+			var colors = new int[sparsity.Length];
+			var rowcolors = new Dictionary<int, HashSet<int>>();
+
+			numcolors = 0;
+
+			for (int j = 0; j < sparsity.Length; ++j)
+			{
+				var used = new HashSet<int>();
+
+				foreach (var row in sparsity[j])
+				{
+					HashSet<int> rc;
+
+					if (rowcolors.TryGetValue(row, out rc))
+					{
+						used.UnionWith(rc);
+					}
+				}
+
+				int color = 0;
+
+				while (used.Contains(color))
+				{
+					++color;
+				}
+
+				colors[j] = color;
+				numcolors = Math.Max(numcolors, color + 1);
+
+				foreach (var row in sparsity[j])
+				{
+					HashSet<int> rc;
+
+					if (!rowcolors.TryGetValue(row, out rc))
+					{
+						rc = new HashSet<int>();
+						rowcolors[row] = rc;
+					}
+
+					rc.Add(color);
+				}
+			}
+
+			return colors;
+		}
+
 		private void ComputeDependencies()
 		{
 			var lst = new List<Tree.Embedding>();
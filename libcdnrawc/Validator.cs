@@ -14,6 +14,13 @@ namespace Cdn.RawC
 		private List<double[]> d_data;
 		private List<Cdn.Monitor> d_monitors;
 
+		// Largest discrepancy between codyn and the generated network, used to
+		// report the accuracy of approximations (e.g. fast math)
+		private double d_maxError;
+		private double d_maxRelativeError;
+		private string d_maxErrorName;
+		private double d_maxErrorTime;
+
 		public Validator(Cdn.Network network)
 		{
 			d_network = network;
@@ -100,8 +107,21 @@ namespace Cdn.RawC
 				{
 					double rawcval = data[indices[i] + (uint)j];
 					double cdnval = d_data[i][row * size + j];
+					double err = System.Math.Abs(cdnval - rawcval);
+
+					if (err > d_maxError)
+					{
+						d_maxError = err;
+						d_maxErrorName = String.Format("{0}[{1}]", d_monitors[i].Variable.FullNameForDisplay, j);
+						d_maxErrorTime = t;
+					}
 
-					if (System.Math.Abs(cdnval - rawcval) > Options.Instance.ValidatePrecision ||
+					if (cdnval != 0 && err / System.Math.Abs(cdnval) > d_maxRelativeError)
+					{
+						d_maxRelativeError = err / System.Math.Abs(cdnval);
+					}
+
+					if (err > Options.Instance.ValidatePrecision ||
 				        double.IsNaN(cdnval) != double.IsNaN(rawcval))
 					{
 						failures.Add(String.Format("{0}[{1}] (got {2} but expected {3})",
@@ -146,6 +166,10 @@ namespace Cdn.RawC
 			var dtstate = program.StateTable[Knowledge.Instance.TimeStep];
 			var len = d_data[0].Length - 1;
 
+			d_maxError = 0;
+			d_maxRelativeError = 0;
+			d_maxErrorName = null;
+
 			string shlib = opts.Formatter.CompileForValidation(sources, opts.Verbose);
 			IEnumerator<double[]> enu;
 
@@ -169,6 +193,15 @@ namespace Cdn.RawC
 				t += data[dtstate.DataIndex];
 			}
 
+			if (d_maxErrorName != null)
+			{
+				Log.WriteLine("Maximum absolute error {0} ({1} at t = {2}), maximum relative error {3}",
+				              d_maxError.ToString("R"),
+				              d_maxErrorName,
+				              d_maxErrorTime,
+				              d_maxRelativeError.ToString("R"));
+			}
+
 			Log.WriteLine("Network {0} successfully validated...", d_network.Filename);
 		}
 
@@ -0,0 +1,48 @@
+# Checks the per phase profile of the runtime while stepping the ball of
+# event_localization.cdn to its landing. The runtime is compiled with
+# profiling, see runtest
+#
+# Usage: event_localization-profile.py <path to the compiled network library>
+
+import sys
+
+import cdnrawc
+
+def check(what, ok):
+    if not ok:
+        sys.stderr.write('{0} failed\n'.format(what))
+        sys.exit(1)
+
+def check_profile(api, localization, name):
+    n = cdnrawc.Network(api)
+    n.event_localization = localization
+    n.reset(0)
+
+    steps = 0
+
+    while n.t < 1 - 1e-9:
+        n.step(0.05)
+        steps += 1
+
+    profile = n.profile()
+
+    check(name + ' profile', not profile is None)
+    check(name + ' phases', sorted(profile.keys()) == sorted(cdnrawc.profile_phases))
+    check(name + ' steps', profile['step']['calls'] == steps)
+    check(name + ' pre', profile['pre']['calls'] == steps)
+    check(name + ' events fired', profile['events_fire']['calls'] == 1)
+    check(name + ' refinements', profile['events_refine']['calls'] > 0)
+
+    for phase in cdnrawc.profile_phases:
+        check(name + ' ' + phase + ' time', profile[phase]['time'] >= 0)
+
+    # Counters restart on reset
+    n.reset(0)
+    check(name + ' reset', sum(p['calls'] for p in n.profile().values()) == 0)
+
+api = cdnrawc.load(sys.argv[1])
+
+check_profile(api, cdnrawc.EVENT_LOCALIZATION_STEP, 'step')
+check_profile(api, cdnrawc.EVENT_LOCALIZATION_ILLINOIS, 'illinois')
+
+# vi:ts=4:et
@@ -0,0 +1,44 @@
+# Checks that both event localization methods find the landing of the ball
+# in event_localization.cdn
+#
+# Usage: event_localization.py <path to the compiled network library>
+
+import sys, math
+
+import cdnrawc
+
+# Time it takes to fall from a height of 1
+exact = math.sqrt(2 / 9.81)
+
+def check(what, err, tol):
+    if not err <= tol:
+        sys.stderr.write('{0}: error {1} exceeds {2}\n'.format(what, err, tol))
+        sys.exit(1)
+
+def check_localization(api, localization, name):
+    n = cdnrawc.Network(api)
+    n.event_localization = localization
+    n.reset(0)
+
+    while n.t < 1 - 1e-9:
+        n.step(0.05)
+
+    x = n.data[n.find_variable('ball.x')]
+    fall = n.data[n.find_variable('ball.fall')]
+
+    # Without localization the ball would land at the end of the step in
+    # which it crossed the ground, up to 0.05 too late
+    check(name + ' landing time', abs(fall - exact), 1e-3)
+    check(name + ' landing height', abs(x), 1e-3)
+    check(name + ' refinements', int(n.event_refinements()[0] == 0), 0)
+
+api = cdnrawc.load(sys.argv[1])
+
+# Illinois only restores the integrated states between trials, networks have
+# to opt in
+check('default localization', abs(cdnrawc.Network(api).event_localization - cdnrawc.EVENT_LOCALIZATION_STEP), 0)
+
+check_localization(api, cdnrawc.EVENT_LOCALIZATION_STEP, 'step')
+check_localization(api, cdnrawc.EVENT_LOCALIZATION_ILLINOIS, 'illinois')
+
+# vi:ts=4:et
@@ -0,0 +1,54 @@
+# Checks the Dormand-Prince integrator on integrators.cdn against Runge-Kutta
+# with a small step, and its per instance statistics
+#
+# Usage: integrators-dormand-prince.py <path to the compiled network library>
+
+import sys, numbers
+
+try:
+    import numpy
+except ImportError:
+    sys.exit(77)
+
+import cdnrawc
+
+variables = ['t', 'osc.x', 'osc.v', 'forced.q', 'stiff.y']
+
+def check(what, err, tol):
+    if not err <= tol:
+        sys.stderr.write('{0}: error {1} exceeds {2}\n'.format(what, err, tol))
+        sys.exit(1)
+
+api = cdnrawc.load(sys.argv[1])
+
+# Reference solution on a fine grid, sampled at the steps below
+ref = cdnrawc.Network(api, integrator=api.RungeKutta()).record(0, 0.0001, 1, variables)[::100]
+
+# With an output step much larger than the stiff time scale
+dp = api.DormandPrince(rtol=1e-9, atol=1e-12)
+n = cdnrawc.Network(api, integrator=dp)
+r = n.record(0, 0.01, 1, variables)
+
+check('rows', abs(len(r) - len(ref)), 0)
+check('solution', numpy.abs(r[:, 1:] - ref[:, 1:]).max(), 1e-6)
+
+# Several substeps per step for the stiff node, seven stages of which the
+# first is shared with the last of the previous substep
+stats = dp.statistics(n)
+
+check('accepted substeps', int(stats['accepted'] < len(r) - 1), 0)
+check('evaluations', int(stats['evaluations'] < 6 * stats['accepted']), 0)
+check('integer statistics', int(not all(isinstance(v, numbers.Integral) for v in stats.values())), 0)
+
+dp.reset_statistics(n)
+check('reset statistics', sum(dp.statistics(n).values()), 0)
+
+# The step size is kept per instance, so every instance of an ensemble is
+# integrated like a single network
+e = cdnrawc.Ensemble(api, 3, dp)
+re = e.record(0, 0.01, 1, variables)
+
+for i in range(len(re)):
+    check('ensemble instance {0}'.format(i), numpy.abs(re[i] - r).max(), 0)
+
+# vi:ts=4:et
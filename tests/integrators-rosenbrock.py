@@ -0,0 +1,63 @@
+# Checks the Rosenbrock integrator on integrators.cdn against Runge-Kutta with
+# a small step, also at a step size where explicit methods are unstable
+#
+# Usage: integrators-rosenbrock.py <path to the compiled network library>
+
+import sys
+
+try:
+    import numpy
+except ImportError:
+    sys.exit(77)
+
+import cdnrawc
+
+variables = ['t', 'osc.x', 'osc.v', 'forced.q', 'stiff.y']
+
+def check(what, err, tol):
+    if not err <= tol:
+        sys.stderr.write('{0}: error {1} exceeds {2}\n'.format(what, err, tol))
+        sys.exit(1)
+
+def compare(what, r, ref, tol, columns=slice(1, None), after=0):
+    # Compares a recording to the reference on the same time grid, from time
+    # after on
+    ref = ref[::int(round((r[1, 0] - r[0, 0]) / (ref[1, 0] - ref[0, 0])))]
+
+    check(what + ' rows', abs(len(r) - len(ref)), 0)
+    check(what + ' time', numpy.abs(r[:, 0] - ref[:, 0]).max(), 1e-9)
+
+    rows = r[:, 0] >= after
+    check(what, numpy.abs(r[rows, columns] - ref[rows, columns]).max(), tol)
+
+api = cdnrawc.load(sys.argv[1])
+
+# Reference solution on a fine grid
+ref = cdnrawc.Network(api, integrator=api.RungeKutta()).record(0, 0.0001, 1, variables)
+
+# The Jacobian does not include the time derivative, so the stiff node is
+# only compared after its initial transient
+ros = api.Rosenbrock()
+n = cdnrawc.Network(api, integrator=ros)
+r = n.record(0, 0.001, 1, variables)
+
+compare('small step', r, ref, 1e-4, slice(1, 4))
+compare('small step stiff', r, ref, 1e-3, 4, 0.1)
+check('small step failures', ros.failures(n), 0)
+
+# Also stable at a step where explicit methods are not (1000 * 0.01 > 2.8)
+n = cdnrawc.Network(api, integrator=ros)
+r = n.record(0, 0.01, 1, variables)
+
+compare('large step', r, ref, 1e-2, after=0.1)
+check('large step failures', ros.failures(n), 0)
+
+# The iteration matrix is kept per instance, instances of an ensemble are
+# integrated like a single network
+e = cdnrawc.Ensemble(api, 2, ros)
+re = e.record(0, 0.01, 1, variables)
+
+for i in range(len(re)):
+    check('ensemble instance {0}'.format(i), numpy.abs(re[i] - r).max(), 0)
+
+# vi:ts=4:et
@@ -0,0 +1,53 @@
+# Checks that the fused stages of the Runge-Kutta integrator compute the same
+# steps of integrators.cdn as the textbook formulation
+#
+# Usage: integrators-runge-kutta.py <path to the compiled network library>
+
+import sys, math
+
+try:
+    import numpy
+except ImportError:
+    sys.exit(77)
+
+import cdnrawc
+
+variables = ['t', 'osc.x', 'osc.v', 'forced.q', 'stiff.y']
+
+def check(what, err, tol):
+    if not err <= tol:
+        sys.stderr.write('{0}: error {1} exceeds {2}\n'.format(what, err, tol))
+        sys.exit(1)
+
+# Derivatives of integrators.cdn
+def f(t, y):
+    x, v, q, s = y
+    return numpy.array([v, -4 * x - 0.4 * v, math.cos(3 * t), -1000 * (s - math.cos(t))])
+
+def rk4(y, t, dt, steps):
+    ret = [y]
+
+    for i in range(steps):
+        k1 = f(t, y)
+        k2 = f(t + 0.5 * dt, y + 0.5 * dt * k1)
+        k3 = f(t + 0.5 * dt, y + 0.5 * dt * k2)
+        k4 = f(t + dt, y + dt * k3)
+
+        y = y + dt / 6.0 * (k1 + 2 * k2 + 2 * k3 + k4)
+        t += dt
+
+        ret.append(y)
+
+    return numpy.array(ret)
+
+api = cdnrawc.load(sys.argv[1])
+
+n = cdnrawc.Network(api, integrator=api.RungeKutta())
+r = n.record(0, 0.001, 0.1, variables)
+ref = rk4(r[0, 1:], 0.0, 0.001, len(r) - 1)
+
+# Up to rounding
+check('time', numpy.abs(r[:, 0] - numpy.arange(len(r)) * 0.001).max(), 1e-12)
+check('states', numpy.abs(r[:, 1:] - ref).max(), 1e-12)
+
+# vi:ts=4:et
@@ -0,0 +1,55 @@
+# Checks that every node and variable of lookup.cdn is found by name through
+# the sorted name index, also relative to a node, and that missing names are
+# not found
+#
+# Usage: lookup.py <path to the compiled network library>
+
+import sys
+
+import cdnrawc
+
+def check(what, ok):
+    if not ok:
+        sys.stderr.write('{0} failed\n'.format(what))
+        sys.exit(1)
+
+api = cdnrawc.load(sys.argv[1])
+n = cdnrawc.Network(api)
+n.reset(0)
+
+info = n.meta_info
+nodes = n.topology.fullname_to_node
+
+# n1 to n12, n, n.inner, n_1, group and its three children
+check('number of nodes', len(nodes) == 19)
+
+for fullname, node in nodes.items():
+    i = n.find_meta_node(fullname)
+
+    check('node ' + fullname, i > 0 and info.nodes[i].name.decode('utf-8') == node.name)
+    check('node ' + fullname + ' is not a variable', n.find_variable(fullname) < 0)
+
+    for v in node.variables:
+        name = fullname + '.' + v.name
+
+        check('variable ' + name, n.find_variable(name) == v.index)
+        check('meta variable ' + name, info.states[n.find_meta_variable(name)].index == v.index)
+        check('meta variable ' + name + ' relative to its node', n.find_meta_variable(v.name, i) == n.find_meta_variable(name))
+        check('variable ' + name + ' is not a node', n.find_meta_node(name) == 0)
+
+values = {
+    'n.a': 3,
+    'n.inner.z': 4,
+    'n_1.a': 5,
+    'n1.a': 1,
+    'n12.b_c': 2,
+    'group.inner3.y': 6,
+}
+
+for name, value in values.items():
+    check('value of ' + name, n.data[n.find_variable(name)] == value)
+
+for name in ['', 'n', 'n.', 'n13.a', 'n1.a.b', 'n.inner.y', 'n_2.a', 'group.inner.y', 'inner1.y']:
+    check('missing variable `' + name + '\'', n.find_variable(name) < 0)
+
+# vi:ts=4:et
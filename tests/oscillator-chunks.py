@@ -0,0 +1,38 @@
+# Checks that stepping oscillator.cdn in chunks gives the recorded trajectory,
+# with and without computing the next chunk in the background
+#
+# Usage: oscillator-chunks.py <path to the compiled network library>
+
+import sys
+
+try:
+    import numpy
+except ImportError:
+    sys.exit(77)
+
+import cdnrawc
+
+variables = ['t', 'osc.x', 'osc.v']
+
+def check(what, err, tol):
+    if not err <= tol:
+        sys.stderr.write('{0}: error {1} exceeds {2}\n'.format(what, err, tol))
+        sys.exit(1)
+
+api = cdnrawc.load(sys.argv[1])
+n = cdnrawc.Network(api)
+
+full = n.record(0, 0.01, 3, variables)
+
+for double_buffer in (False, True):
+    name = 'double buffer {0}'.format(double_buffer)
+
+    # A chunk size which does not divide the number of rows
+    chunks = [c.copy() for c in n.iter_chunks(0, 0.01, 3, 64, variables, double_buffer)]
+    r = numpy.concatenate(chunks)
+
+    check(name + ' chunk size', max(len(c) for c in chunks) - 64, 0)
+    check(name + ' shape', int(r.shape != full.shape), 0)
+    check(name, numpy.abs(r - full).max(), 0)
+
+# vi:ts=4:et
@@ -0,0 +1,51 @@
+# Checks that an ensemble of oscillator.cdn, one instance per stiffness,
+# follows the analytic solutions, and simulates each instance like a single
+# network
+#
+# Usage: oscillator-ensemble.py <path to the compiled network library>
+
+import sys, math
+
+try:
+    import numpy
+except ImportError:
+    sys.exit(77)
+
+import cdnrawc
+
+variables = ['t', 'osc.x', 'osc.v']
+stiffness = numpy.array([[0.25], [1], [4], [9]])
+
+def check(what, err, tol):
+    if not err <= tol:
+        sys.stderr.write('{0}: error {1} exceeds {2}\n'.format(what, err, tol))
+        sys.exit(1)
+
+api = cdnrawc.load(sys.argv[1])
+
+e = cdnrawc.Ensemble(api, len(stiffness))
+e.set_parameters(['osc.k'], stiffness)
+
+r = e.record(0, 0.01, 2, variables)
+
+check('shape', int(r.shape != (len(stiffness), 201, len(variables))), 0)
+
+for i, k in enumerate(stiffness[:, 0]):
+    exact = numpy.cos(math.sqrt(k) * r[i, :, 0])
+    check('instance k = {0}'.format(k), numpy.abs(r[i, :, 1] - exact).max(), 1e-6)
+
+# An instance with the default parameters is simulated exactly like a single
+# network
+n = cdnrawc.Network(api)
+check('single network', numpy.abs(r[1] - n.record(0, 0.01, 2, variables)).max(), 0)
+
+# Stepping the ensemble ends where recording did
+e.reset(0)
+
+for i in range(200):
+    e.step(0.01)
+
+x = n.find_variable('osc.x')
+check('stepped', numpy.abs(e.data_view()[:, x] - r[:, -1, 1]).max(), 0)
+
+# vi:ts=4:et
@@ -0,0 +1,39 @@
+# Checks that sharding an ensemble of oscillator.cdn over threads gives the
+# same trajectories as simulating it at once
+#
+# Usage: oscillator-parallel.py <path to the compiled network library>
+
+import sys
+
+try:
+    import numpy
+except ImportError:
+    sys.exit(77)
+
+import cdnrawc
+
+variables = ['t', 'osc.x', 'osc.v']
+stiffness = numpy.array([[0.25], [1], [4], [9], [16]])
+
+def check(what, err, tol):
+    if not err <= tol:
+        sys.stderr.write('{0}: error {1} exceeds {2}\n'.format(what, err, tol))
+        sys.exit(1)
+
+api = cdnrawc.load(sys.argv[1])
+
+e = cdnrawc.Ensemble(api, len(stiffness))
+e.set_parameters(['osc.k'], stiffness)
+
+r = e.record(0, 0.01, 2, variables)
+
+# More instances than workers, and a worker count that does not divide them
+for workers in (1, 2, 3):
+    with cdnrawc.ParallelRunner(api, len(stiffness), workers=workers) as runner:
+        runner.set_parameters(['osc.k'], stiffness)
+        p = runner.record(0, 0.01, 2, variables)
+
+    check('workers = {0} shape'.format(workers), int(p.shape != r.shape), 0)
+    check('workers = {0}'.format(workers), numpy.abs(p - r).max(), 0)
+
+# vi:ts=4:et
@@ -0,0 +1,49 @@
+# Checks that recording oscillator.cdn natively gives the same trajectory as
+# stepping it from python
+#
+# Usage: oscillator-record.py <path to the compiled network library>
+
+import sys, math
+
+try:
+    import numpy
+except ImportError:
+    sys.exit(77)
+
+import cdnrawc
+
+variables = ['t', 'osc.x', 'osc.v']
+
+def check(what, err, tol):
+    if not err <= tol:
+        sys.stderr.write('{0}: error {1} exceeds {2}\n'.format(what, err, tol))
+        sys.exit(1)
+
+api = cdnrawc.load(sys.argv[1])
+n = cdnrawc.Network(api)
+
+r = n.record(0, 0.01, 2, variables)
+
+check('rows', abs(len(r) - 201), 0)
+check('solution', numpy.abs(r[:, 1] - numpy.cos(r[:, 0])).max(), 1e-6)
+
+# The same steps taken one by one
+indices = [n.find_variable(v) for v in variables]
+n.reset(0)
+
+rows = [[n[i] for i in indices]]
+
+while n.t < 2 - 1e-9:
+    n.step(0.01)
+    rows.append([n[i] for i in indices])
+
+check('stepped', numpy.abs(numpy.array(rows) - r).max(), 0)
+
+# Into a preallocated buffer, with fewer rows than steps
+out = numpy.zeros((50, len(variables)), dtype=api.dtype)
+part = n.record(0, 0.01, 2, variables, out)
+
+check('buffer rows', abs(len(part) - 50), 0)
+check('buffer', numpy.abs(out - r[:50]).max(), 0)
+
+# vi:ts=4:et
@@ -0,0 +1,70 @@
+# Checks that streaming oscillator.cdn into a .npy file gives the recorded
+# trajectory, also when appending to a file from a saved state
+#
+# Usage: oscillator-sink.py <path to the compiled network library>
+
+import sys, os, shutil, tempfile
+
+try:
+    import numpy
+except ImportError:
+    sys.exit(77)
+
+import cdnrawc
+
+variables = ['t', 'osc.x', 'osc.v']
+
+def check(what, err, tol):
+    if not err <= tol:
+        sys.stderr.write('{0}: error {1} exceeds {2}\n'.format(what, err, tol))
+        sys.exit(1)
+
+def check_equal(what, a, b):
+    check(what + ' shape', int(a.shape != b.shape), 0)
+    check(what, numpy.abs(a - b).max(), 0)
+
+def main():
+    api = cdnrawc.load(sys.argv[1])
+    tmpdir = tempfile.mkdtemp()
+
+    try:
+        n = cdnrawc.Network(api)
+        full = n.record(0, 0.01, 3, variables)
+
+        # Small blocks to write the trajectory over several blocks
+        filename = os.path.join(tmpdir, 'trajectory.npy')
+
+        with cdnrawc.NpySink(filename, block_rows=50) as sink:
+            n.run(0, 0.01, 3, sink, variables)
+
+        check_equal('sink', numpy.load(filename), full)
+
+        # Appending continues from the state where the first part ended
+        filename = os.path.join(tmpdir, 'appended.npy')
+
+        with cdnrawc.NpySink(filename, block_rows=50) as sink:
+            n.run(0, 0.01, 1.5, sink, variables)
+
+        state = n.snapshot()
+        n.reset()
+
+        with cdnrawc.NpySink(filename, append=True, block_rows=50) as sink:
+            n.run(0, 0.01, 3, sink, variables, state=state)
+
+        check_equal('appended sink', numpy.load(filename), full)
+
+        # Which requires that state
+        try:
+            with cdnrawc.NpySink(filename, append=True) as sink:
+                n.run(0, 0.01, 3, sink, variables)
+
+            check('append without state', 1, 0)
+        except ValueError:
+            pass
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    main()
+
+# vi:ts=4:et
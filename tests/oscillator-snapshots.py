@@ -0,0 +1,86 @@
+# Checks that oscillator.cdn continues the same way after restoring a
+# snapshot (also from a file) or forking, and that a closed network refuses
+# to be used
+#
+# Usage: oscillator-snapshots.py <path to the compiled network library>
+
+import sys, os, shutil, tempfile
+
+try:
+    import numpy
+except ImportError:
+    sys.exit(77)
+
+import cdnrawc
+
+def check(what, err, tol):
+    if not err <= tol:
+        sys.stderr.write('{0}: error {1} exceeds {2}\n'.format(what, err, tol))
+        sys.exit(1)
+
+def check_equal(what, a, b):
+    check(what, numpy.abs(a - b).max(), 0)
+
+def steps(n, num):
+    for i in range(num):
+        n.step(0.01)
+
+    return n.data_view().copy()
+
+def check_snapshots(n, tmpdir, full=False):
+    filename = os.path.join(tmpdir, 'state.snap')
+
+    n.reset()
+    steps(n, 100)
+
+    snap = n.snapshot(full, filename)
+    fork = n.fork()
+
+    expected = steps(n, 50)
+
+    n.restore(snap)
+    check_equal('restore (full {0})'.format(full), steps(n, 50), expected)
+
+    n.restore(filename)
+    check_equal('restore from file (full {0})'.format(full), steps(n, 50), expected)
+
+    check_equal('fork (full {0})'.format(full), steps(fork, 50), expected)
+
+def check_closed(n):
+    snap = n.snapshot()
+    n.close()
+
+    for name, f in [('step', lambda: n.step(0.01)),
+                    ('data', lambda: n.data),
+                    ('data view', lambda: n.data_view()),
+                    ('snapshot', lambda: n.snapshot()),
+                    ('restore', lambda: n.restore(snap)),
+                    ('fork', lambda: n.fork()),
+                    ('record', lambda: n.record(0, 0.01, 1))]:
+        try:
+            f()
+            check('closed ' + name, 1, 0)
+        except ValueError:
+            pass
+
+def main():
+    api = cdnrawc.load(sys.argv[1])
+    tmpdir = tempfile.mkdtemp()
+
+    try:
+        n = cdnrawc.Network(api)
+        check_snapshots(n, tmpdir)
+
+        # Adaptive integrators keep their step size in the private storage of
+        # the integrator, which only full snapshots include
+        n = cdnrawc.Network(api, integrator=api.DormandPrince(rtol=1e-8, atol=1e-10))
+        check_snapshots(n, tmpdir, True)
+
+        check_closed(n)
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    main()
+
+# vi:ts=4:et
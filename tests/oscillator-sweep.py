@@ -0,0 +1,63 @@
+# Checks that sweeping the stiffness of oscillator.cdn over processes gives
+# the same trajectories as an ensemble, also with a configured integrator
+#
+# Usage: oscillator-sweep.py <path to the compiled network library>
+
+import sys
+
+try:
+    import numpy
+    from multiprocessing import shared_memory
+except ImportError:
+    sys.exit(77)
+
+import cdnrawc
+
+variables = ['t', 'osc.x', 'osc.v']
+stiffness = numpy.array([[0.25], [1], [4], [9]])
+
+def check(what, err, tol):
+    if not err <= tol:
+        sys.stderr.write('{0}: error {1} exceeds {2}\n'.format(what, err, tol))
+        sys.exit(1)
+
+def record(api, integrator=None, dt=0.01):
+    e = cdnrawc.Ensemble(api, len(stiffness), integrator)
+    e.set_parameters(['osc.k'], stiffness)
+
+    return e.record(0, dt, 2, variables)
+
+def sweep(api, integrator=None, dt=0.01):
+    return cdnrawc.sweep(api, ['osc.k'], stiffness, 0, dt, 2, record=variables, processes=2, chunk_size=1, integrator=integrator)
+
+def main():
+    api = cdnrawc.load(sys.argv[1])
+
+    r = record(api)
+    s = sweep(api)
+
+    check('sweep shape', int(s.shape != r.shape), 0)
+    check('sweep', numpy.abs(s - r).max(), 0)
+
+    # The workers use the tolerances of the integrator, not its defaults. The
+    # steps are large enough for the tolerances to matter
+    dp = api.DormandPrince(rtol=1e-3, atol=1e-5)
+    loose = record(api, dp, 0.5)
+
+    check('configured integrator', numpy.abs(sweep(api, dp, 0.5) - loose).max(), 0)
+
+    dp.rtol = 1e-9
+    dp.atol = 1e-12
+
+    check('configured integrator differs', int(numpy.abs(record(api, dp, 0.5) - loose).max() == 0), 0)
+
+    try:
+        sweep(api, 'unknown')
+        check('unknown integrator', 1, 0)
+    except ValueError:
+        pass
+
+if __name__ == '__main__':
+    main()
+
+# vi:ts=4:et
@@ -0,0 +1,58 @@
+# Checks that the numpy views of oscillator.cdn share their memory with the
+# network data
+#
+# Usage: oscillator-views.py <path to the compiled network library>
+
+import sys
+
+try:
+    import numpy
+except ImportError:
+    sys.exit(77)
+
+import cdnrawc
+
+def check(what, ok):
+    if not ok:
+        sys.stderr.write('{0} failed\n'.format(what))
+        sys.exit(1)
+
+api = cdnrawc.load(sys.argv[1])
+n = cdnrawc.Network(api)
+n.reset(0)
+
+data = n.data_view()
+states = n.states_view()
+derivatives = n.derivatives_view()
+
+x = n.find_variable('osc.x')
+r = n.network.contents.states
+
+check('data view size', len(data) == n.network.contents.data_count)
+check('states view size', len(states) == r.end - r.start)
+check('derivatives view size', len(derivatives) == len(states))
+check('cached view', n.data_view() is data)
+
+# Written through the view, read through the network and back
+data[x] = 0.5
+check('write through view', n[x] == 0.5)
+
+n[x] = 0.25
+check('write through network', data[x] == 0.25)
+
+# Views follow the network as it steps
+n.step(0.01)
+
+check('states view after step', numpy.array_equal(states, [n[i] for i in range(r.start, r.end)]))
+check('data view after step', data[n.find_variable('t')] == n.t)
+
+# Other slots, and no slots beyond the integrator
+check('view of another slot', not numpy.shares_memory(n.data_view(1), data))
+
+try:
+    n.data_view(n.slots)
+    check('view beyond the slots', False)
+except IndexError:
+    pass
+
+# vi:ts=4:et